@@ -0,0 +1,137 @@
+"""Access control — friendships, watchlist grants and group memberships of a user.
+
+Grants are loaded in one round trip and cached per user. Mutations of friends,
+shares, watchlists or group memberships call invalidate(), which bumps the
+affected users' versions immediately and again after the transaction commits,
+so a reload racing the commit can't pin stale grants. A short TTL bounds
+staleness across worker processes.
+"""
+import time
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException
+from sqlalchemy import String, cast, event, literal_column, null, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from .auth import Claims, get_claims
+from .database import get_db
+from .models import Friend, GroupMember, Watchlist, WatchlistShare
+
+ACCESS_TTL = 60  # seconds
+_NO_PERMISSION = cast(null(), String)
+
+_versions: dict[int, int] = {}
+_cache: dict[int, tuple[int, float, "AccessGrants"]] = {}  # user_id -> (version, expires, grants)
+
+
+@dataclass(frozen=True)
+class AccessGrants:
+    user_id: int
+    friends: frozenset[int]
+    own_watchlists: frozenset[int]
+    shared_watchlists: dict[int, str]  # watchlist_id -> permission (view / edit)
+    groups: frozenset[int]  # accepted memberships
+
+    def can_view(self, *, watchlist_id: int | None = None, group_id: int | None = None, user_id: int | None = None) -> bool:
+        """Single read check: a watchlist, a group, or another user's friend views."""
+        if watchlist_id is not None:
+            return watchlist_id in self.own_watchlists or watchlist_id in self.shared_watchlists
+        if group_id is not None:
+            return group_id in self.groups
+        if user_id is not None:
+            return user_id == self.user_id or user_id in self.friends
+        return False
+
+    def can_edit(self, *, watchlist_id: int | None = None, group_id: int | None = None) -> bool:
+        if watchlist_id is not None:
+            return watchlist_id in self.own_watchlists or self.shared_watchlists.get(watchlist_id) == "edit"
+        if group_id is not None:
+            return group_id in self.groups
+        return False
+
+    def owns(self, watchlist_id: int) -> bool:
+        return watchlist_id in self.own_watchlists
+
+
+def _bump(user_ids) -> None:
+    for uid in user_ids:
+        _versions[uid] = _versions.get(uid, 0) + 1
+        _cache.pop(uid, None)
+
+
+def invalidate(db: AsyncSession, *user_ids: int) -> None:
+    """Drop cached grants of these users now and once more after db commits."""
+    _bump(user_ids)
+    db.sync_session.info.setdefault("access_invalidate", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    user_ids = session.info.pop("access_invalidate", None)
+    if user_ids:
+        _bump(user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session: Session) -> None:
+    session.info.pop("access_invalidate", None)
+
+
+async def load_grants(db: AsyncSession, user_id: int) -> AccessGrants:
+    version = _versions.get(user_id, 0)
+    cached = _cache.get(user_id)
+    if cached and cached[0] == version and cached[1] > time.time():
+        return cached[2]
+
+    # One round trip: (kind, id, permission)
+    rows = (await db.execute(union_all(
+        select(literal_column("'friend'"), Friend.receiver_id, _NO_PERMISSION).where(Friend.status == "accepted", Friend.sender_id == user_id),
+        select(literal_column("'friend'"), Friend.sender_id, _NO_PERMISSION).where(Friend.status == "accepted", Friend.receiver_id == user_id),
+        select(literal_column("'own'"), Watchlist.id, _NO_PERMISSION).where(Watchlist.owner_id == user_id),
+        select(literal_column("'share'"), WatchlistShare.watchlist_id, WatchlistShare.permission).where(WatchlistShare.user_id == user_id),
+        select(literal_column("'group'"), GroupMember.group_id, _NO_PERMISSION).where(GroupMember.user_id == user_id, GroupMember.status == "accepted"),
+    ))).all()
+
+    by_kind: dict[str, list] = {"friend": [], "own": [], "share": [], "group": []}
+    for kind, ref_id, permission in rows:
+        by_kind[kind].append((ref_id, permission))
+    grants = AccessGrants(
+        user_id=user_id,
+        friends=frozenset(r for r, _ in by_kind["friend"]),
+        own_watchlists=frozenset(r for r, _ in by_kind["own"]),
+        shared_watchlists={r: p for r, p in by_kind["share"]},
+        groups=frozenset(r for r, _ in by_kind["group"]),
+    )
+    # Only cache if nothing was invalidated while loading
+    if _versions.get(user_id, 0) == version:
+        _cache[user_id] = (version, time.time() + ACCESS_TTL, grants)
+    return grants
+
+
+async def get_access(user: Claims = Depends(get_claims), db: AsyncSession = Depends(get_db)) -> AccessGrants:
+    """FastAPI dependency: grants of the current user."""
+    return await load_grants(db, user.id)
+
+
+async def ensure_watchlist_access(db: AsyncSession, user_id: int, watchlist_id: int | None, need_edit: bool = False) -> AccessGrants:
+    """Raise 404/403 unless the user may view (or edit) the watchlist."""
+    grants = await load_grants(db, user_id)
+    allowed = grants.can_edit(watchlist_id=watchlist_id) if need_edit else grants.can_view(watchlist_id=watchlist_id)
+    if allowed:
+        return grants
+    if watchlist_id is None or not (await db.execute(select(Watchlist.id).where(Watchlist.id == watchlist_id))).first():
+        raise HTTPException(status_code=404, detail="Watchlist not found")
+    if need_edit and grants.can_view(watchlist_id=watchlist_id):
+        raise HTTPException(status_code=403, detail="No edit permission")
+    raise HTTPException(status_code=403, detail="No access")
+
+
+async def ensure_movie_access(db: AsyncSession, user_id: int, movie, need_edit: bool = False) -> None:
+    """Movies live either in a watchlist or in a group watchlist."""
+    if movie.group_id is not None and movie.watchlist_id is None:
+        grants = await load_grants(db, user_id)
+        if not grants.can_view(group_id=movie.group_id):
+            raise HTTPException(status_code=403, detail="No access")
+        return
+    await ensure_watchlist_access(db, user_id, movie.watchlist_id, need_edit)
@@ -1,27 +1,66 @@
+"""Authentication — password hashing, JWTs and the current-user dependencies.
+
+Resolved users are cached per id for a short TTL, so an authenticated request
+doesn't need a users round trip before doing real work. Any flushed change to a
+User (admin/installer toggles, Plex tokens, deletes) drops its entry right away
+and again after the commit. Endpoints that only need the id or roles can depend
+on get_claims, which returns a plain Claims object instead of a session-bound User.
+
+bcrypt runs in a small dedicated thread pool (it releases the GIL), so a burst
+of logins doesn't block the event loop for 100-300 ms per password.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import event, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 
 from .config import get_settings
 from .database import get_db
 from .models import User
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-security = HTTPBearer()
 settings = get_settings()
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.bcrypt_rounds)
+security = HTTPBearer()
+_hash_pool = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt")
+
+USER_CACHE_TTL = 30  # seconds
+USER_CACHE_SIZE = 1024
+
+_user_columns = [attr.key for attr in User.__mapper__.column_attrs]
+_user_cache: OrderedDict[int, tuple[float, dict]] = OrderedDict()  # user_id -> (expires, column values)
+_user_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
 
+@dataclass(frozen=True)
+class Claims:
+    """Who is calling — enough for endpoints that don't need the User row."""
+    id: int
+    username: str
+    is_admin: bool
+    is_installer: bool
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, pwd_context.hash, password)
 
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwd_context.verify(plain, hashed)
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(_hash_pool, pwd_context.verify, plain, hashed)
+
+
+def password_needs_rehash(hashed: str) -> bool:
+    """True if the hash was made with a different bcrypt cost than configured."""
+    return pwd_context.needs_update(hashed)
 
 
 def create_token(user_id: int, username: str) -> str:
@@ -33,23 +72,104 @@ def create_token(user_id: int, username: str) -> str:
     )
 
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db),
-) -> User:
+def _user_id_from_token(credentials: HTTPAuthorizationCredentials) -> int:
     try:
         payload = jwt.decode(credentials.credentials, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
-        user_id = int(payload["sub"])
+        return int(payload["sub"])
     except (JWTError, KeyError, ValueError):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
 
+
+def _cached_user(user_id: int) -> dict | None:
+    entry = _user_cache.get(user_id)
+    if entry and entry[0] > time.monotonic():
+        _user_cache.move_to_end(user_id)
+        _user_cache_stats["hits"] += 1
+        return entry[1]
+    _user_cache_stats["misses"] += 1
+    return None
+
+
+def _cache_user(user: User) -> dict:
+    values = {key: getattr(user, key) for key in _user_columns}
+    _user_cache[user.id] = (time.monotonic() + USER_CACHE_TTL, values)
+    _user_cache.move_to_end(user.id)
+    while len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
+    return values
+
+
+async def _load_user(db: AsyncSession, user_id: int) -> User:
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    _cache_user(user)
     return user
 
 
+def invalidate_user(*user_ids: int) -> None:
+    for user_id in user_ids:
+        if _user_cache.pop(user_id, None):
+            _user_cache_stats["invalidations"] += 1
+
+
+def user_cache_stats() -> dict:
+    return {**_user_cache_stats, "size": len(_user_cache)}
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_users(session: Session, flush_context) -> None:
+    user_ids = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User)}
+    if user_ids:
+        invalidate_user(*user_ids)
+        session.info.setdefault("user_invalidate", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_users_after_commit(session: Session) -> None:
+    user_ids = session.info.pop("user_invalidate", None)
+    if user_ids:
+        invalidate_user(*user_ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_user_invalidations(session: Session) -> None:
+    session.info.pop("user_invalidate", None)
+
+
+async def load_user(db: AsyncSession, user_id: int) -> User:
+    """User by id through the cache; raises 401 if it doesn't exist."""
+    values = _cached_user(user_id)
+    if values is None:
+        return await _load_user(db, user_id)
+
+    # Attach a copy to this session without a query; changes made by the
+    # caller are flushed as usual (and invalidate the cache entry).
+    user = User(**values)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    return await load_user(db, _user_id_from_token(credentials))
+
+
+async def get_claims(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> Claims:
+    user_id = _user_id_from_token(credentials)
+    values = _cached_user(user_id)
+    if values is None:
+        await _load_user(db, user_id)
+        values = _user_cache[user_id][1]
+    return Claims(id=user_id, username=values["username"], is_admin=values["is_admin"], is_installer=values["is_installer"])
+
+
 async def require_admin(user: User = Depends(get_current_user)) -> User:
     if not user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin required")
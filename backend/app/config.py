@@ -7,6 +7,12 @@ class Settings(BaseSettings):
     jwt_secret: str = "change-me-in-production"
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 43200  # 30 days
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    sync_log_retention_days: int = 90
+    nightly_sync_window_minutes: int = 120  # nightly full sync starts are spread over this window
+    sync_server_concurrency: int = 2  # concurrent sync scans per Plex/Jellyfin/Tautulli server
+    scheduler_intervals: dict[str, int] = {}  # job name -> seconds, e.g. SCHEDULER_INTERVALS='{"plex_sync": 1800}'
     tmdb_api_key: str = ""
     tmdb_access_token: str = ""
     cors_allowed_origins: str = "http://localhost:5173,http://localhost:3000"
@@ -1,6 +1,7 @@
 import asyncio
 import logging
 from contextlib import asynccontextmanager
+from datetime import datetime, time
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,7 +11,8 @@ from .auth import hash_password
 from .config import get_settings
 from .database import Base, async_session, engine
 from .models import User, Watchlist
-from .routers import admin, auth, friends, groups, jellyfin, matches, mcp, mcp_oauth, media, plex, radarr, sonarr, sync_overview, tautulli, watchlist
+from .routers import admin, auth, friends, groups, jellyfin, matches, mcp, mcp_oauth, media, plex, radarr, sonarr, sync_overview, tautulli, watchlist, webhooks
+from .services import api_keys, episode_progress, library_search, library_stats, nightly_sync, scheduler, sync_jobs, sync_log, titles, watch_history
 from .services.tautulli import sync_all_connected_users
 
 settings = get_settings()
@@ -28,277 +30,278 @@ async def _check_setup():
             logger.info("Fresh install — first Plex login will become admin")
 
 
-async def _tautulli_sync_loop():
-    """Background loop that syncs Tautulli history for all connected users."""
-    while True:
-        await asyncio.sleep(TAUTULLI_SYNC_INTERVAL)
-        try:
-            async with async_session() as db:
-                result = await sync_all_connected_users(db)
-                await db.commit()
-                if "error" not in result:
-                    logger.info(f"Tautulli auto-sync completed: {result}")
-        except Exception as e:
-            logger.error(f"Tautulli auto-sync failed: {e}")
+async def _tautulli_sync():
+    """Syncs Tautulli history for all connected users."""
+    async with async_session() as db:
+        result = await sync_all_connected_users(db)
+        await db.commit()
+        if "error" not in result:
+            logger.info(f"Tautulli auto-sync completed: {result}")
 
 
-PLEX_SYNC_INTERVAL = 5 * 60  # 5 minutes
+# Webhooks deliver Plex/Jellyfin plays immediately; polling only reconciles missed events.
+PLEX_SYNC_INTERVAL = 60 * 60  # 1 hour
+PLEX_SYNC_WINDOW_MINUTES = 75  # overlaps the interval so no play falls between two runs
 
 
-async def _plex_sync_loop():
-    """Background loop that syncs Plex watch status to watchlist + forwards to Jellyfin."""
-    from sqlalchemy import select
-    from .models import JellyfinServer, Movie, PlexServer, Watchlist
-    from .services import jellyfin as jf_svc, plex as plex_svc
+async def _plex_sync():
+    """Reconciliation: syncs recent Plex history per account to watchlist + forwards to Jellyfin."""
+    from sqlalchemy import or_, select
+    from .models import PlexServer, User
+    from .services import plex as plex_svc
+    from .services.watch_sync import forward_to_jellyfin, import_watched_episodes, load_import_target, mark_movies_watched
 
-    while True:
-        await asyncio.sleep(PLEX_SYNC_INTERVAL)
-        try:
-            async with async_session() as db:
-                result = await db.execute(select(PlexServer).where(PlexServer.enabled == True))
-                servers = result.scalars().all()
-                if not servers:
+    async with async_session() as db:
+        result = await db.execute(select(PlexServer).where(PlexServer.enabled == True))
+        servers = result.scalars().all()
+        if not servers:
+            return
+
+        users = (await db.execute(select(User).where(or_(User.plex_id != None, User.plex_username != None)))).scalars().all()
+        users_by_plex_id = {u.plex_id: u for u in users if u.plex_id}
+        users_by_plex_name = {u.plex_username.lower(): u for u in users if u.plex_username}
+
+        for srv in servers:
+            try:
+                recent = await plex_svc.get_watch_history_recent(srv.url, srv.token, minutes=PLEX_SYNC_WINDOW_MINUTES)
+                if not recent:
                     continue
+                accounts = await plex_svc.get_accounts(srv.url, srv.token)
+
+                # accountID -> history items
+                by_account: dict[int, list[dict]] = {}
+                for item in recent:
+                    if item.get("accountID") is not None:
+                        by_account.setdefault(item["accountID"], []).append(item)
+
+                show_tmdb_cache: dict[str, int | None] = {}
+                for account_id, items in by_account.items():
+                    account_name = (accounts.get(account_id) or "").lower()
+                    user = users_by_plex_id.get(str(account_id)) or users_by_plex_name.get(account_name)
+                    if not user:
+                        continue
 
-                synced_tmdb_ids = []  # Track what changed for cross-sync
-                for srv in servers:
-                    try:
-                        recent = await plex_svc.get_watch_history_recent(srv.url, srv.token, minutes=8)
-                        for item in recent:
-                            tmdb_id = None
-                            for guid in item.get("guids", []):
-                                if isinstance(guid, str) and guid.startswith("tmdb://"):
-                                    tmdb_id = int(guid.replace("tmdb://", ""))
-                                    break
-                            if not tmdb_id:
-                                continue
-
-                            result = await db.execute(select(Movie).where(Movie.tmdb_id == tmdb_id, Movie.status != "watched"))
-                            movies = result.scalars().all()
-                            for movie in movies:
-                                movie.status = "watched"
-                                synced_tmdb_ids.append((tmdb_id, movie.media_type, movie.watchlist_id))
-
-                    except Exception as e:
-                        logger.error(f"Plex sync failed for server {srv.name}: {e}")
-
-                if synced_tmdb_ids:
+                    movie_tmdb_ids = set()
+                    movie_viewed_at: dict[int, datetime] = {}
+                    movie_titles: dict[int, tuple[str, object]] = {}
+                    shows: dict[str, dict] = {}  # grandparentRatingKey -> {title, episodes}
+                    for item in items:
+                        if item.get("type") == "movie":
+                            tmdb_id = plex_svc.extract_tmdb_id(item.get("guids"))
+                            if tmdb_id:
+                                movie_tmdb_ids.add(tmdb_id)
+                                movie_titles[tmdb_id] = (item.get("title"), item.get("year"))
+                                if item.get("viewedAt"):
+                                    movie_viewed_at[tmdb_id] = datetime.utcfromtimestamp(int(item["viewedAt"]))
+                        elif item.get("type") == "episode" and item.get("grandparentRatingKey") and item.get("parentIndex") and item.get("index"):
+                            show = shows.setdefault(item["grandparentRatingKey"], {"title": item.get("grandparentTitle"), "episodes": {}})
+                            show["episodes"].setdefault(str(item["parentIndex"]), []).append(item["index"])
+
+                    wl_ids, default_wl = await load_import_target(db, user.id)
+                    changed = await mark_movies_watched(
+                        db, user.id, movie_tmdb_ids, "plex", movie_viewed_at,
+                        default_wl_id=default_wl.id if default_wl else None, titles=movie_titles,
+                    )
+
+                    show_changes = 0
+                    if shows:
+                        for rating_key, show in shows.items():
+                            if rating_key not in show_tmdb_cache:
+                                try:
+                                    detail = await plex_svc.get_metadata(srv.url, srv.token, rating_key)
+                                    show_tmdb_cache[rating_key] = plex_svc.extract_tmdb_id(detail.get("guids"))
+                                except Exception:
+                                    show_tmdb_cache[rating_key] = None
+                            tmdb_id = show_tmdb_cache[rating_key]
+                            if tmdb_id and default_wl and await import_watched_episodes(
+                                db, wl_ids, default_wl.id, tmdb_id, show["title"], show["episodes"], user_id=user.id, source="plex",
+                            ):
+                                show_changes += 1
+
+                    if not changed and not show_changes:
+                        continue
                     await db.commit()
-                    logger.info(f"Plex sync: updated {len(synced_tmdb_ids)} to watched")
-
-                    # Cross-sync: forward to Jellyfin
-                    jf_servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.enabled == True))).scalars().all()
-                    for jf_srv in jf_servers:
-                        for tmdb_id, media_type, _ in synced_tmdb_ids:
-                            try:
-                                item = await jf_svc.find_by_tmdb(jf_srv.url, jf_srv.token, jf_srv.jellyfin_user_id, tmdb_id, media_type or "tv")
-                                if item and not item.get("played"):
-                                    await jf_svc.mark_watched(jf_srv.url, jf_srv.token, jf_srv.jellyfin_user_id, item["id"])
-                            except Exception:
-                                pass
-                    if jf_servers:
-                        logger.info(f"Cross-sync: forwarded {len(synced_tmdb_ids)} to Jellyfin")
-        except Exception as e:
-            logger.error(f"Plex sync loop failed: {e}")
+                    logger.info(f"Plex sync: {len(changed)} movies, {show_changes} shows updated for {user.username} on {srv.name}")
+
+                    # Cross-sync: forward to the user's Jellyfin servers
+                    if changed:
+                        forwarded = await forward_to_jellyfin(db, user.id, [(tmdb_id, "movie") for tmdb_id in changed])
+                        if forwarded:
+                            logger.info(f"Cross-sync: forwarded {forwarded} to Jellyfin")
+
+            except Exception as e:
+                logger.error(f"Plex sync failed for server {srv.name}: {e}")
 
 
 PLEX_DISCOVER_INTERVAL = 60 * 60  # 1 hour
 
 
-async def _plex_discover_loop():
-    """Background loop that auto-discovers new Plex servers."""
+async def _plex_discover():
+    """Auto-discovers new Plex servers."""
     from sqlalchemy import select
     from .models import PlexServer, User
     from .services import plex as plex_svc
 
+    async with async_session() as db:
+        # Find a user with plex token
+        result = await db.execute(select(User).where(User.plex_token != None).limit(1))
+        user = result.scalar_one_or_none()
+        if not user:
+            return
+
+        discovered = await plex_svc.discover_servers(user.plex_token)
+        existing = {s.machine_id: s for s in (await db.execute(select(PlexServer))).scalars().all() if s.machine_id}
+
+        import re
+        ip_pattern = re.compile(r'https?://\d+\.\d+\.\d+\.\d+')
+
+        added = 0
+        for srv in discovered:
+            mid = srv["machine_id"]
+            if mid in existing:
+                new_url = srv["url"].rstrip("/")
+                if existing[mid].url != new_url and ip_pattern.match(existing[mid].url):
+                    existing[mid].url = new_url
+                if srv.get("token"):
+                    existing[mid].token = srv["token"]
+                continue
+            db.add(PlexServer(name=srv["name"], url=srv["url"].rstrip("/"), token=srv.get("token", user.plex_token), machine_id=mid, enabled=True))
+            added += 1
+
+        if added > 0:
+            await db.commit()
+            logger.info(f"Plex auto-discover: added {added} new servers")
+
+
+MEDIA_INDEX_INTERVAL = 30 * 60  # 30 minutes
+MEDIA_INDEX_STARTUP_DELAY = 60
+
+
+async def _media_index_refresh():
+    """Refreshes stream/technical info of all Plex + Jellyfin libraries."""
+    from .services.media_index import refresh_all
+
+    result = await refresh_all()
+    if result["plex"] or result["jellyfin"]:
+        logger.info(f"Media index refreshed: {result}")
+
+
+async def _api_key_flush_loop():
+    """Writes MCP API key last_used values in batches (see services.api_keys)."""
     while True:
-        await asyncio.sleep(PLEX_DISCOVER_INTERVAL)
+        await asyncio.sleep(api_keys.FLUSH_INTERVAL)
         try:
-            async with async_session() as db:
-                # Find a user with plex token
-                result = await db.execute(select(User).where(User.plex_token != None).limit(1))
-                user = result.scalar_one_or_none()
-                if not user:
-                    continue
+            await api_keys.flush_last_used()
+        except Exception as e:
+            logger.error(f"API key last_used flush failed: {e}")
 
-                discovered = await plex_svc.discover_servers(user.plex_token)
-                existing = {s.machine_id: s for s in (await db.execute(select(PlexServer))).scalars().all() if s.machine_id}
-
-                import re
-                ip_pattern = re.compile(r'https?://\d+\.\d+\.\d+\.\d+')
-
-                added = 0
-                for srv in discovered:
-                    mid = srv["machine_id"]
-                    if mid in existing:
-                        new_url = srv["url"].rstrip("/")
-                        if existing[mid].url != new_url and ip_pattern.match(existing[mid].url):
-                            existing[mid].url = new_url
-                        if srv.get("token"):
-                            existing[mid].token = srv["token"]
-                        continue
-                    db.add(PlexServer(name=srv["name"], url=srv["url"].rstrip("/"), token=srv.get("token", user.plex_token), machine_id=mid, enabled=True))
-                    added += 1
 
-                if added > 0:
-                    await db.commit()
-                    logger.info(f"Plex auto-discover: added {added} new servers")
+async def _sync_log_flush_loop():
+    """Writes buffered sync log events in batches (see services.sync_log)."""
+    while True:
+        await sync_log.wait_for_batch()
+        try:
+            await sync_log.flush()
         except Exception as e:
-            logger.error(f"Plex discover loop failed: {e}")
+            logger.error(f"Sync log flush failed: {e}")
 
 
-JELLYFIN_SYNC_INTERVAL = 5 * 60  # 5 minutes
+PRUNE_INTERVAL = 24 * 60 * 60  # daily
 
 
-async def _jellyfin_sync_loop():
-    """Background loop that syncs Jellyfin watch history + forwards to Plex."""
-    from .models import JellyfinServer, Movie, User, Watchlist as WL
-    from .services import jellyfin as jf_svc, plex as plex_svc
+async def _prune_old_rows():
+    """Deletes sync logs, finished sync jobs and scheduler runs older than their retention period."""
+    pruned = await sync_log.prune()
+    if pruned:
+        logger.info(f"Sync log retention: {pruned} old entries deleted")
+    await sync_jobs.prune()
+    await scheduler.prune()
 
-    while True:
-        await asyncio.sleep(JELLYFIN_SYNC_INTERVAL)
-        try:
-            async with async_session() as db:
-                servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.enabled == True))).scalars().all()
-                if not servers:
+
+USER_STATS_CHECK_INTERVAL = 6 * 60 * 60  # 6 hours
+
+
+async def _user_stats_check():
+    """Recomputes user_stats and repairs drift (see services.library_stats)."""
+    repaired = await library_stats.check_and_repair()
+    if repaired:
+        logger.warning(f"user_stats drift repaired for users {repaired}")
+
+
+JELLYFIN_SYNC_INTERVAL = 60 * 60  # 1 hour (webhooks handle live events)
+
+
+async def _jellyfin_sync():
+    """Reconciliation: syncs Jellyfin watch history + forwards to Plex."""
+    from .models import JellyfinServer, User
+    from .services import jellyfin as jf_svc
+    from .services.watch_sync import forward_to_plex, import_watched_episodes, import_watched_movie, load_import_target
+
+    async with async_session() as db:
+        servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.enabled == True))).scalars().all()
+        if not servers:
+            return
+
+        for srv in servers:
+            try:
+                shows = await jf_svc.get_watched_episodes(srv.url, srv.token, srv.jellyfin_user_id, server_id=srv.id)
+                movies_watched = await jf_svc.get_watched_movies(srv.url, srv.token, srv.jellyfin_user_id, server_id=srv.id)
+
+                all_wl_ids, default_wl = await load_import_target(db, srv.user_id)
+                if not default_wl:
                     continue
 
-                for srv in servers:
-                    try:
-                        shows = await jf_svc.get_watched_episodes(srv.url, srv.token, srv.jellyfin_user_id)
-                        movies_watched = await jf_svc.get_watched_movies(srv.url, srv.token, srv.jellyfin_user_id)
-
-                        all_wls = (await db.execute(select(WL).where(WL.owner_id == srv.user_id))).scalars().all()
-                        all_wl_ids = [w.id for w in all_wls]
-                        default_wl = next((w for w in all_wls if w.is_default), all_wls[0] if all_wls else None)
-                        if not default_wl:
-                            continue
-
-                        synced = 0
-                        synced_tmdb_ids = []
-
-                        for m in movies_watched:
-                            existing = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(all_wl_ids), Movie.tmdb_id == m["tmdb_id"]))).scalars().first()
-                            if existing:
-                                if existing.status not in ("watched", "dropped"):
-                                    existing.status = "watched"
-                                    synced += 1
-                                    synced_tmdb_ids.append((m["tmdb_id"], "movie"))
-                            else:
-                                db.add(Movie(watchlist_id=default_wl.id, title=m["name"], year=str(m.get("year", "")), tmdb_id=m["tmdb_id"], media_type="movie", status="watched"))
-                                synced += 1
-                                synced_tmdb_ids.append((m["tmdb_id"], "movie"))
-
-                        for show in shows:
-                            existing = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(all_wl_ids), Movie.tmdb_id == show["tmdb_id"]))).scalars().first()
-                            progress = show["episodes"]
-                            total_watched = sum(len(eps) for eps in progress.values())
-                            status = "watching" if total_watched > 0 else "watchlist"
-
-                            if existing:
-                                old_p = existing.watch_progress or {}
-                                changed = False
-                                for s, eps in progress.items():
-                                    old_eps = set(old_p.get(s, []))
-                                    new_eps = set(eps)
-                                    if not new_eps.issubset(old_eps):
-                                        old_eps.update(new_eps)
-                                        old_p[s] = sorted(list(old_eps))
-                                        changed = True
-                                if changed:
-                                    existing.watch_progress = old_p
-                                    if existing.status not in ("watched", "dropped"):
-                                        existing.status = status
-                                    synced += 1
-                            else:
-                                db.add(Movie(watchlist_id=default_wl.id, title=show["name"], tmdb_id=show["tmdb_id"], media_type="tv", status=status, watch_progress=progress))
-                                synced += 1
-
-                        if synced > 0:
-                            await db.commit()
-                            logger.info(f"Jellyfin auto-sync: {synced} changes for user {srv.user_id}")
-
-                            # Cross-sync: forward new watched to Plex
-                            user = (await db.execute(select(User).where(User.id == srv.user_id))).scalar_one_or_none()
-                            if user and user.plex_token and synced_tmdb_ids:
-                                try:
-                                    plex_servers = await plex_svc.discover_servers(user.plex_token)
-                                    for ps in plex_servers:
-                                        for tmdb_id, media_type in synced_tmdb_ids:
-                                            try:
-                                                token = ps.get("token", user.plex_token)
-                                                item = await plex_svc.find_by_guid(ps["url"], token, tmdb_id, media_type)
-                                                if item:
-                                                    plex_type = "show" if media_type == "tv" else "movie"
-                                                    await plex_svc.mark_watched(ps["url"], token, item["ratingKey"], plex_type)
-                                            except Exception:
-                                                pass
-                                    logger.info(f"Cross-sync: forwarded {len(synced_tmdb_ids)} from Jellyfin to Plex")
-                                except Exception:
-                                    pass
+                synced = 0
+                synced_tmdb_ids = []
 
-                    except Exception as e:
-                        logger.error(f"Jellyfin auto-sync failed for {srv.name}: {e}")
-        except Exception as e:
-            logger.error(f"Jellyfin sync loop failed: {e}")
+                for m in movies_watched:
+                    if await import_watched_movie(db, all_wl_ids, default_wl.id, m["tmdb_id"], m["name"], m.get("year"), user_id=srv.user_id, source="jellyfin"):
+                        synced += 1
+                        synced_tmdb_ids.append((m["tmdb_id"], "movie"))
 
+                for show in shows:
+                    if await import_watched_episodes(db, all_wl_ids, default_wl.id, show["tmdb_id"], show["name"], show["episodes"], user_id=srv.user_id, source="jellyfin"):
+                        synced += 1
 
-async def _nightly_full_sync():
-    """Run full Plex + Jellyfin + Tautulli sync once at 3 AM for ALL users."""
-    from .routers.plex import _run_full_plex_sync
-    from .routers.jellyfin import _run_jellyfin_sync
-    from .models import TautulliServer, UserPlexConnection
-    from .services.tautulli import sync_user_history
+                if synced > 0:
+                    await db.commit()
+                    logger.info(f"Jellyfin auto-sync: {synced} changes for user {srv.user_id}")
 
-    while True:
-        import datetime
-        now = datetime.datetime.now()
-        target = now.replace(hour=3, minute=0, second=0, microsecond=0)
-        if target <= now:
-            target += datetime.timedelta(days=1)
-        wait_seconds = (target - now).total_seconds()
-        logger.info(f"Nightly sync scheduled in {wait_seconds/3600:.1f} hours")
-        await asyncio.sleep(wait_seconds)
+                    # Cross-sync: forward new watched to Plex
+                    user = (await db.execute(select(User).where(User.id == srv.user_id))).scalar_one_or_none()
+                    if user and synced_tmdb_ids:
+                        await forward_to_plex(user, synced_tmdb_ids)
+                        logger.info(f"Cross-sync: forwarded {len(synced_tmdb_ids)} from Jellyfin to Plex")
+
+            except Exception as e:
+                logger.error(f"Jellyfin auto-sync failed for {srv.name}: {e}")
+
+
+async def _nightly_full_sync() -> dict:
+    """Full Plex + Jellyfin + Tautulli sync for all users, spread over the night (see services.nightly_sync)."""
+    report = await nightly_sync.run()
+    logger.info(f"Nightly sync done: {report}")
+    return report
 
-        try:
-            async with async_session() as db:
-                users = (await db.execute(select(User))).scalars().all()
-
-            for user in users:
-                try:
-                    logger.info(f"Nightly sync starting for {user.username}")
-
-                    # Plex (if user has token)
-                    if user.plex_token:
-                        try:
-                            await _run_full_plex_sync(user.id)
-                        except Exception as e:
-                            logger.error(f"Nightly Plex sync failed for {user.username}: {e}")
-
-                    # Jellyfin
-                    try:
-                        await _run_jellyfin_sync(user.id)
-                    except Exception as e:
-                        logger.error(f"Nightly Jellyfin sync failed for {user.username}: {e}")
-
-                    # Tautulli
-                    try:
-                        async with async_session() as db:
-                            conn = (await db.execute(select(UserPlexConnection).where(UserPlexConnection.user_id == user.id))).scalar_one_or_none()
-                            if conn:
-                                srv = (await db.execute(select(TautulliServer).where(TautulliServer.id == conn.server_id, TautulliServer.enabled == True))).scalar_one_or_none()
-                                if srv:
-                                    await sync_user_history(user, conn, srv, db)
-                                    await db.commit()
-                                    logger.info(f"Nightly Tautulli sync done for {user.username}")
-                    except Exception as e:
-                        logger.error(f"Nightly Tautulli sync failed for {user.username}: {e}")
-
-                    logger.info(f"Nightly sync completed for {user.username}")
-                except Exception as e:
-                    logger.error(f"Nightly sync failed for {user.username}: {e}")
-        except Exception as e:
-            logger.error(f"Nightly sync failed: {e}")
+
+NIGHTLY_SYNC_AT = time(3, 0)
+
+# Run on one worker at a time via services.scheduler; intervals can be overridden
+# per name with SCHEDULER_INTERVALS. Jitter (~10 %) keeps the jobs from lining up.
+SCHEDULED_JOBS = [
+    scheduler.Job("tautulli_sync", _tautulli_sync, TAUTULLI_SYNC_INTERVAL, jitter=180),
+    scheduler.Job("plex_sync", _plex_sync, PLEX_SYNC_INTERVAL, jitter=300),
+    scheduler.Job("plex_discover", _plex_discover, PLEX_DISCOVER_INTERVAL, jitter=360),
+    scheduler.Job("jellyfin_sync", _jellyfin_sync, JELLYFIN_SYNC_INTERVAL, jitter=360),
+    scheduler.Job("media_index", _media_index_refresh, MEDIA_INDEX_INTERVAL, jitter=180,
+                  first_delay=MEDIA_INDEX_STARTUP_DELAY),
+    scheduler.Job("user_stats_check", _user_stats_check, USER_STATS_CHECK_INTERVAL, jitter=1800),
+    scheduler.Job("retention", _prune_old_rows, PRUNE_INTERVAL, jitter=3600, first_delay=60),
+    # Starts spread over NIGHTLY_SYNC_WINDOW_MINUTES by the job itself; a nightly run
+    # missed by more than 6 hours is skipped rather than started during the day
+    scheduler.Job("nightly_full_sync", _nightly_full_sync, 24 * 60 * 60, daily_at=NIGHTLY_SYNC_AT,
+                  misfire_grace=6 * 60 * 60),
+]
 
 
 async def _run_migrations():
@@ -318,11 +321,42 @@ async def _run_migrations():
         "ALTER TABLE sonarr_servers ADD COLUMN IF NOT EXISTS enabled BOOLEAN DEFAULT TRUE",
         "ALTER TABLE radarr_servers ADD COLUMN IF NOT EXISTS enabled BOOLEAN DEFAULT TRUE",
         "ALTER TABLE plex_servers ADD COLUMN IF NOT EXISTS enabled BOOLEAN DEFAULT TRUE",
+        "CREATE INDEX IF NOT EXISTS ix_movies_watchlist_created ON movies (watchlist_id, created_at DESC, id DESC)",
+        # Sync log retention (services/sync_log.py) and the overview's recent logs
+        "CREATE INDEX IF NOT EXISTS ix_sync_logs_created ON sync_logs (created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_sync_logs_user_created ON sync_logs (user_id, created_at DESC)",
+        # Library search (services/library_search.py) — expression must match movie_tsvector()
+        "CREATE INDEX IF NOT EXISTS ix_movies_fts ON movies USING GIN "
+        "(to_tsvector('simple'::regconfig, coalesce(title, '') || ' ' || coalesce(overview, '')))",
+        "CREATE INDEX IF NOT EXISTS ix_movies_tags ON movies USING GIN (tags jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_movies_genres ON movies USING GIN (genres jsonb_path_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_titles_fts ON titles USING GIN "
+        "(to_tsvector('simple'::regconfig, coalesce(title, '') || ' ' || coalesce(overview, '')))",
+        "CREATE INDEX IF NOT EXISTS ix_titles_genres ON titles USING GIN (genres jsonb_path_ops)",
+        "ALTER TABLE scheduled_runs ADD COLUMN IF NOT EXISTS result JSONB",
+        # Watch history keeps rewatches: one event per (item, source, watched_at)
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_watch_events_event ON watch_events "
+        "(user_id, tmdb_id, media_type, season, episode, source, watched_at) NULLS NOT DISTINCT",
     ]
+    migrations.append(titles.BACKFILL_SQL)  # one-time, only while titles is empty
+    migrations.append(titles.CLEAR_COPIES_SQL)
+    migrations += episode_progress.SQL_FUNCTIONS
+    migrations.append(watch_history.BACKFILL_SQL)  # one-time, only while watch_events is empty
+    migrations += library_stats.SQL_TRIGGERS
+    migrations.append(library_stats.BACKFILL_SQL)  # one-time, only while user_stats is empty
     async with engine.begin() as conn:
         for sql in migrations:
             await conn.execute(text(sql))
 
+    # pg_trgm needs CREATE privilege on the database; search falls back to ILIKE without it
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_movies_title_trgm ON movies USING GIN (title gin_trgm_ops)"))
+        library_search.set_trigram_available(True)
+    except Exception as e:
+        logger.warning(f"pg_trgm not available, title search without trigram matching: {e}")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -331,38 +365,36 @@ async def lifespan(app: FastAPI):
     await _run_migrations()
     await _check_setup()
 
-    # Start background sync loops
-    sync_task = asyncio.create_task(_tautulli_sync_loop())
-    plex_sync_task = asyncio.create_task(_plex_sync_loop())
-    plex_discover_task = asyncio.create_task(_plex_discover_loop())
-    jellyfin_sync_task = asyncio.create_task(_jellyfin_sync_loop())
-    nightly_task = asyncio.create_task(_nightly_full_sync())
+    # Periodic jobs run on whichever worker holds their lease; the flush loops
+    # drain this process's own buffers and run everywhere
+    scheduler_task = asyncio.create_task(scheduler.run_forever(SCHEDULED_JOBS))
+    api_key_flush_task = asyncio.create_task(_api_key_flush_loop())
+    sync_log_flush_task = asyncio.create_task(_sync_log_flush_loop())
     yield
-    sync_task.cancel()
-    plex_sync_task.cancel()
-    plex_discover_task.cancel()
-    jellyfin_sync_task.cancel()
-    nightly_task.cancel()
+    scheduler_task.cancel()
+    api_key_flush_task.cancel()
     try:
-        await sync_task
+        await scheduler_task
     except asyncio.CancelledError:
         pass
     try:
-        await plex_sync_task
+        await api_key_flush_task
     except asyncio.CancelledError:
         pass
+    # Stopped last so events logged by the loops above while shutting down are written too
+    sync_log_flush_task.cancel()
     try:
-        await plex_discover_task
+        await sync_log_flush_task
     except asyncio.CancelledError:
         pass
     try:
-        await jellyfin_sync_task
-    except asyncio.CancelledError:
-        pass
+        await sync_log.flush()
+    except Exception as e:
+        logger.error(f"Sync log flush failed: {e}")
     try:
-        await nightly_task
-    except asyncio.CancelledError:
-        pass
+        await api_keys.flush_last_used()
+    except Exception as e:
+        logger.error(f"API key last_used flush failed: {e}")
     await engine.dispose()
 
 
@@ -378,6 +410,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],
 )
 
 app.include_router(admin.router)
@@ -395,6 +428,7 @@ app.include_router(jellyfin.router)
 app.include_router(sync_overview.router)
 app.include_router(mcp.router)
 app.include_router(mcp_oauth.router)
+app.include_router(webhooks.router)
 
 
 @app.get("/api/health")
@@ -1,16 +1,22 @@
 from datetime import datetime
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    UniqueConstraint,
     func,
+    inspect,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
@@ -69,6 +75,48 @@ class WatchlistShare(Base):
     user: Mapped["User"] = relationship()
 
 
+class Title(Base):
+    """TMDB metadata, stored once per (tmdb_id, media_type) and shared by all movies rows."""
+    __tablename__ = "titles"
+    __table_args__ = (UniqueConstraint("tmdb_id", "media_type", name="uq_titles_tmdb"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tmdb_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    media_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    title: Mapped[str | None] = mapped_column(String(500))
+    year: Mapped[str | None] = mapped_column(String(10))
+    poster_url: Mapped[str | None] = mapped_column(Text)
+    backdrop_path: Mapped[str | None] = mapped_column(Text)
+    overview: Mapped[str | None] = mapped_column(Text)
+    vote_average: Mapped[float | None] = mapped_column(Float)
+    genres: Mapped[list | None] = mapped_column(JSONB)
+    enriched_at: Mapped[datetime | None] = mapped_column(DateTime)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+def _shared_field(name: str) -> hybrid_property:
+    """Movie attribute read from the row's own column, falling back to the shared Title row.
+
+    Writes go to movies.<name> only, so a user's value never reaches other users' movies.
+    In SQL the fallback reads titles directly: queries using it must outer-join Movie.shared.
+    """
+    own = f"_{name}"
+
+    def fget(self):
+        value = getattr(self, own)
+        if value is None and "shared" not in inspect(self).unloaded and self.shared is not None:
+            return getattr(self.shared, name)
+        return value
+
+    def fset(self, value):
+        setattr(self, own, value)
+
+    def expr(cls):
+        return func.coalesce(getattr(cls, own), getattr(Title, name)).label(name)
+
+    return hybrid_property(fget, fset, expr=expr)
+
+
 class Movie(Base):
     __tablename__ = "movies"
 
@@ -77,13 +125,14 @@ class Movie(Base):
     group_id: Mapped[int | None] = mapped_column(ForeignKey("group_watchlists.id", ondelete="CASCADE"), nullable=True)
     title: Mapped[str] = mapped_column(String(500), nullable=False)
     year: Mapped[str | None] = mapped_column(String(10))
-    poster_url: Mapped[str | None] = mapped_column(Text)
-    backdrop_path: Mapped[str | None] = mapped_column(Text)
-    overview: Mapped[str | None] = mapped_column(Text)
+    # Own metadata columns — only a user's overrides of the shared Title, NULL otherwise (see services/titles.py)
+    _poster_url: Mapped[str | None] = mapped_column("poster_url", Text)
+    _backdrop_path: Mapped[str | None] = mapped_column("backdrop_path", Text)
+    _overview: Mapped[str | None] = mapped_column("overview", Text)
+    _vote_average: Mapped[float | None] = mapped_column("vote_average", Float)
+    _genres: Mapped[dict | None] = mapped_column("genres", JSONB)
     tmdb_id: Mapped[int | None] = mapped_column(Integer)
     media_type: Mapped[str | None] = mapped_column(String(20))
-    vote_average: Mapped[float | None] = mapped_column(Float)
-    genres: Mapped[dict | None] = mapped_column(JSONB)
     status: Mapped[str] = mapped_column(String(20), default="watchlist")
     rating: Mapped[int | None] = mapped_column(Integer)
     notes: Mapped[str | None] = mapped_column(Text)
@@ -93,6 +142,16 @@ class Movie(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
     watchlist: Mapped["Watchlist"] = relationship(back_populates="movies")
+    shared: Mapped[Title | None] = relationship(
+        primaryjoin="and_(foreign(Movie.tmdb_id) == Title.tmdb_id, foreign(Movie.media_type) == Title.media_type)",
+        viewonly=True, lazy="joined",
+    )
+
+    poster_url = _shared_field("poster_url")
+    backdrop_path = _shared_field("backdrop_path")
+    overview = _shared_field("overview")
+    vote_average = _shared_field("vote_average")
+    genres = _shared_field("genres")
 
 
 class Friend(Base):
@@ -289,6 +348,86 @@ class PlexServer(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
 
+class PlexDiscoverKey(Base):
+    """Persistent cache: TMDB title → ratingKey on Plex's discover provider (cloud watchlist)."""
+    __tablename__ = "plex_discover_keys"
+    __table_args__ = (UniqueConstraint("tmdb_id", "media_type", name="uq_plex_discover_keys_tmdb"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    tmdb_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    media_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    rating_key: Mapped[str] = mapped_column(String(100), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+class MediaIndexEntry(Base):
+    """Precomputed technical + stream-language info per media server and title.
+
+    server_key is the Plex machine_id or the JellyfinServer id; source_version is
+    Plex' updatedAt / Jellyfin's Etag so unchanged items are not re-fetched.
+    """
+    __tablename__ = "media_index"
+    __table_args__ = (UniqueConstraint("source", "server_key", "tmdb_id", "media_type", name="uq_media_index_item"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    source: Mapped[str] = mapped_column(String(20), nullable=False)  # plex / jellyfin
+    server_key: Mapped[str] = mapped_column(String(100), nullable=False)
+    tmdb_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    media_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    item_key: Mapped[str] = mapped_column(String(100), nullable=False)  # Plex ratingKey / Jellyfin item id
+    title: Mapped[str | None] = mapped_column(String(500))
+    year: Mapped[int | None] = mapped_column(Integer)
+    video_resolution: Mapped[str | None] = mapped_column(String(20))
+    video_codec: Mapped[str | None] = mapped_column(String(50))
+    audio_codec: Mapped[str | None] = mapped_column(String(50))
+    audio_channels: Mapped[int | None] = mapped_column(Integer)
+    file_size: Mapped[int | None] = mapped_column(BigInteger)
+    audio_languages: Mapped[list | None] = mapped_column(JSONB, default=[])
+    subtitle_languages: Mapped[list | None] = mapped_column(JSONB, default=[])
+    seasons: Mapped[list | None] = mapped_column(JSONB)  # [{"number", "episodes", "viewedEpisodes"}] for shows
+    source_version: Mapped[str | None] = mapped_column(String(100))
+    # View state of the indexing account (Plex server token / the Jellyfin connection's user)
+    view_count: Mapped[int | None] = mapped_column(Integer)
+    last_viewed_at: Mapped[datetime | None] = mapped_column(DateTime)
+    played: Mapped[bool | None] = mapped_column(Boolean)
+    indexed_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class WatchEvent(Base):
+    """Append-only watch history: one row per watch of a movie / episode, rewatches included.
+
+    watch_progress and movie statuses are derived from newly recorded events (services/watch_history.py).
+    """
+    __tablename__ = "watch_events"
+    __table_args__ = (
+        Index("uq_watch_events_event", "user_id", "tmdb_id", "media_type", "season", "episode", "source", "watched_at",
+              unique=True, postgresql_nulls_not_distinct=True),
+        Index("ix_watch_events_user_watched", "user_id", text("watched_at DESC"), text("id DESC")),
+        Index("ix_watch_events_user_tmdb", "user_id", "tmdb_id"),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    tmdb_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    media_type: Mapped[str] = mapped_column(String(20), nullable=False)
+    season: Mapped[int | None] = mapped_column(Integer)  # NULL for movies
+    episode: Mapped[int | None] = mapped_column(Integer)
+    source: Mapped[str] = mapped_column(String(20), nullable=False)  # plex, jellyfin, tautulli, app, backfill
+    watched_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+
+
+class UserStat(Base):
+    """Per-user counters by (media_type, status), kept current by triggers on movies (services/library_stats.py)."""
+    __tablename__ = "user_stats"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    media_type: Mapped[str] = mapped_column(String(20), primary_key=True)  # '' for unknown
+    status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    items: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    episodes: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
 class SyncLog(Base):
     __tablename__ = "sync_logs"
 
@@ -303,6 +442,57 @@ class SyncLog(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
 
 
+class SyncJob(Base):
+    """A background sync run; status endpoints read it, so any worker can report and guard it (services/sync_jobs.py)."""
+    __tablename__ = "sync_jobs"
+    __table_args__ = (
+        # At most one running job per user and kind, across all workers
+        Index("uq_sync_jobs_running", "user_id", "kind", unique=True, postgresql_where=text("status = 'running'")),
+        Index("ix_sync_jobs_user_kind", "user_id", "kind", text("id DESC")),
+    )
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)  # plex, jellyfin, full
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="running")  # running, done, error, cancelled
+    progress: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+    error: Mapped[str | None] = mapped_column(Text)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    worker: Mapped[str | None] = mapped_column(String(100))
+    started_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    heartbeat_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now())
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+
+class ScheduledJob(Base):
+    """Schedule and lease of a background job; whichever worker claims the lease runs it (services/scheduler.py)."""
+    __tablename__ = "scheduled_jobs"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    next_run_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    lease_owner: Mapped[str | None] = mapped_column(String(100))
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime)
+    last_started_at: Mapped[datetime | None] = mapped_column(DateTime)
+    last_finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+    last_status: Mapped[str | None] = mapped_column(String(20))  # running, ok, error, skipped, cancelled
+    last_error: Mapped[str | None] = mapped_column(Text)
+
+
+class ScheduledRun(Base):
+    __tablename__ = "scheduled_runs"
+    __table_args__ = (Index("ix_scheduled_runs_job", "job", text("id DESC")),)
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    job: Mapped[str] = mapped_column(String(50), nullable=False)
+    worker: Mapped[str] = mapped_column(String(100), nullable=False)
+    due_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    error: Mapped[str | None] = mapped_column(Text)
+    result: Mapped[dict | None] = mapped_column(JSONB)  # summary returned by the job, e.g. nightly timings
+
+
 class ApiKey(Base):
     __tablename__ = "api_keys"
 
@@ -7,10 +7,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..auth import get_current_user, require_admin
+from ..auth import get_current_user, require_admin, user_cache_stats
 from ..config import get_settings
 from ..database import get_db
 from ..models import ApiKey, DownloadProfile, JellyfinServer, Movie, PlexServer, RadarrServer, SonarrServer, SystemSetting, TautulliServer, User, Watchlist
+from ..services import api_keys, scheduler, server_budget, sync_log
 
 
 def _get_fernet():
@@ -45,6 +46,9 @@ async def system_stats(user: User = Depends(require_admin), db: AsyncSession = D
         "users": users.scalar(),
         "movies": movies.scalar(),
         "watchlists": watchlists.scalar(),
+        "user_cache": user_cache_stats(),
+        "sync_log": sync_log.stats(),
+        "server_budget": server_budget.stats(),
     }
 
 
@@ -112,6 +116,27 @@ async def set_jellyfin_login_url(data: dict, user: User = Depends(require_admin)
     return {"url": url or None}
 
 
+def _webhook_urls(token: str) -> dict:
+    return {
+        "token": token,
+        "plex_url": f"/api/webhooks/plex?token={token}",
+        "jellyfin_url": f"/api/webhooks/jellyfin?token={token}",
+    }
+
+
+@router.get("/settings/webhook-token")
+async def get_webhook_token(user: User = Depends(require_admin), db: AsyncSession = Depends(get_db)):
+    """Token for the Plex/Jellyfin webhook URLs (created on first access)."""
+    from .webhooks import get_webhook_token as _get_token
+    return _webhook_urls(await _get_token(db, create=True))
+
+
+@router.post("/settings/webhook-token")
+async def regenerate_webhook_token(user: User = Depends(require_admin), db: AsyncSession = Depends(get_db)):
+    from .webhooks import get_webhook_token as _get_token
+    return _webhook_urls(await _get_token(db, regenerate=True))
+
+
 # --- Admin Full Export/Import ---
 
 
@@ -258,6 +283,24 @@ async def toggle_service(service_type: str, server_id: int, user: User = Depends
     return {"id": server.id, "name": server.name, "enabled": server.enabled}
 
 
+# --- Scheduler ---
+
+
+@router.get("/scheduler")
+async def scheduler_overview(user: User = Depends(require_admin), db: AsyncSession = Depends(get_db)):
+    """Background jobs: next run, current leader, last outcome and recent runs."""
+    from ..main import SCHEDULED_JOBS
+    return await scheduler.overview(db, SCHEDULED_JOBS)
+
+
+@router.post("/scheduler/{name}/run")
+async def run_scheduled_job(name: str, user: User = Depends(require_admin), db: AsyncSession = Depends(get_db)):
+    """Make a background job due now; a worker picks it up within seconds."""
+    if not await scheduler.trigger(db, name):
+        raise HTTPException(status_code=404, detail="Job nicht gefunden")
+    return {"status": "scheduled"}
+
+
 # --- API Keys ---
 
 
@@ -265,8 +308,9 @@ async def toggle_service(service_type: str, server_id: int, user: User = Depends
 async def list_api_keys(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(ApiKey).where(ApiKey.user_id == user.id).order_by(ApiKey.created_at))
     return [
-        {"id": k.id, "name": k.name, "key_preview": k.key[:8] + "...", "last_used": str(k.last_used) if k.last_used else None, "created_at": str(k.created_at)}
+        {"id": k.id, "name": k.name, "key_preview": k.key[:8] + "...", "last_used": str(last_used) if last_used else None, "created_at": str(k.created_at)}
         for k in result.scalars().all()
+        for last_used in [api_keys.pending_last_used(k.id) or k.last_used]
     ]
 
 
@@ -5,7 +5,7 @@ from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..auth import create_token, get_current_user, hash_password, verify_password
+from ..auth import create_token, get_current_user, hash_password, password_needs_rehash, verify_password
 from ..database import async_session, get_db
 from ..models import Movie, PlexServer, User, Watchlist
 from ..schemas import Token, UserLogin, UserOut, UserRegister
@@ -81,7 +81,7 @@ async def register(data: UserRegister, db: AsyncSession = Depends(get_db)):
     if existing.scalar_one_or_none():
         raise HTTPException(status_code=409, detail="Username or email already exists")
 
-    user = User(username=data.username, email=data.email, hashed_password=hash_password(data.password), auth_provider="local")
+    user = User(username=data.username, email=data.email, hashed_password=await hash_password(data.password), auth_provider="local")
     db.add(user)
     await db.flush()
 
@@ -97,8 +97,10 @@ async def login(data: UserLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.username == data.username))
     user = result.scalar_one_or_none()
 
-    if not user or not user.hashed_password or not verify_password(data.password, user.hashed_password):
+    if not user or not user.hashed_password or not await verify_password(data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if password_needs_rehash(user.hashed_password):
+        user.hashed_password = await hash_password(data.password)
 
     return Token(access_token=create_token(user.id, user.username))
 
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .. import access
 from ..auth import get_current_user
 from ..database import get_db
 from ..models import Friend, User
@@ -85,6 +86,7 @@ async def respond_request(data: FriendResponse, user: User = Depends(get_current
         raise HTTPException(status_code=404, detail="Request not found")
 
     friend.status = "accepted" if data.action == "accept" else "rejected"
+    access.invalidate(db, friend.sender_id, friend.receiver_id)
     return {"message": f"Request {friend.status}"}
 
 
@@ -153,6 +155,7 @@ async def delete_friend(data: dict, user: User = Depends(get_current_user), db:
     if not friend:
         raise HTTPException(status_code=404)
     await db.delete(friend)
+    access.invalidate(db, friend.sender_id, friend.receiver_id)
     return {"message": "Friend removed"}
 
 
@@ -2,10 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .. import access
 from ..auth import get_current_user
 from ..database import get_db
 from ..models import GroupMember, GroupWatchlist, Movie, User
 from ..schemas import GroupCreate, GroupInvite, GroupOut, MovieCreate, MovieOut
+from ..services import titles
 
 router = APIRouter(prefix="/api/groups", tags=["groups"])
 
@@ -19,6 +21,7 @@ async def create_group(data: GroupCreate, user: User = Depends(get_current_user)
     member = GroupMember(group_id=group.id, user_id=user.id, status="accepted")
     db.add(member)
     await db.flush()
+    access.invalidate(db, user.id)
 
     return GroupOut(id=group.id, name=group.name, creator_id=group.creator_id, created_at=group.created_at)
 
@@ -42,7 +45,10 @@ async def my_groups(user: User = Depends(get_current_user), db: AsyncSession = D
 
 
 @router.post("/{group_id}/invite")
-async def invite_member(group_id: int, data: GroupInvite, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def invite_member(group_id: int, data: GroupInvite, grants: access.AccessGrants = Depends(access.get_access), db: AsyncSession = Depends(get_db)):
+    if not grants.can_edit(group_id=group_id):
+        raise HTTPException(status_code=403)
+
     target = await db.execute(select(User).where(User.username == data.username))
     target_user = target.scalar_one_or_none()
     if not target_user:
@@ -69,18 +75,15 @@ async def respond_invite(group_id: int, data: dict, user: User = Depends(get_cur
 
     if data.get("action") == "accept":
         member.status = "accepted"
+        access.invalidate(db, user.id)
     else:
         await db.delete(member)
     return {"message": "Done"}
 
 
 @router.get("/{group_id}/movies", response_model=list[MovieOut])
-async def get_group_movies(group_id: int, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    # Verify membership
-    member = await db.execute(
-        select(GroupMember).where(GroupMember.group_id == group_id, GroupMember.user_id == user.id, GroupMember.status == "accepted")
-    )
-    if not member.scalar_one_or_none():
+async def get_group_movies(group_id: int, grants: access.AccessGrants = Depends(access.get_access), db: AsyncSession = Depends(get_db)):
+    if not grants.can_view(group_id=group_id):
         raise HTTPException(status_code=403)
 
     result = await db.execute(select(Movie).where(Movie.group_id == group_id).order_by(Movie.created_at.desc()))
@@ -88,15 +91,13 @@ async def get_group_movies(group_id: int, user: User = Depends(get_current_user)
 
 
 @router.post("/{group_id}/movies", response_model=MovieOut, status_code=201)
-async def add_group_movie(group_id: int, data: MovieCreate, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    member = await db.execute(
-        select(GroupMember).where(GroupMember.group_id == group_id, GroupMember.user_id == user.id, GroupMember.status == "accepted")
-    )
-    if not member.scalar_one_or_none():
+async def add_group_movie(group_id: int, data: MovieCreate, grants: access.AccessGrants = Depends(access.get_access), db: AsyncSession = Depends(get_db)):
+    if not grants.can_edit(group_id=group_id):
         raise HTTPException(status_code=403)
 
     movie = Movie(group_id=group_id, **data.model_dump(mode="json"))
     db.add(movie)
     await db.flush()
+    await titles.drop_copies(db, Movie.id == movie.id)
     await db.refresh(movie)
     return movie
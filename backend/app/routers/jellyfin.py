@@ -6,8 +6,9 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth import get_current_user
 from ..database import async_session, get_db
-from ..models import JellyfinServer, Movie, User, Watchlist
-from ..services import jellyfin as jf_service
+from ..models import JellyfinServer, User, Watchlist
+from ..services import jellyfin as jf_service, media_index, server_budget, sync_jobs, watch_history
+from ..services.watch_sync import apply_new_episodes, apply_watched_movies, load_import_target
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/jellyfin", tags=["jellyfin"])
@@ -71,7 +72,7 @@ async def test_server(server_id: int, user: User = Depends(get_current_user), db
     if not server:
         raise HTTPException(status_code=404)
     try:
-        return await jf_service.test_connection(server.url, server.token, server.jellyfin_user_id)
+        return await jf_service.test_connection(server.url, server.token, server.jellyfin_user_id, server_id=server.id)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -81,138 +82,142 @@ async def test_server(server_id: int, user: User = Depends(get_current_user), db
 
 @router.get("/status/{tmdb_id}")
 async def jellyfin_status(tmdb_id: int, media_type: str = Query("movie"), user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Served from the media index; connections that have not been indexed yet are queried live."""
     result = await db.execute(select(JellyfinServer).where(JellyfinServer.user_id == user.id, JellyfinServer.enabled == True))
     servers = result.scalars().all()
+    entries, indexed = await media_index.load_entries(db, "jellyfin", [str(s.id) for s in servers], tmdb_id, media_type)
     found = []
     for srv in servers:
+        e = entries.get(str(srv.id))
+        if e:
+            found.append({
+                "server_name": srv.name, "id": e.item_key, "name": e.title, "year": e.year,
+                "played": bool(e.played), "playCount": e.view_count or 0, "tmdbId": str(tmdb_id),
+                **_stream_out({c: getattr(e, c) for c in media_index.INDEX_FIELDS}),
+            })
+            continue
+        if str(srv.id) in indexed:
+            continue
         try:
-            item = await jf_service.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, tmdb_id, media_type)
+            item = await jf_service.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, tmdb_id, media_type, server_id=srv.id)
             if item:
                 entry = {"server_name": srv.name, **item}
-                # Fetch MediaStreams for audio/subtitle languages
                 try:
-                    # For TV: get first episode's streams
-                    target_id = item["id"]
-                    if media_type == "tv":
-                        try:
-                            eps_data = await jf_service._request(srv.url, srv.token, "GET", f"/Shows/{item['id']}/Episodes", {"UserId": srv.jellyfin_user_id, "Limit": 1, "Fields": "MediaStreams"})
-                            ep_items = eps_data.get("Items", [])
-                            if ep_items:
-                                target_id = ep_items[0].get("Id", target_id)
-                        except Exception:
-                            pass
-
-                    item_detail = await jf_service._request(
-                        srv.url, srv.token, "GET",
-                        f"/Users/{srv.jellyfin_user_id}/Items/{target_id}",
-                        params={"Fields": "MediaStreams"},
-                    )
-                    audio_langs: list[str] = []
-                    sub_langs: list[str] = []
-                    for stream in item_detail.get("MediaStreams", []):
-                        lang = stream.get("Language") or stream.get("DisplayLanguage")
-                        if not lang or lang in ("und", "Unknown"):
-                            continue
-                        stype = stream.get("Type", "")
-                        if stype == "Audio" and lang not in audio_langs:
-                            audio_langs.append(lang)
-                        elif stype == "Subtitle" and lang not in sub_langs:
-                            sub_langs.append(lang)
-                    entry["audioLanguages"] = audio_langs
-                    entry["subtitleLanguages"] = sub_langs
+                    info = await media_index.jellyfin_item_stream_info(srv.url, srv.token, srv.jellyfin_user_id, item["id"], media_type, server_id=srv.id)
                 except Exception:
-                    entry["audioLanguages"] = []
-                    entry["subtitleLanguages"] = []
+                    info = {}
+                entry.update(_stream_out(info))
                 found.append(entry)
         except Exception:
             continue
     return {"found": len(found) > 0, "servers": found}
 
 
+def _stream_out(info: dict) -> dict:
+    return {
+        "videoResolution": info.get("video_resolution"),
+        "videoCodec": info.get("video_codec"),
+        "audioCodec": info.get("audio_codec"),
+        "audioChannels": info.get("audio_channels"),
+        "fileSize": info.get("file_size"),
+        "audioLanguages": info.get("audio_languages") or [],
+        "subtitleLanguages": info.get("subtitle_languages") or [],
+    }
+
+
 # --- Sync ---
 
-_sync_status: dict[int, dict] = {}
+JELLYFIN_SYNC_START = {"added": 0, "updated": 0, "errors": []}
 
 
-async def _run_jellyfin_sync(user_id: int):
+async def _run_jellyfin_sync(user_id: int, job: sync_jobs.Job | None = None):
     """Full Jellyfin → Watchlist sync."""
-    _sync_status[user_id] = {"running": True, "added": 0, "updated": 0, "errors": []}
-    try:
-        async with async_session() as db:
-            servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.user_id == user_id, JellyfinServer.enabled == True))).scalars().all()
-            wl = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id, Watchlist.is_default == True))).scalar_one_or_none()
-            if not wl:
-                _sync_status[user_id] = {"running": False, "error": "Keine Watchlist"}
-                return
-
-            added = 0
-            updated = 0
-            errors = []
-
-            for srv in servers:
-                try:
-                    # Movies
-                    movies = await jf_service.get_watched_movies(srv.url, srv.token, srv.jellyfin_user_id)
-                    # Get all user's watchlist IDs
-                    all_wls = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id))).scalars().all()
-                    all_wl_ids = [w.id for w in all_wls]
-
-                    for m in movies:
-                        existing = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(all_wl_ids), Movie.tmdb_id == m["tmdb_id"]))).scalars().first()
-                        if existing:
-                            if existing.status not in ("watched", "dropped"):
-                                existing.status = "watched"
-                                updated += 1
-                        else:
-                            db.add(Movie(watchlist_id=wl.id, title=m["name"], year=str(m.get("year", "")), tmdb_id=m["tmdb_id"], media_type="movie", status="watched"))
-                            added += 1
-
-                    # TV Shows
-                    shows = await jf_service.get_watched_episodes(srv.url, srv.token, srv.jellyfin_user_id)
-                    for show in shows:
-                        existing = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(all_wl_ids), Movie.tmdb_id == show["tmdb_id"]))).scalars().first()
-                        progress = show["episodes"]
-                        total_watched = sum(len(eps) for eps in progress.values())
-                        status = "watching" if total_watched > 0 else "watchlist"
-
-                        if existing:
-                            old_p = existing.watch_progress or {}
-                            for s, eps in progress.items():
-                                old_eps = set(old_p.get(s, []))
-                                old_eps.update(eps)
-                                old_p[s] = sorted(list(old_eps))
-                            existing.watch_progress = old_p
-                            if existing.status not in ("watched", "dropped"):
-                                existing.status = status
-                            updated += 1
-                        else:
-                            db.add(Movie(watchlist_id=wl.id, title=show["name"], tmdb_id=show["tmdb_id"], media_type="tv", status=status, watch_progress=progress))
-                            added += 1
-
-                    if (added + updated) % 20 == 0:
-                        await db.commit()
-
-                except Exception as e:
-                    errors.append(f"{srv.name}: {str(e)}")
-
-            await db.commit()
-            _sync_status[user_id] = {"running": False, "added": added, "updated": updated, "errors": errors}
+    job = job or await sync_jobs.start(user_id, "jellyfin", **JELLYFIN_SYNC_START)
+    if not job:
+        logger.info(f"Jellyfin sync for user {user_id} already running")
+        return
+    async with job:
+        try:
+            async with async_session() as db:
+                servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.user_id == user_id, JellyfinServer.enabled == True))).scalars().all()
+                wl = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id, Watchlist.is_default == True))).scalar_one_or_none()
+                if not wl:
+                    await job.fail("Keine Watchlist")
+                    return
+
+                added = 0
+                updated = 0
+                errors = []
+
+                all_wl_ids, _ = await load_import_target(db, user_id)
+                # Watched items of all servers, recorded in one watch_history.record() call
+                events = []
+                movie_titles: dict[int, tuple[str, object]] = {}
+                show_titles: dict[int, str] = {}
+
+                for srv in servers:
+                    try:
+                        async with server_budget.slot(srv.url):
+                            # Movies
+                            movies = await jf_service.get_watched_movies(srv.url, srv.token, srv.jellyfin_user_id, server_id=srv.id)
+                            for m in movies:
+                                events.append(watch_history.movie_event(m["tmdb_id"]))
+                                movie_titles[m["tmdb_id"]] = (m["name"], m.get("year"))
+
+                            # TV Shows
+                            shows = await jf_service.get_watched_episodes(srv.url, srv.token, srv.jellyfin_user_id, server_id=srv.id)
+                            for show in shows:
+                                events.extend(watch_history.episode_events(show["tmdb_id"], show["episodes"]))
+                                show_titles[show["tmdb_id"]] = show["name"]
+
+                            await job.progress(errors=errors)
+
+                    except Exception as e:
+                        errors.append(f"{srv.name}: {str(e)}")
+
+                new_keys = await watch_history.record(db, user_id, "jellyfin", events)
+                for action in (await apply_watched_movies(
+                    db, user_id, {key[0] for key in new_keys if key[1] == "movie"}, default_wl_id=wl.id, titles=movie_titles,
+                )).values():
+                    if action == "added":
+                        added += 1
+                    else:
+                        updated += 1
+                for tmdb_id, title in show_titles.items():
+                    new_episodes = watch_history.as_progress(new_keys, tmdb_id)
+                    if not new_episodes:
+                        continue
+                    action = await apply_new_episodes(db, all_wl_ids, wl.id, tmdb_id, title, new_episodes, user_id=user_id)
+                    if action == "added":
+                        added += 1
+                    elif action == "updated":
+                        updated += 1
+
+                await db.commit()
+                await job.done(added=added, updated=updated, errors=errors)
+                from ..services.sync_log import log_sync
+                await log_sync(user_id, "jellyfin", "import", added, updated, len(errors), f"Fehler: {', '.join(errors)}" if errors else "")
+        except Exception as e:
+            await job.fail(str(e))
             from ..services.sync_log import log_sync
-            await log_sync(user_id, "jellyfin", "import", added, updated, len(errors), f"Fehler: {', '.join(errors)}" if errors else "")
-    except Exception as e:
-        _sync_status[user_id] = {"running": False, "error": str(e)}
-        from ..services.sync_log import log_sync
-        await log_sync(user_id, "jellyfin", "import", errors=1, details=str(e))
+            await log_sync(user_id, "jellyfin", "import", errors=1, details=str(e))
 
 
 @router.post("/sync")
 async def sync(background_tasks: BackgroundTasks, user: User = Depends(get_current_user)):
-    if _sync_status.get(user.id, {}).get("running"):
+    job = await sync_jobs.start(user.id, "jellyfin", **JELLYFIN_SYNC_START)
+    if not job:
         return {"status": "already_running"}
-    background_tasks.add_task(_run_jellyfin_sync, user.id)
+    background_tasks.add_task(_run_jellyfin_sync, user.id, job)
     return {"status": "started"}
 
 
 @router.get("/sync/status")
-async def sync_status(user: User = Depends(get_current_user)):
-    return _sync_status.get(user.id, {"running": False})
+async def sync_status(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await sync_jobs.status(db, user.id, "jellyfin", {"running": False})
+
+
+@router.post("/sync/cancel")
+async def cancel_sync(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    cancelled = await sync_jobs.cancel(db, user.id, "jellyfin")
+    return {"status": "cancelling" if cancelled else "not_running"}
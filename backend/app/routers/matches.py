@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .. import access
 from ..auth import get_current_user
 from ..database import get_db
 from ..models import Match, MatchInvitation, MatchLike, MatchPoolLink, MatchReadyStatus, Movie, User, Watchlist
@@ -248,6 +249,7 @@ async def link_watchlist(match_id: int, data: dict, user: User = Depends(get_cur
     """Link a watchlist to the match pool."""
     await _get_match(match_id, user.id, db)
     wl_id = data["watchlist_id"]
+    await access.ensure_watchlist_access(db, user.id, wl_id)
 
     existing = await db.execute(
         select(MatchPoolLink).where(MatchPoolLink.match_id == match_id, MatchPoolLink.watchlist_id == wl_id)
@@ -2,23 +2,25 @@
 MCP (Model Context Protocol) Server
 - Streamable HTTP: POST /mcp/message
 - SSE: GET /sse (event stream) + POST /sse/message (send)
-Both authenticated via API key (Bearer token or query param).
+Both authenticated via API key (Bearer token or query param) and accept JSON-RPC
+batches; tool calls of a batch run concurrently, limited per user.
 """
 import asyncio
 import json
 import logging
 import uuid
-from datetime import datetime
-from typing import Any
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..auth import load_user
 from ..database import async_session, get_db
-from ..models import ApiKey, DownloadProfile, Movie, PlexServer, RadarrServer, SonarrServer, User, Watchlist
-from ..services import plex as plex_service, radarr as radarr_service, sonarr as sonarr_service
+from ..models import DownloadProfile, Movie, PlexServer, RadarrServer, SonarrServer, User, Watchlist
+from ..services import api_keys, episode_progress, library_search, library_stats, plex as plex_service, radarr as radarr_service, sonarr as sonarr_service, titles
 from ..services.tmdb import TMDBService
 
 logger = logging.getLogger(__name__)
@@ -42,21 +44,10 @@ async def _authenticate_mcp(request: Request, api_key: str | None = Query(None,
         raise HTTPException(status_code=401, detail="API key required. Pass as Bearer token or ?key= query param.")
 
     async with async_session() as db:
-        result = await db.execute(select(ApiKey).where(ApiKey.key == token))
-        key_obj = result.scalar_one_or_none()
-        if not key_obj:
+        resolved = await api_keys.resolve(db, token)
+        if not resolved:
             raise HTTPException(status_code=401, detail="Invalid API key")
-
-        # Update last_used
-        key_obj.last_used = datetime.utcnow()
-        await db.commit()
-
-        # Get user
-        result = await db.execute(select(User).where(User.id == key_obj.user_id))
-        user = result.scalar_one_or_none()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        return user
+        return await load_user(db, resolved[1])
 
 
 # ─── Tool Definitions ─────────────────────────────────────────────
@@ -64,12 +55,18 @@ async def _authenticate_mcp(request: Request, api_key: str | None = Query(None,
 TOOLS = [
     {
         "name": "get_watchlist",
-        "description": "Get all movies/series from the user's watchlist. Can filter by status (watchlist, watching, watched, planned, dropped) and media_type (movie, tv).",
+        "description": "Get movies/series from the user's watchlists. Optional full-text query over title and overview (results ranked by relevance), filters by status (watchlist, watching, watched, planned, dropped), media_type (movie, tv), tags, TMDB genre ids and year range.",
         "inputSchema": {
             "type": "object",
             "properties": {
+                "query": {"type": "string"},
                 "status": {"type": "string", "enum": ["watchlist", "watching", "watched", "planned", "dropped"]},
                 "media_type": {"type": "string", "enum": ["movie", "tv"]},
+                "tags": {"type": "array", "items": {"type": "string"}},
+                "genres": {"type": "array", "items": {"type": "integer"}},
+                "year_from": {"type": "integer"},
+                "year_to": {"type": "integer"},
+                "limit": {"type": "integer", "default": 50, "maximum": 200},
             },
         },
     },
@@ -253,10 +250,13 @@ async def _handle_tool(name: str, args: dict, user: User) -> Any:
 
 async def _get_watchlist(args, user):
     async with async_session() as db:
-        query = select(Movie).join(Watchlist).where(Watchlist.owner_id == user.id)
-        if args.get("status"): query = query.where(Movie.status == args["status"])
-        if args.get("media_type"): query = query.where(Movie.media_type == args["media_type"])
-        result = await db.execute(query.order_by(Movie.created_at.desc()).limit(50))
+        query, _ = library_search.search_query(
+            select(Watchlist.id).where(Watchlist.owner_id == user.id), args.get("query"),
+            [args["status"]] if args.get("status") else None, args.get("media_type"),
+            args.get("tags"), args.get("genres"), args.get("year_from"), args.get("year_to"),
+        )
+        limit = min(int(args.get("limit") or 50), 200)
+        result = await db.execute(query.limit(limit))
         return [{"title": m.title, "year": m.year, "tmdb_id": m.tmdb_id, "media_type": m.media_type, "status": m.status, "rating": m.rating, "tags": m.tags} for m in result.scalars().all()]
 
 
@@ -273,7 +273,8 @@ async def _add_to_watchlist(args, user):
         if existing.scalar_one_or_none(): return {"error": "Already in watchlist"}
         wl = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user.id, Watchlist.is_default == True))).scalar_one_or_none()
         if not wl: return {"error": "No default watchlist"}
-        movie = Movie(watchlist_id=wl.id, title=detail.get("title") or detail.get("name"), year=str(detail.get("release_date") or detail.get("first_air_date") or "")[:4], poster_url=detail.get("poster_path"), tmdb_id=args["tmdb_id"], media_type=args["media_type"], status=args.get("status", "watchlist"))
+        await titles.store(db, args["tmdb_id"], args["media_type"], detail)
+        movie = Movie(watchlist_id=wl.id, title=detail.get("title") or detail.get("name"), year=str(detail.get("release_date") or detail.get("first_air_date") or "")[:4], tmdb_id=args["tmdb_id"], media_type=args["media_type"], status=args.get("status", "watchlist"))
         db.add(movie)
         await db.commit()
         return {"success": True, "title": movie.title}
@@ -426,24 +427,9 @@ async def _grab_release(args, user):
 
 async def _get_stats(args, user):
     async with async_session() as db:
-        from sqlalchemy import func
-        all_wls = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user.id))).scalars().all()
-        wl_ids = [w.id for w in all_wls]
-        if not wl_ids: return {"total": 0}
-        movies = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(wl_ids)))).scalars().all()
-        stats = {"total": len(movies), "movies": 0, "movies_watched": 0, "series": 0, "series_watched": 0, "episodes_watched": 0, "by_status": {}}
-        for m in movies:
-            if m.media_type == "movie":
-                stats["movies"] += 1
-                if m.status == "watched": stats["movies_watched"] += 1
-            else:
-                stats["series"] += 1
-                if m.status == "watched": stats["series_watched"] += 1
-            stats["by_status"][m.status] = stats["by_status"].get(m.status, 0) + 1
-            if m.watch_progress:
-                for eps in m.watch_progress.values():
-                    if isinstance(eps, list): stats["episodes_watched"] += len(eps)
-        return stats
+        stats = await library_stats.watchlist_stats(db, user.id)
+        if not stats["total"]: return {"total": 0}
+        return {k: v for k, v in stats.items() if k not in ("watched", "watching")}
 
 
 async def _check_jellyfin(args, user):
@@ -454,7 +440,7 @@ async def _check_jellyfin(args, user):
         found = []
         for srv in servers:
             try:
-                item = await jf_svc.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, args["tmdb_id"], args["media_type"])
+                item = await jf_svc.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, args["tmdb_id"], args["media_type"], server_id=srv.id)
                 if item: found.append({"server": srv.name, "title": item.get("name"), "played": item.get("played"), "play_count": item.get("playCount", 0)})
             except Exception: continue
         return {"found": len(found) > 0, "servers": found}
@@ -467,7 +453,7 @@ async def _get_episode_progress(args, user):
         movie = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(wl_ids), Movie.tmdb_id == args["tmdb_id"]))).scalars().first()
         if not movie: return {"error": "Not in watchlist"}
         progress = movie.watch_progress or {}
-        total_eps = sum(len(eps) for eps in progress.values())
+        total_eps = episode_progress.episode_count(progress)
         return {"title": movie.title, "status": movie.status, "total_episodes_watched": total_eps, "progress": progress}
 
 
@@ -525,8 +511,31 @@ async def _get_recommendations(args, user):
 
 # ─── Process JSON-RPC message ─────────────────────────────────────
 
+MAX_BATCH = 50  # messages per JSON-RPC batch
+USER_TOOL_CONCURRENCY = 4  # tool calls running at once per user, across requests and sessions
+
+_tool_slots: dict[int, list] = {}  # user_id -> [semaphore, calls holding or waiting for it]
+
+
+@asynccontextmanager
+async def _tool_slot(user_id: int):
+    """Hold one of the user's tool slots; the entry is dropped again once the user is idle."""
+    entry = _tool_slots.get(user_id)
+    if entry is None:
+        entry = _tool_slots[user_id] = [asyncio.Semaphore(USER_TOOL_CONCURRENCY), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _tool_slots[user_id]
+
 
 async def _process_message(body: dict, user: User) -> dict | None:
+    if not isinstance(body, dict):
+        return _rpc_err(None, -32600, "Invalid Request")
     method = body.get("method")
     msg_id = body.get("id")
     params = body.get("params", {})
@@ -540,7 +549,8 @@ async def _process_message(body: dict, user: User) -> dict | None:
     if method == "tools/call":
         tool_name = params.get("name")
         try:
-            result = await _handle_tool(tool_name, params.get("arguments", {}), user)
+            async with _tool_slot(user.id):
+                result = await _handle_tool(tool_name, params.get("arguments", {}), user)
             return _rpc_ok(msg_id, {"content": [{"type": "text", "text": json.dumps(result, ensure_ascii=False, indent=2)}]})
         except Exception as e:
             logger.error(f"MCP tool error ({tool_name}): {e}")
@@ -550,6 +560,35 @@ async def _process_message(body: dict, user: User) -> dict | None:
     return _rpc_err(msg_id, -32601, f"Method not found: {method}")
 
 
+async def _process_batch(batch: list, user: User) -> AsyncIterator[dict]:
+    """Run the messages of a JSON-RPC batch concurrently; yields responses as they complete."""
+    if not batch:
+        yield _rpc_err(None, -32600, "Invalid Request: empty batch")
+        return
+    if len(batch) > MAX_BATCH:
+        yield _rpc_err(None, -32600, f"Invalid Request: batch exceeds {MAX_BATCH} messages")
+        return
+    tasks = [asyncio.create_task(_process_batch_message(body, user)) for body in batch]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result is not None:
+                yield result
+    finally:
+        for task in tasks:  # the client went away: don't leave its calls running
+            task.cancel()
+
+
+async def _process_batch_message(body, user: User) -> dict | None:
+    """_process_message, with a failure answered for this message instead of failing the whole batch."""
+    try:
+        return await _process_message(body, user)
+    except Exception as e:
+        logger.error(f"MCP batch message failed: {e}")
+        msg_id = body.get("id") if isinstance(body, dict) else None
+        return _rpc_err(msg_id, -32603, "Internal error")
+
+
 def _rpc_ok(msg_id, result):
     return {"jsonrpc": "2.0", "id": msg_id, "result": result}
 
@@ -566,6 +605,11 @@ def _rpc_err(msg_id, code, message):
 @router.post("/mcp/message")
 async def mcp_http(request: Request, user: User = Depends(_authenticate_mcp)):
     body = await request.json()
+    if isinstance(body, list):
+        results = [result async for result in _process_batch(body, user)]
+        if not results:
+            return JSONResponse(content={}, status_code=202)
+        return JSONResponse(content=results)
     result = await _process_message(body, user)
     if result is None:
         return JSONResponse(content={}, status_code=202)
@@ -614,6 +658,12 @@ async def mcp_sse_message(request: Request, session_id: str = Query(...)):
         raise HTTPException(status_code=404, detail="Session not found")
 
     body = await request.json()
+    if isinstance(body, list):
+        # Each response goes out on the stream as soon as its call completes
+        async for result in _process_batch(body, session["user"]):
+            await session["queue"].put(result)
+        return JSONResponse(content={"status": "ok"})
+
     result = await _process_message(body, session["user"])
 
     if result is not None:
@@ -3,11 +3,13 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import logging
+from datetime import datetime, timezone
 
 from ..auth import get_current_user, require_admin, require_installer
 from ..database import async_session, get_db
-from ..models import Movie, PlexServer, User, Watchlist
-from ..services import plex as plex_service
+from ..models import PlexServer, User, Watchlist
+from ..services import media_index, plex as plex_service, plex_watchlist, server_budget, sync_jobs, watch_history
+from ..services.watch_sync import apply_new_episodes, apply_watched_movies
 from ..services.tmdb import TMDBService
 
 logger = logging.getLogger(__name__)
@@ -235,106 +237,110 @@ async def _get_user_servers(user: User, db) -> list[dict]:
 
     # Fallback to global
     result = await db.execute(select(PlexServer).where(PlexServer.enabled == True))
-    servers = [{"name": s.name, "url": s.url, "token": s.token} for s in result.scalars().all()]
+    servers = [{"name": s.name, "url": s.url, "token": s.token, "machine_id": s.machine_id} for s in result.scalars().all()]
     return servers
 
 
+def _plex_entry_out(server_name: str, e: dict) -> dict:
+    return {
+        "server_name": server_name,
+        "ratingKey": e.get("item_key"),
+        "title": e.get("title"),
+        "year": e.get("year"),
+        "videoResolution": e.get("video_resolution"),
+        "videoCodec": e.get("video_codec"),
+        "audioCodec": e.get("audio_codec"),
+        "audioChannels": e.get("audio_channels"),
+        "fileSize": e.get("file_size"),
+        "audioLanguages": e.get("audio_languages") or [],
+        "subtitleLanguages": e.get("subtitle_languages") or [],
+    }
+
+
+def _epoch(value: datetime | None) -> int | None:
+    return int(value.replace(tzinfo=timezone.utc).timestamp()) if value else None
+
+
+async def _account_view_state(url: str, token: str, entry, media_type: str) -> tuple[dict, list]:
+    """viewCount/lastViewedAt and per-season viewed episodes of an indexed item, for another account's token."""
+    import asyncio
+    seasons = entry.seasons or []
+    try:
+        data = await asyncio.wait_for(plex_service._request(url, token, f"/library/metadata/{entry.item_key}"), timeout=8)
+        meta = (data.get("MediaContainer", {}).get("Metadata") or [{}])[0]
+        view = {"viewCount": meta.get("viewCount", 0), "lastViewedAt": meta.get("lastViewedAt")}
+        if media_type == "tv":
+            children = await asyncio.wait_for(plex_service._request(url, token, f"/library/metadata/{entry.item_key}/children"), timeout=8)
+            viewed = {s.get("index"): s.get("viewedLeafCount", 0) for s in children.get("MediaContainer", {}).get("Metadata", [])}
+            seasons = [{**season, "viewedEpisodes": viewed.get(season["number"], 0)} for season in seasons]
+        return view, seasons
+    except Exception:
+        return {"viewCount": 0, "lastViewedAt": None}, [{**season, "viewedEpisodes": 0} for season in seasons]
+
+
 @router.get("/status/{tmdb_id}")
 async def plex_status(tmdb_id: int, media_type: str = Query("movie"), user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    """Check if a movie/show exists on any of the user's Plex servers. Parallel with timeout."""
+    """Check if a movie/show exists on any of the user's Plex servers.
+
+    Served from the media index; only servers that have not been indexed yet are queried live.
+    The index holds the view state of the server's stored token; users on another account
+    get theirs with one metadata request instead.
+    """
     import asyncio
     user_servers = await _get_user_servers(user, db)
+    entries, indexed = await media_index.load_entries(db, "plex", [s["machine_id"] for s in user_servers if s.get("machine_id")], tmdb_id, media_type)
+    index_tokens = dict((await db.execute(
+        select(PlexServer.machine_id, PlexServer.token).where(PlexServer.machine_id.in_(list(entries)))
+    )).tuples().all()) if entries else {}
+
+    async def from_index(srv):
+        e = entries[srv["machine_id"]]
+        result = _plex_entry_out(srv["name"], {c: getattr(e, c) for c in ("item_key", "title", "year", *media_index.INDEX_FIELDS)})
+        token = srv.get("token", user.plex_token)
+        if token == index_tokens.get(srv["machine_id"]):
+            view, seasons = {"viewCount": e.view_count or 0, "lastViewedAt": _epoch(e.last_viewed_at)}, e.seasons or []
+        else:
+            view, seasons = await _account_view_state(srv["url"], token, e, media_type)
+        result.update(view)
+        if media_type == "tv":
+            result["seasons"] = seasons
+        return result
 
-    async def check_server(srv):
+    async def check_server_live(srv):
         try:
             token = srv.get("token", user.plex_token)
-            item = await asyncio.wait_for(
-                plex_service.find_by_guid(srv["url"], token, tmdb_id, media_type),
-                timeout=8,
-            )
+            item = await asyncio.wait_for(plex_service.find_by_guid(srv["url"], token, tmdb_id, media_type), timeout=8)
             if not item:
                 return None
-            result = {
-                "server_name": srv["name"],
-                "ratingKey": item.get("ratingKey"),
-                "title": item.get("title"),
-                "year": item.get("year"),
-                "videoResolution": item.get("videoResolution"),
-                "videoCodec": item.get("videoCodec"),
-                "audioCodec": item.get("audioCodec"),
-                "audioChannels": item.get("audioChannels"),
-                "fileSize": item.get("fileSize"),
-                "viewCount": item.get("viewCount", 0),
-                "lastViewedAt": item.get("lastViewedAt"),
-            }
-            # Get audio/subtitle stream languages
+            result = _plex_entry_out(srv["name"], {
+                "item_key": item.get("ratingKey"), "title": item.get("title"), "year": item.get("year"),
+                "video_resolution": item.get("videoResolution"), "video_codec": item.get("videoCodec"),
+                "audio_codec": item.get("audioCodec"), "audio_channels": item.get("audioChannels"),
+                "file_size": item.get("fileSize"),
+            })
+            result["viewCount"] = item.get("viewCount", 0)
+            result["lastViewedAt"] = item.get("lastViewedAt")
             if item.get("ratingKey"):
                 try:
-                    from ..services.plex import _request
-                    audio_langs: list[str] = []
-                    sub_langs: list[str] = []
-
-                    # For TV: get first episode's streams (show level has no streams)
-                    target_key = item["ratingKey"]
-                    if media_type == "tv":
-                        try:
-                            seasons = await asyncio.wait_for(_request(srv["url"], token, f"/library/metadata/{item['ratingKey']}/children"), timeout=3)
-                            for s in seasons.get("MediaContainer", {}).get("Metadata", []):
-                                if s.get("index", 0) > 0:
-                                    eps = await asyncio.wait_for(_request(srv["url"], token, f"/library/metadata/{s['ratingKey']}/children"), timeout=3)
-                                    ep_list = eps.get("MediaContainer", {}).get("Metadata", [])
-                                    if ep_list:
-                                        target_key = ep_list[0].get("ratingKey", target_key)
-                                    break
-                        except Exception:
-                            pass
-
-                    stream_data = await asyncio.wait_for(
-                        _request(srv["url"], token, f"/library/metadata/{target_key}", {"includeStreams": 1}),
-                        timeout=5,
-                    )
-                    for meta_item in stream_data.get("MediaContainer", {}).get("Metadata", []):
-                        for media_entry in meta_item.get("Media", []):
-                            for part in media_entry.get("Part", []):
-                                for stream in part.get("Stream", []):
-                                    lang = stream.get("language") or stream.get("languageCode") or stream.get("languageTag")
-                                    if not lang:
-                                        continue
-                                    stype = stream.get("streamType")
-                                    if stype == 2 and lang not in audio_langs:
-                                        audio_langs.append(lang)
-                                    elif stype == 3 and lang not in sub_langs:
-                                        sub_langs.append(lang)
-                    result["audioLanguages"] = audio_langs
-                    result["subtitleLanguages"] = sub_langs
-                except Exception:
-                    result["audioLanguages"] = []
-                    result["subtitleLanguages"] = []
-            # For TV: get season info
-            if media_type == "tv" and item.get("ratingKey"):
-                try:
-                    from ..services.plex import _request
-                    seasons_data = await asyncio.wait_for(
-                        _request(srv["url"], token, f"/library/metadata/{item['ratingKey']}/children"),
-                        timeout=5,
-                    )
-                    seasons = []
-                    for s in seasons_data.get("MediaContainer", {}).get("Metadata", []):
-                        snum = s.get("index", 0)
-                        if snum == 0:
-                            continue
-                        seasons.append({
-                            "number": snum,
-                            "episodes": s.get("leafCount", 0),
-                            "viewedEpisodes": s.get("viewedLeafCount", 0),
-                        })
-                    result["seasons"] = seasons
+                    info = await asyncio.wait_for(media_index.plex_stream_info(srv["url"], token, item["ratingKey"], media_type), timeout=8)
+                    result["audioLanguages"] = info["audio_languages"]
+                    result["subtitleLanguages"] = info["subtitle_languages"]
+                    if "seasons" in info:
+                        result["seasons"] = info["seasons"]
                 except Exception:
                     pass
             return result
         except Exception:
             return None
 
+    async def check_server(srv):
+        mid = srv.get("machine_id")
+        if mid in entries:
+            return await from_index(srv)
+        if mid in indexed:
+            return None  # indexed server without this title
+        return await check_server_live(srv)
+
     results = await asyncio.gather(*[check_server(srv) for srv in user_servers])
     found_servers = [r for r in results if r]
 
@@ -382,15 +388,15 @@ async def _extract_tmdb_id(url: str, token: str, rating_key: str) -> int | None:
     return None
 
 
-async def _sync_tv_show(url: str, token: str, rating_key: str, tmdb_id: int, title: str, year, db, default_wl, all_wl_ids=None) -> dict:
-    """Sync a single TV show — check each episode individually."""
+async def _collect_tv_show(url: str, token: str, rating_key: str, tmdb_id: int, title: str) -> tuple[list, str] | None:
+    """Watched episodes of a single TV show as watch events, plus the status its progress implies; None if none watched."""
     try:
         from ..services.plex import _request
         # Get seasons
         seasons_data = await _request(url, token, f"/library/metadata/{rating_key}/children")
         seasons = seasons_data.get("MediaContainer", {}).get("Metadata", [])
 
-        watch_progress = {}
+        events = []
         total_episodes = 0
         watched_episodes = 0
 
@@ -406,230 +412,186 @@ async def _sync_tv_show(url: str, token: str, rating_key: str, tmdb_id: int, tit
             except Exception:
                 continue
 
-            watched_in_season = []
             for ep in episodes:
                 total_episodes += 1
                 if ep.get("viewCount", 0) > 0:
                     watched_episodes += 1
-                    watched_in_season.append(ep.get("index", 0))
-
-            if watched_in_season:
-                watch_progress[str(season_num)] = sorted(watched_in_season)
+                    viewed_at = datetime.utcfromtimestamp(int(ep["lastViewedAt"])) if ep.get("lastViewedAt") else None
+                    events.append(((tmdb_id, "tv", int(season_num), int(ep.get("index", 0))), viewed_at))
 
         if watched_episodes == 0:
-            return {"action": "skip"}
+            return None
 
         # Determine status
         is_complete = watched_episodes >= total_episodes and total_episodes > 0
-        status = "watched" if is_complete else "watching"
-
-        # Find or create in watchlist
-        search_wl_ids = all_wl_ids or [default_wl.id]
-        existing = await db.execute(select(Movie).where(Movie.watchlist_id.in_(search_wl_ids), Movie.tmdb_id == tmdb_id))
-        movie = existing.scalars().first()
-
-        if movie:
-            # Merge watch progress
-            old_progress = movie.watch_progress or {}
-            for season, eps in watch_progress.items():
-                old_eps = set(old_progress.get(season, []))
-                old_eps.update(eps)
-                old_progress[season] = sorted(list(old_eps))
-            movie.watch_progress = old_progress
-            # Always update status based on actual progress
-            if movie.status != "dropped":
-                movie.status = status
-            return {"action": "updated"}
-        else:
-            db.add(Movie(
-                watchlist_id=default_wl.id, title=title,
-                year=str(year) if year else None,
-                tmdb_id=tmdb_id, media_type="tv",
-                status=status, watch_progress=watch_progress,
-            ))
-            return {"action": "added"}
+        return events, "watched" if is_complete else "watching"
     except Exception as e:
         logger.error(f"TV sync failed for {title}: {e}")
-        return {"action": "error"}
+        return None
 
 
-# Store sync status per user
-_sync_status: dict[int, dict] = {}
+PLEX_SYNC_START = {"added": 0, "updated": 0, "total_scanned": 0, "errors": []}
 
 
-async def _run_full_plex_sync(user_id: int):
+async def _run_full_plex_sync(user_id: int, job: sync_jobs.Job | None = None):
     """Background: full Plex → Watchlist sync using user's own Plex token."""
-    _sync_status[user_id] = {"running": True, "added": 0, "updated": 0, "total_scanned": 0, "errors": []}
-    try:
-        async with async_session() as db:
-            # Get user's Plex token
-            user_result = await db.execute(select(User).where(User.id == user_id))
-            user = user_result.scalar_one_or_none()
-
-            # Discover servers from user's token, fallback to global
-            if user and user.plex_token:
-                try:
-                    discovered = await plex_service.discover_servers(user.plex_token)
-                    servers = [{"name": s["name"], "url": s["url"], "token": s.get("token", user.plex_token)} for s in discovered]
-                except Exception:
-                    servers = []
-            else:
-                result = await db.execute(select(PlexServer).where(PlexServer.enabled == True))
-                servers = [{"name": s.name, "url": s.url, "token": s.token} for s in result.scalars().all()]
-
-            wl_result = await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id, Watchlist.is_default == True))
-            default_wl = wl_result.scalar_one_or_none()
-            if not default_wl:
-                _sync_status[user_id] = {"running": False, "error": "Keine Standard-Watchlist"}
-                return
-
-            # Get ALL user's watchlist IDs for searching
-            all_wls = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id))).scalars().all()
-            all_wl_ids = [w.id for w in all_wls]
-
-            added = 0
-            updated = 0
-            total_scanned = 0
-            errors = []
-
-            for srv in servers:
-                try:
-                    libraries = await plex_service.get_libraries(srv["url"], srv["token"])
-
-                    for lib in libraries:
-                        if lib["type"] not in ("movie", "show"):
-                            continue
-
-                        page = 0
-                        page_size = 100
-
-                        while True:
-                            try:
-                                data = await plex_service.get_library_items(srv["url"], srv["token"], lib["id"], start=page, size=page_size)
-                            except Exception:
-                                break
-
-                            items = data.get("items", [])
-                            if not items:
-                                break
-
-                            for item in items:
-                                total_scanned += 1
-                                rating_key = item.get("ratingKey")
-                                if not rating_key:
-                                    continue
-
-                                tmdb_id = await _extract_tmdb_id(srv["url"], srv["token"], rating_key)
-                                if not tmdb_id:
+    job = job or await sync_jobs.start(user_id, "plex", **PLEX_SYNC_START)
+    if not job:
+        logger.info(f"Plex full sync for user {user_id} already running")
+        return
+    async with job:
+        try:
+            async with async_session() as db:
+                # Get user's Plex token
+                user_result = await db.execute(select(User).where(User.id == user_id))
+                user = user_result.scalar_one_or_none()
+
+                # Discover servers from user's token, fallback to global
+                if user and user.plex_token:
+                    try:
+                        discovered = await plex_service.discover_servers(user.plex_token)
+                        servers = [{"name": s["name"], "url": s["url"], "token": s.get("token", user.plex_token)} for s in discovered]
+                    except Exception:
+                        servers = []
+                else:
+                    result = await db.execute(select(PlexServer).where(PlexServer.enabled == True))
+                    servers = [{"name": s.name, "url": s.url, "token": s.token, "machine_id": s.machine_id} for s in result.scalars().all()]
+
+                wl_result = await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id, Watchlist.is_default == True))
+                default_wl = wl_result.scalar_one_or_none()
+                if not default_wl:
+                    await job.fail("Keine Standard-Watchlist")
+                    return
+
+                # Get ALL user's watchlist IDs for searching
+                all_wls = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id))).scalars().all()
+                all_wl_ids = [w.id for w in all_wls]
+
+                added = 0
+                updated = 0
+                total_scanned = 0
+                errors = []
+                # Everything watched is collected and recorded in one watch_history.record() call at the end
+                events = []
+                movie_titles: dict[int, tuple[str, object]] = {}
+                shows: dict[int, tuple[str, object, str]] = {}  # tmdb_id -> (title, year, status)
+
+                for srv in servers:
+                    try:
+                        async with server_budget.slot(srv["url"]):
+                            libraries = await plex_service.get_libraries(srv["url"], srv["token"])
+
+                            for lib in libraries:
+                                if lib["type"] not in ("movie", "show"):
                                     continue
 
-                                if lib["type"] == "movie":
-                                    if item.get("viewCount", 0) == 0:
-                                        continue
-                                    existing = await db.execute(select(Movie).where(Movie.watchlist_id.in_(all_wl_ids), Movie.tmdb_id == tmdb_id))
-                                    movie = existing.scalars().first()
-                                    if movie:
-                                        if movie.status not in ("watched", "dropped"):
-                                            movie.status = "watched"
-                                            updated += 1
-                                    else:
-                                        db.add(Movie(watchlist_id=default_wl.id, title=item.get("title", "Unknown"), year=str(item.get("year", "")) if item.get("year") else None, tmdb_id=tmdb_id, media_type="movie", status="watched"))
-                                        added += 1
-                                else:
-                                    result_tv = await _sync_tv_show(srv["url"], srv["token"], rating_key, tmdb_id, item.get("title", "Unknown"), item.get("year"), db, default_wl, all_wl_ids)
-                                    if result_tv["action"] == "added":
-                                        added += 1
-                                    elif result_tv["action"] == "updated":
-                                        updated += 1
-
-                                # Update live status + commit in batches
-                                _sync_status[user_id] = {"running": True, "added": added, "updated": updated, "total_scanned": total_scanned, "errors": errors}
-                                if total_scanned % 20 == 0:
-                                    await db.commit()
-
-                            page += page_size
-                            if len(items) < page_size:
-                                break
-
-                except Exception as e:
-                    errors.append(f"{srv['name']}: {str(e)}")
-                    logger.error(f"Plex sync failed for {srv['name']}: {e}")
-
-            await db.commit()
-            _sync_status[user_id] = {"running": False, "added": added, "updated": updated, "total_scanned": total_scanned, "errors": errors}
-            logger.info(f"Plex full sync done: {added} added, {updated} updated, {total_scanned} scanned")
+                                page = 0
+                                page_size = 100
+
+                                while True:
+                                    try:
+                                        data = await plex_service.get_library_items(srv["url"], srv["token"], lib["id"], start=page, size=page_size)
+                                    except Exception:
+                                        break
+
+                                    items = data.get("items", [])
+                                    if not items:
+                                        break
+
+                                    for item in items:
+                                        total_scanned += 1
+                                        rating_key = item.get("ratingKey")
+                                        if not rating_key:
+                                            continue
+
+                                        tmdb_id = await _extract_tmdb_id(srv["url"], srv["token"], rating_key)
+                                        if not tmdb_id:
+                                            continue
+
+                                        if lib["type"] == "movie":
+                                            if item.get("viewCount", 0) == 0:
+                                                continue
+                                            viewed_at = datetime.utcfromtimestamp(int(item["lastViewedAt"])) if item.get("lastViewedAt") else None
+                                            events.append(watch_history.movie_event(tmdb_id, viewed_at))
+                                            movie_titles[tmdb_id] = (item.get("title", "Unknown"), item.get("year"))
+                                        else:
+                                            show = await _collect_tv_show(srv["url"], srv["token"], rating_key, tmdb_id, item.get("title", "Unknown"))
+                                            if show:
+                                                events.extend(show[0])
+                                                shows[tmdb_id] = (item.get("title", "Unknown"), item.get("year"), show[1])
+
+                                        # Update live status
+                                        await job.progress(total_scanned=total_scanned, errors=errors)
+
+                                    page += page_size
+                                    if len(items) < page_size:
+                                        break
+
+                    except Exception as e:
+                        errors.append(f"{srv['name']}: {str(e)}")
+                        logger.error(f"Plex sync failed for {srv['name']}: {e}")
+
+                new_keys = await watch_history.record(db, user_id, "plex", events)
+                for action in (await apply_watched_movies(
+                    db, user_id, {key[0] for key in new_keys if key[1] == "movie"}, default_wl_id=default_wl.id, titles=movie_titles,
+                )).values():
+                    if action == "updated":
+                        updated += 1
+                    else:
+                        added += 1
+                # Merge newly seen episodes, find or create in watchlist; always update status based on actual progress
+                for tmdb_id, (title, year, status) in shows.items():
+                    action = await apply_new_episodes(
+                        db, all_wl_ids, default_wl.id, tmdb_id, title, watch_history.as_progress(new_keys, tmdb_id),
+                        year, status, user_id=user_id, keep_statuses=("dropped",), force_status=True,
+                    )
+                    if action == "added":
+                        added += 1
+                    elif action == "updated":
+                        updated += 1
+
+                await db.commit()
+                await job.done(added=added, updated=updated, total_scanned=total_scanned, errors=errors)
+                logger.info(f"Plex full sync done: {added} added, {updated} updated, {total_scanned} scanned")
+                from ..services.sync_log import log_sync
+                await log_sync(user_id, "plex", "import", added, updated, len(errors), f"{total_scanned} gescannt" + (f", Fehler: {', '.join(errors)}" if errors else ""))
+        except Exception as e:
+            logger.error(f"Plex full sync failed: {e}")
+            await job.fail(str(e))
             from ..services.sync_log import log_sync
-            await log_sync(user_id, "plex", "import", added, updated, len(errors), f"{total_scanned} gescannt" + (f", Fehler: {', '.join(errors)}" if errors else ""))
-    except Exception as e:
-        logger.error(f"Plex full sync failed: {e}")
-        _sync_status[user_id] = {"running": False, "error": str(e)}
-        from ..services.sync_log import log_sync
-        await log_sync(user_id, "plex", "import", errors=1, details=str(e))
+            await log_sync(user_id, "plex", "import", errors=1, details=str(e))
 
 
 @router.post("/sync")
-async def sync_plex_to_watchlist(background_tasks: BackgroundTasks, user: User = Depends(get_current_user)):
+async def sync_plex_to_watchlist(background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Start full Plex sync in background."""
-    if _sync_status.get(user.id, {}).get("running"):
-        return {"status": "already_running", **_sync_status[user.id]}
-    background_tasks.add_task(_run_full_plex_sync, user.id)
+    job = await sync_jobs.start(user.id, "plex", **PLEX_SYNC_START)
+    if not job:
+        return {"status": "already_running", **await sync_jobs.status(db, user.id, "plex", {"running": True})}
+    background_tasks.add_task(_run_full_plex_sync, user.id, job)
     return {"status": "started"}
 
 
 @router.get("/sync/status")
-async def sync_status(user: User = Depends(get_current_user)):
+async def sync_status(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Check sync progress."""
-    return _sync_status.get(user.id, {"running": False})
+    return await sync_jobs.status(db, user.id, "plex", {"running": False})
+
+
+@router.post("/sync/cancel")
+async def cancel_sync(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    cancelled = await sync_jobs.cancel(db, user.id, "plex")
+    return {"status": "cancelling" if cancelled else "not_running"}
 
 
 @router.post("/sync/watchlist")
 async def sync_watchlist_to_plex(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    """Push all 'watchlist'/'planned' items to Plex Watchlist, remove 'watched' items."""
+    """Push all 'watchlist'/'planned'/'watching' items to Plex Watchlist, remove 'watched' items.
+
+    Matching is done by TMDB GUID against the cloud watchlist; discover keys are cached.
+    """
     if not user.plex_token:
         return {"error": "Kein Plex-Token"}
-
-    # Get all movies in user's watchlists
-    wl_result = await db.execute(select(Watchlist).where(Watchlist.owner_id == user.id))
-    watchlists = wl_result.scalars().all()
-    wl_ids = [wl.id for wl in watchlists]
-
-    if not wl_ids:
-        return {"error": "Keine Watchlists"}
-
-    movies_result = await db.execute(select(Movie).where(Movie.watchlist_id.in_(wl_ids), Movie.tmdb_id != None))
-    movies = movies_result.scalars().all()
-
-    # Get current Plex Watchlist
-    try:
-        plex_wl_items = await plex_service.get_plex_watchlist(user.plex_token)
-        plex_wl_titles = {i.get("title", "").lower() for i in plex_wl_items}
-    except Exception:
-        plex_wl_items = []
-        plex_wl_titles = set()
-
-    added = 0
-    removed = 0
-    errors = 0
-
-    for movie in movies:
-        try:
-            if movie.status in ("watchlist", "planned", "watching"):
-                # Should be on Plex Watchlist
-                if movie.title.lower() not in plex_wl_titles:
-                    year_int = int(movie.year) if movie.year else None
-                    key = await plex_service.find_on_plex_discover(user.plex_token, movie.title, movie.media_type or "movie", year_int)
-                    if key:
-                        await plex_service.add_to_plex_watchlist(user.plex_token, key)
-                        added += 1
-            elif movie.status == "watched":
-                # Should NOT be on Plex Watchlist
-                if movie.title.lower() in plex_wl_titles:
-                    year_int = int(movie.year) if movie.year else None
-                    key = await plex_service.find_on_plex_discover(user.plex_token, movie.title, movie.media_type or "movie", year_int)
-                    if key:
-                        await plex_service.remove_from_plex_watchlist(user.plex_token, key)
-                        removed += 1
-        except Exception:
-            errors += 1
-
-    return {"added": added, "removed": removed, "errors": errors, "total_checked": len(movies)}
+    result = await plex_watchlist.sync_watchlist(db, user)
+    await db.commit()
+    return result
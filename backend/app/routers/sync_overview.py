@@ -2,92 +2,103 @@
 import logging
 
 from fastapi import APIRouter, BackgroundTasks, Depends
-from sqlalchemy import func, select
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth import get_current_user
+from ..config import get_settings
 from ..database import async_session, get_db
 from ..models import (
-    JellyfinServer, Movie, PlexServer, RadarrServer,
-    SonarrServer, SyncLog, TautulliServer, User, Watchlist,
+    JellyfinServer, PlexServer, RadarrServer,
+    SonarrServer, SyncLog, TautulliServer, User,
 )
+from ..services import library_stats, sync_jobs, sync_log
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/sync", tags=["sync"])
 
-_full_sync_status: dict[int, dict] = {}
+FULL_SYNC_IDLE = {"running": False, "step": "idle", "results": []}
 
 
-async def _run_full_sync(user_id: int):
+async def _run_full_sync(user_id: int, job: sync_jobs.Job):
     """Background: run Plex + Jellyfin + Tautulli sync sequentially."""
     from ..services.sync_log import log_sync
 
-    _full_sync_status[user_id] = {"running": True, "step": "plex", "results": []}
-    try:
-        # 1. Plex (has its own logging)
-        _full_sync_status[user_id]["step"] = "plex"
+    results = []
+    async with job:
         try:
-            from ..routers.plex import _run_full_plex_sync
-            await _run_full_plex_sync(user_id)
-            _full_sync_status[user_id]["results"].append("Plex: OK")
-        except Exception as e:
-            _full_sync_status[user_id]["results"].append(f"Plex: Fehler — {e}")
-            await log_sync(user_id, "plex", "import", errors=1, details=f"Voller Sync fehlgeschlagen: {e}")
-
-        # 2. Jellyfin (has its own logging)
-        _full_sync_status[user_id]["step"] = "jellyfin"
-        try:
-            from ..routers.jellyfin import _run_jellyfin_sync
-            await _run_jellyfin_sync(user_id)
-            _full_sync_status[user_id]["results"].append("Jellyfin: OK")
-        except Exception as e:
-            _full_sync_status[user_id]["results"].append(f"Jellyfin: Fehler — {e}")
-            await log_sync(user_id, "jellyfin", "import", errors=1, details=f"Voller Sync fehlgeschlagen: {e}")
-
-        # 3. Tautulli
-        _full_sync_status[user_id]["step"] = "tautulli"
-        try:
-            async with async_session() as db:
-                from ..models import UserPlexConnection
-                conn = (await db.execute(select(UserPlexConnection).where(UserPlexConnection.user_id == user_id))).scalar_one_or_none()
-                if conn:
-                    srv = (await db.execute(select(TautulliServer).where(TautulliServer.id == conn.server_id, TautulliServer.enabled == True))).scalar_one_or_none()
-                    user = (await db.execute(select(User).where(User.id == user_id))).scalar_one()
-                    if srv:
-                        from ..services.tautulli import sync_user_history
-                        result = await sync_user_history(user, conn, srv, db)
-                        await db.commit()
-                        a, u = result.get('added', 0), result.get('updated', 0)
-                        _full_sync_status[user_id]["results"].append(f"Tautulli: +{a} ~{u}")
-                        await log_sync(user_id, "tautulli", "import", a, u, details=f"Voller Sync")
+            # 1. Plex (has its own logging)
+            await job.progress(force=True, step="plex", results=results)
+            try:
+                from ..routers.plex import _run_full_plex_sync
+                await _run_full_plex_sync(user_id)
+                results.append("Plex: OK")
+            except Exception as e:
+                results.append(f"Plex: Fehler — {e}")
+                await log_sync(user_id, "plex", "import", errors=1, details=f"Voller Sync fehlgeschlagen: {e}")
+
+            # 2. Jellyfin (has its own logging)
+            await job.progress(force=True, step="jellyfin", results=results)
+            try:
+                from ..routers.jellyfin import _run_jellyfin_sync
+                await _run_jellyfin_sync(user_id)
+                results.append("Jellyfin: OK")
+            except Exception as e:
+                results.append(f"Jellyfin: Fehler — {e}")
+                await log_sync(user_id, "jellyfin", "import", errors=1, details=f"Voller Sync fehlgeschlagen: {e}")
+
+            # 3. Tautulli
+            await job.progress(force=True, step="tautulli", results=results)
+            try:
+                async with async_session() as db:
+                    from ..models import UserPlexConnection
+                    conn = (await db.execute(select(UserPlexConnection).where(UserPlexConnection.user_id == user_id))).scalar_one_or_none()
+                    if conn:
+                        srv = (await db.execute(select(TautulliServer).where(TautulliServer.id == conn.server_id, TautulliServer.enabled == True))).scalar_one_or_none()
+                        user = (await db.execute(select(User).where(User.id == user_id))).scalar_one()
+                        if srv:
+                            from ..services.tautulli import sync_user_history
+                            result = await sync_user_history(user, conn, srv, db)
+                            await db.commit()
+                            a, u = result.get('added', 0), result.get('updated', 0)
+                            results.append(f"Tautulli: +{a} ~{u}")
+                            await log_sync(user_id, "tautulli", "import", a, u, details=f"Voller Sync")
+                        else:
+                            results.append("Tautulli: übersprungen (kein aktiver Server)")
                     else:
-                        _full_sync_status[user_id]["results"].append("Tautulli: übersprungen (kein aktiver Server)")
-                else:
-                    _full_sync_status[user_id]["results"].append("Tautulli: übersprungen (keine Verbindung)")
-        except Exception as e:
-            _full_sync_status[user_id]["results"].append(f"Tautulli: Fehler — {e}")
-            await log_sync(user_id, "tautulli", "import", errors=1, details=str(e))
+                        results.append("Tautulli: übersprungen (keine Verbindung)")
+            except Exception as e:
+                results.append(f"Tautulli: Fehler — {e}")
+                await log_sync(user_id, "tautulli", "import", errors=1, details=str(e))
 
-        _full_sync_status[user_id] = {"running": False, "step": "done", "results": _full_sync_status[user_id]["results"]}
-        logger.info(f"Full sync done for user {user_id}: {_full_sync_status[user_id]['results']}")
-    except Exception as e:
-        _full_sync_status[user_id] = {"running": False, "step": "error", "results": [str(e)]}
-        await log_sync(user_id, "full-sync", "import", errors=1, details=str(e))
+            await job.done(step="done", results=results)
+            logger.info(f"Full sync done for user {user_id}: {results}")
+        except Exception as e:
+            await job.fail(str(e), step="error", results=[str(e)])
+            await log_sync(user_id, "full-sync", "import", errors=1, details=str(e))
 
 
 @router.post("/full")
-async def start_full_sync(user: User = Depends(get_current_user)):
+async def start_full_sync(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Start full Plex + Jellyfin + Tautulli sync in background."""
-    if _full_sync_status.get(user.id, {}).get("running"):
-        return {"status": "already_running", **_full_sync_status[user.id]}
+    job = await sync_jobs.start(user.id, "full", step="plex", results=[])
+    if not job:
+        return {"status": "already_running", **await sync_jobs.status(db, user.id, "full", FULL_SYNC_IDLE)}
     import asyncio
-    asyncio.ensure_future(_run_full_sync(user.id))
+    asyncio.ensure_future(_run_full_sync(user.id, job))
     return {"status": "started"}
 
 
 @router.get("/full/status")
-async def full_sync_status(user: User = Depends(get_current_user)):
-    return _full_sync_status.get(user.id, {"running": False, "step": "idle", "results": []})
+async def full_sync_status(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await sync_jobs.status(db, user.id, "full", FULL_SYNC_IDLE)
+
+
+@router.post("/full/cancel")
+async def cancel_full_sync(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Cancel the full sync, including the Plex/Jellyfin sync it is currently running."""
+    cancelled = await sync_jobs.cancel(db, user.id, "full", "plex", "jellyfin")
+    return {"status": "cancelling" if cancelled else "not_running"}
 
 
 @router.get("/overview")
@@ -95,40 +106,7 @@ async def sync_overview(user: User = Depends(get_current_user), db: AsyncSession
     """Complete sync overview for the current user."""
 
     # --- Watchlist Stats ---
-    all_wls = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user.id))).scalars().all()
-    wl_ids = [w.id for w in all_wls]
-
-    total = 0
-    movies_count = 0
-    movies_watched = 0
-    series_count = 0
-    series_watched = 0
-    watched = 0
-    watching = 0
-    episodes_watched = 0
-    by_status = {}
-
-    if wl_ids:
-        all_movies = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(wl_ids)))).scalars().all()
-        total = len(all_movies)
-        for m in all_movies:
-            if m.media_type == "movie":
-                movies_count += 1
-                if m.status == "watched":
-                    movies_watched += 1
-            else:
-                series_count += 1
-                if m.status == "watched":
-                    series_watched += 1
-            by_status[m.status] = by_status.get(m.status, 0) + 1
-            if m.status == "watched":
-                watched += 1
-            elif m.status == "watching":
-                watching += 1
-            if m.watch_progress:
-                for eps in m.watch_progress.values():
-                    if isinstance(eps, list):
-                        episodes_watched += len(eps)
+    stats = await library_stats.watchlist_stats(db, user.id)
 
     # --- Plex (from DB, no live check) ---
     plex_info = {"connected": bool(user.plex_token), "servers": []}
@@ -169,36 +147,36 @@ async def sync_overview(user: User = Depends(get_current_user), db: AsyncSession
 
     # --- Sync Schedule ---
     schedule = [
-        {"name": "Plex Watch-History", "interval": "10 Min", "type": "auto", "active": plex_info["connected"]},
-        {"name": "Jellyfin Watch-History", "interval": "10 Min", "type": "auto", "active": jf_info["connected"]},
+        {"name": "Plex Webhook (Scrobble)", "interval": "Sofort", "type": "realtime", "active": plex_info["connected"]},
+        {"name": "Jellyfin Webhook (Gesehen)", "interval": "Sofort", "type": "realtime", "active": jf_info["connected"]},
+        {"name": "Plex Watch-History (Abgleich)", "interval": "60 Min", "type": "auto", "active": plex_info["connected"]},
+        {"name": "Jellyfin Watch-History (Abgleich)", "interval": "60 Min", "type": "auto", "active": jf_info["connected"]},
         {"name": "Plex Server Discovery", "interval": "1 Stunde", "type": "auto", "active": plex_info["connected"]},
+        {"name": "Medien-Index (Sprachen/Technik)", "interval": "30 Min", "type": "auto", "active": plex_info["connected"] or jf_info["connected"]},
         {"name": "Tautulli Sync", "interval": "30 Min", "type": "auto", "active": tautulli_info["connected"]},
-        {"name": "Voller Plex+Jellyfin+Tautulli Sync", "interval": "Täglich 3:00", "type": "nightly", "active": True},
+        {"name": "Voller Plex+Jellyfin+Tautulli Sync", "interval": f"Täglich ab 3:00 (verteilt über {get_settings().nightly_sync_window_minutes} Min)", "type": "nightly", "active": True},
         {"name": "Status → Plex/Jellyfin", "interval": "Sofort", "type": "realtime", "active": True},
         {"name": "Episoden → Plex/Jellyfin", "interval": "Sofort", "type": "realtime", "active": True},
         {"name": "Watchlist → Plex Merkliste", "interval": "Sofort", "type": "realtime", "active": plex_info["connected"]},
     ]
 
-    # --- Recent Sync Logs ---
+    # --- Recent Sync Logs (written + still in this process's write buffer) ---
     logs_result = await db.execute(
         select(SyncLog).where(SyncLog.user_id == user.id).order_by(SyncLog.created_at.desc()).limit(20)
     )
-    recent_logs = [
+    logs = [
         {
             "source": l.source, "direction": l.direction,
             "added": l.added, "updated": l.updated, "errors": l.errors,
-            "details": l.details, "created_at": str(l.created_at),
+            "details": l.details, "created_at": l.created_at,
         }
         for l in logs_result.scalars().all()
     ]
+    logs += [{k: row[k] for k in ("source", "direction", "added", "updated", "errors", "details", "created_at")} for row in sync_log.buffered(user.id)]
+    recent_logs = [{**l, "created_at": str(l["created_at"])} for l in sorted(logs, key=lambda l: l["created_at"], reverse=True)[:20]]
 
     return {
-        "watchlist": {
-            "total": total, "movies": movies_count, "movies_watched": movies_watched,
-            "series": series_count, "series_watched": series_watched,
-            "watched": watched, "watching": watching, "episodes_watched": episodes_watched,
-            "by_status": by_status,
-        },
+        "watchlist": stats,
         "plex": plex_info,
         "jellyfin": jf_info,
         "sonarr": sonarr_info,
@@ -1,21 +1,32 @@
 import asyncio
+import base64
 import logging
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
-from sqlalchemy import func, or_, select
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import func, literal_column, or_, select, true, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, contains_eager
 
+from .. import access
 from ..auth import get_current_user
 from ..database import async_session, get_db
-from ..models import DownloadProfile, Friend, JellyfinServer, Movie, PlexServer, RadarrServer, SonarrServer, User, Watchlist, WatchlistShare
+from ..models import DownloadProfile, JellyfinServer, Movie, PlexServer, RadarrServer, SonarrServer, Title, User, WatchEvent, Watchlist, WatchlistShare
 from ..services import jellyfin as jf_service, plex as plex_service, radarr as radarr_service, sonarr as sonarr_service
-from ..services.tmdb import TMDBService
+from ..services import data_export, episode_progress, library_search, titles, watch_history
+from ..services.plex_watchlist import resolve_discover_key
 
 logger = logging.getLogger(__name__)
 from ..schemas import (
+    MovieBatchResult,
+    MovieBatchUpdate,
     MovieCreate,
     MovieOut,
     MovieUpdate,
+    WatchEventOut,
     WatchlistCreate,
     WatchlistOut,
     WatchlistSettings,
@@ -36,69 +47,73 @@ async def get_or_create_default(user_id: int, db: AsyncSession) -> Watchlist:
         wl = Watchlist(owner_id=user_id, name="Meine Watchlist", icon="🎬", is_default=True)
         db.add(wl)
         await db.flush()
+        access.invalidate(db, user_id)
     return wl
 
 
 async def get_accessible_watchlist(watchlist_id: int, user_id: int, db: AsyncSession, need_edit: bool = False) -> Watchlist:
     """Get a watchlist if user owns it or has share access."""
-    result = await db.execute(select(Watchlist).where(Watchlist.id == watchlist_id))
-    wl = result.scalar_one_or_none()
-    if not wl:
-        raise HTTPException(status_code=404, detail="Watchlist not found")
+    await access.ensure_watchlist_access(db, user_id, watchlist_id, need_edit)
+    return (await db.execute(select(Watchlist).where(Watchlist.id == watchlist_id))).scalar_one()
 
-    if wl.owner_id == user_id:
-        return wl
 
-    share = await db.execute(
-        select(WatchlistShare).where(WatchlistShare.watchlist_id == watchlist_id, WatchlistShare.user_id == user_id)
+# --- Watchlist CRUD ---
+def _watchlist_listing_query(user_id: int):
+    """Own + shared watchlists with movie count, owner name and shares in a single statement."""
+    accessible = or_(
+        Watchlist.owner_id == user_id,
+        Watchlist.id.in_(select(WatchlistShare.watchlist_id).where(WatchlistShare.user_id == user_id)),
+    )
+    counts = (
+        select(Movie.watchlist_id, func.count().label("movie_count"))
+        .where(Movie.watchlist_id.in_(select(Watchlist.id).where(accessible)))
+        .group_by(Movie.watchlist_id)
+        .subquery()
+    )
+    owner = aliased(User)
+    share_user = aliased(User)
+    shares = (
+        select(func.coalesce(
+            func.json_agg(func.json_build_object(
+                literal_column("'user_id'"), WatchlistShare.user_id,
+                literal_column("'username'"), share_user.username,
+                literal_column("'permission'"), WatchlistShare.permission,
+            )),
+            literal_column("'[]'::json"),
+        ).label("shared_with"))
+        .select_from(WatchlistShare)
+        .join(share_user, share_user.id == WatchlistShare.user_id)
+        .where(WatchlistShare.watchlist_id == Watchlist.id)
+        .lateral("shares")
+    )
+    return (
+        select(Watchlist, owner.username, func.coalesce(counts.c.movie_count, 0), shares.c.shared_with)
+        .join(owner, owner.id == Watchlist.owner_id)
+        .outerjoin(counts, counts.c.watchlist_id == Watchlist.id)
+        .join(shares, true())
+        .where(accessible)
+        .order_by(Watchlist.owner_id != user_id, Watchlist.is_default.desc(), Watchlist.created_at)
     )
-    s = share.scalar_one_or_none()
-    if not s:
-        raise HTTPException(status_code=403, detail="No access")
-    if need_edit and s.permission != "edit":
-        raise HTTPException(status_code=403, detail="No edit permission")
-    return wl
 
 
-# --- Watchlist CRUD ---
 @router.get("/lists", response_model=list[WatchlistOut])
 async def get_my_watchlists(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    # Own watchlists
-    result = await db.execute(
-        select(Watchlist).where(Watchlist.owner_id == user.id).order_by(Watchlist.is_default.desc(), Watchlist.created_at)
-    )
-    own = result.scalars().all()
-
-    # Shared with me
-    shared_result = await db.execute(
-        select(Watchlist)
-        .join(WatchlistShare, WatchlistShare.watchlist_id == Watchlist.id)
-        .where(WatchlistShare.user_id == user.id)
-    )
-    shared = shared_result.scalars().all()
+    rows = (await db.execute(_watchlist_listing_query(user.id))).all()
 
     # Ensure default exists
-    if not own:
-        default = await get_or_create_default(user.id, db)
-        own = [default]
+    if not any(wl.owner_id == user.id for wl, *_ in rows):
+        await get_or_create_default(user.id, db)
+        rows = (await db.execute(_watchlist_listing_query(user.id))).all()
 
-    out = []
-    for wl in list(own) + list(shared):
-        count = await db.execute(select(func.count()).where(Movie.watchlist_id == wl.id))
-        owner = await db.execute(select(User.username).where(User.id == wl.owner_id))
-
-        shares = await db.execute(
-            select(WatchlistShare, User).join(User, WatchlistShare.user_id == User.id).where(WatchlistShare.watchlist_id == wl.id)
-        )
-        shared_with = [{"user_id": s.user_id, "username": u.username, "permission": s.permission} for s, u in shares.all()]
-
-        out.append(WatchlistOut(
+    return [
+        WatchlistOut(
             id=wl.id, name=wl.name, icon=wl.icon, owner_id=wl.owner_id,
-            owner_username=owner.scalar(), visibility=wl.visibility,
-            is_default=wl.is_default, movie_count=count.scalar(),
-            shared_with=shared_with, created_at=wl.created_at,
-        ))
-    return out
+            owner_username=owner_username, visibility=wl.visibility,
+            is_default=wl.is_default, movie_count=movie_count,
+            shared_with=shared_with or [], created_at=wl.created_at,
+        )
+        for wl, owner_username, movie_count, shared_with in rows
+    ]
 
 
 @router.post("/lists", response_model=WatchlistOut, status_code=201)
@@ -106,6 +121,7 @@ async def create_watchlist(data: WatchlistCreate, user: User = Depends(get_curre
     wl = Watchlist(owner_id=user.id, name=data.name, icon=data.icon, visibility=data.visibility)
     db.add(wl)
     await db.flush()
+    access.invalidate(db, user.id)
     return WatchlistOut(
         id=wl.id, name=wl.name, icon=wl.icon, owner_id=wl.owner_id,
         owner_username=user.username, visibility=wl.visibility,
@@ -139,15 +155,18 @@ async def delete_watchlist(watchlist_id: int, user: User = Depends(get_current_u
         raise HTTPException(status_code=404)
     if wl.is_default:
         raise HTTPException(status_code=400, detail="Cannot delete default watchlist")
+    shared_with = (await db.execute(select(WatchlistShare.user_id).where(WatchlistShare.watchlist_id == wl.id))).scalars().all()
     await db.delete(wl)
+    access.invalidate(db, user.id, *shared_with)
 
 
 # --- Sharing ---
 @router.post("/lists/{watchlist_id}/share")
-async def share_watchlist(watchlist_id: int, data: WatchlistShareCreate, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Watchlist).where(Watchlist.id == watchlist_id, Watchlist.owner_id == user.id))
-    wl = result.scalar_one_or_none()
-    if not wl:
+async def share_watchlist(
+    watchlist_id: int, data: WatchlistShareCreate, user: User = Depends(get_current_user),
+    grants: access.AccessGrants = Depends(access.get_access), db: AsyncSession = Depends(get_db),
+):
+    if not grants.owns(watchlist_id):
         raise HTTPException(status_code=404)
 
     target = await db.execute(select(User).where(User.username == data.username))
@@ -164,13 +183,13 @@ async def share_watchlist(watchlist_id: int, data: WatchlistShareCreate, user: U
         raise HTTPException(status_code=409, detail="Already shared")
 
     db.add(WatchlistShare(watchlist_id=watchlist_id, user_id=target_user.id, permission=data.permission))
+    access.invalidate(db, target_user.id)
     return {"message": f"Shared with {data.username}"}
 
 
 @router.delete("/lists/{watchlist_id}/share/{user_id}")
-async def unshare_watchlist(watchlist_id: int, user_id: int, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Watchlist).where(Watchlist.id == watchlist_id, Watchlist.owner_id == user.id))
-    if not result.scalar_one_or_none():
+async def unshare_watchlist(watchlist_id: int, user_id: int, grants: access.AccessGrants = Depends(access.get_access), db: AsyncSession = Depends(get_db)):
+    if not grants.owns(watchlist_id):
         raise HTTPException(status_code=404)
 
     share = await db.execute(
@@ -179,72 +198,224 @@ async def unshare_watchlist(watchlist_id: int, user_id: int, user: User = Depend
     s = share.scalar_one_or_none()
     if s:
         await db.delete(s)
+        access.invalidate(db, user_id)
     return {"message": "Unshared"}
 
 
 def _needs_enrich(movie: Movie) -> bool:
-    return bool(movie.tmdb_id and movie.media_type and (not movie.poster_url or not movie.overview or not movie.backdrop_path))
+    return titles.needs_enrich(movie)
 
 
 async def _auto_enrich(movies: list[Movie], db: AsyncSession):
-    """Auto-enrich movies missing metadata from TMDB."""
-    tmdb = TMDBService()
-    for movie in movies:
-        if _needs_enrich(movie):
-            try:
-                data = await tmdb.details(movie.media_type, movie.tmdb_id)
-                if data.get("poster_path"):
-                    movie.poster_url = data["poster_path"]
-                if not movie.backdrop_path and data.get("backdrop_path"):
-                    movie.backdrop_path = data["backdrop_path"]
-                if not movie.overview and data.get("overview"):
-                    movie.overview = data["overview"]
-                if not movie.vote_average and data.get("vote_average"):
-                    movie.vote_average = data["vote_average"]
-                if not movie.genres and data.get("genres"):
-                    movie.genres = [g["id"] for g in data["genres"]]
-                if not movie.year:
-                    date = data.get("release_date") or data.get("first_air_date") or ""
-                    if date:
-                        movie.year = date[:4]
-            except Exception:
-                pass
-    await db.flush()
+    """Auto-enrich movies missing metadata from TMDB (once per shared title)."""
+    await titles.enrich(db, movies)
 
 
 # --- Movies ---
+MOVIE_FIELDS = tuple(MovieOut.model_fields)
+
+
+def _encode_cursor(sort_value: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{sort_value.isoformat()}|{row_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        created_at, movie_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(movie_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_fields(fields: str | None) -> list[str] | None:
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in MOVIE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # id + created_at are needed for the cursor
+    return list(dict.fromkeys(["id", "created_at", *requested]))
+
+
+# Private tags are removed inside the query, so they never reach the process
+PUBLIC_TAGS_PATH = literal_column("'$[*] ? (!exists(@.is_private ? (@ == true)))'::jsonpath")
+
+
+def _public_tags():
+    return func.jsonb_path_query_array(func.coalesce(Movie.tags, literal_column("'[]'::jsonb")), PUBLIC_TAGS_PATH, type_=JSONB)
+
+
+def _movie_filters(
+    status: str | None, media_type: str | None, tag: str | None, genre: int | None, public_tags_only: bool = False,
+) -> list:
+    filters = []
+    if status:
+        filters.append(Movie.status == status)
+    if media_type:
+        filters.append(Movie.media_type == media_type)
+    if tag:
+        filters.append(Movie.tags.contains([{"label": tag}]))  # GIN-indexed prefilter
+        if public_tags_only:
+            # Friends must not be able to probe for private labels
+            filters.append(_public_tags().contains([{"label": tag}]))
+    if genre is not None:
+        filters.append(titles.genres_filter([genre]))
+    return filters
+
+
+async def _paginated_movies(
+    db: AsyncSession, response: Response, filters: list, limit: int | None, cursor: str | None, columns: list | None,
+):
+    """Keyset page over (created_at, id) desc. Sets X-Next-Cursor and, on the first page, X-Total-Count.
+
+    columns=None loads Movie entities, otherwise read-only rows. Without a limit all
+    matching rows are returned (legacy clients).
+    """
+    query = titles.join_shared(select(*(columns or [Movie]))).where(*filters).order_by(Movie.created_at.desc(), Movie.id.desc())
+    if not columns:
+        query = query.options(contains_eager(Movie.shared))
+    if cursor:
+        query = query.where(tuple_(Movie.created_at, Movie.id) < _decode_cursor(cursor))
+    if limit:
+        query = query.limit(limit + 1)
+
+    result = await db.execute(query)
+    rows = result.all() if columns else result.scalars().all()
+
+    if limit:
+        if len(rows) > limit:
+            rows = rows[:limit]
+            response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+        if not cursor:
+            total = (await db.execute(titles.join_shared(select(func.count()).select_from(Movie)).where(*filters))).scalar()
+            response.headers["X-Total-Count"] = str(total)
+    return rows
+
+
+def _projected_response(rows, response: Response) -> JSONResponse:
+    return JSONResponse(
+        content=jsonable_encoder([dict(r._mapping) for r in rows]),
+        headers={k: v for k, v in response.headers.items() if k.lower().startswith("x-")},
+    )
+
+
+@router.get("/history", response_model=list[WatchEventOut])
+async def get_watch_history(
+    response: Response,
+    tmdb_id: int | None = Query(None),
+    media_type: str | None = Query(None),
+    since: datetime | None = Query(None, description="Only events watched at or after this time"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: str | None = Query(None),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """The user's watch history, newest first. Keyset-paged via X-Next-Cursor."""
+    filters = [WatchEvent.user_id == user.id]
+    if tmdb_id:
+        filters.append(WatchEvent.tmdb_id == tmdb_id)
+    if media_type:
+        filters.append(WatchEvent.media_type == media_type)
+    if since:
+        if since.tzinfo:  # watched_at is naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+        filters.append(WatchEvent.watched_at >= since)
+    if cursor:
+        filters.append(tuple_(WatchEvent.watched_at, WatchEvent.id) < _decode_cursor(cursor))
+
+    own_title = (
+        select(Movie.title)
+        .where(Movie.watchlist_id.in_(select(Watchlist.id).where(Watchlist.owner_id == user.id)),
+               Movie.tmdb_id == WatchEvent.tmdb_id, Movie.media_type == WatchEvent.media_type)
+        .limit(1).scalar_subquery()
+    )
+    rows = (await db.execute(
+        select(
+            WatchEvent.id, WatchEvent.tmdb_id, WatchEvent.media_type, WatchEvent.season, WatchEvent.episode,
+            WatchEvent.source, WatchEvent.watched_at,
+            func.coalesce(own_title, Title.title).label("title"), Title.poster_url,
+        )
+        .outerjoin(Title, (Title.tmdb_id == WatchEvent.tmdb_id) & (Title.media_type == WatchEvent.media_type))
+        .where(*filters)
+        .order_by(WatchEvent.watched_at.desc(), WatchEvent.id.desc())
+        .limit(limit + 1)
+    )).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].watched_at, rows[-1].id)
+    return [dict(r._mapping) for r in rows]
+
+
+@router.get("/search", response_model=list[MovieOut])
+async def search_movies(
+    response: Response,
+    q: str | None = Query(None, max_length=200, description="Search in title and overview"),
+    watchlist_id: int | None = Query(None),
+    status: list[str] | None = Query(None),
+    media_type: str | None = Query(None),
+    tag: list[str] | None = Query(None, description="Tag labels, all must match"),
+    genre: list[int] | None = Query(None, description="TMDB genre ids, all must match"),
+    year_from: int | None = Query(None),
+    year_to: int | None = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Ranked search over all owned + shared watchlists (or one of them). Sets X-Total-Count."""
+    if watchlist_id:
+        await access.ensure_watchlist_access(db, user.id, watchlist_id)
+        wl_ids = [watchlist_id]
+    else:
+        grants = await access.load_grants(db, user.id)
+        wl_ids = [*grants.own_watchlists, *grants.shared_watchlists]
+    if not wl_ids:
+        response.headers["X-Total-Count"] = "0"
+        return []
+
+    query, count = library_search.search_query(wl_ids, q, status, media_type, tag, genre, year_from, year_to)
+    rows = (await db.execute(query.limit(limit).offset(offset))).scalars().all()
+    response.headers["X-Total-Count"] = str((await db.execute(count)).scalar())
+    return rows
+
+
 @router.get("/movies", response_model=list[MovieOut])
 async def get_movies(
+    response: Response,
     watchlist_id: int | None = Query(None),
+    status: str | None = Query(None),
+    media_type: str | None = Query(None),
+    tag: str | None = Query(None, description="Tag label"),
+    genre: int | None = Query(None, description="TMDB genre id"),
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = Query(None),
+    fields: str | None = Query(None, description="Comma-separated MovieOut fields"),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     if watchlist_id:
-        wl = await get_accessible_watchlist(watchlist_id, user.id, db)
-        result = await db.execute(
-            select(Movie).where(Movie.watchlist_id == wl.id).order_by(Movie.created_at.desc())
-        )
+        await access.ensure_watchlist_access(db, user.id, watchlist_id)
+        wl_filter = Movie.watchlist_id == watchlist_id
     else:
         # All movies from all owned + shared watchlists
-        own_ids = await db.execute(select(Watchlist.id).where(Watchlist.owner_id == user.id))
-        shared_ids = await db.execute(
-            select(WatchlistShare.watchlist_id).where(WatchlistShare.user_id == user.id)
-        )
-        all_ids = [r for r in own_ids.scalars().all()] + [r for r in shared_ids.scalars().all()]
-        if not all_ids:
-            default = await get_or_create_default(user.id, db)
-            all_ids = [default.id]
-
-        result = await db.execute(
-            select(Movie).where(Movie.watchlist_id.in_(all_ids)).order_by(Movie.created_at.desc())
-        )
+        grants = await access.load_grants(db, user.id)
+        wl_ids = [*grants.own_watchlists, *grants.shared_watchlists]
+        if not wl_ids:
+            wl_ids = [(await get_or_create_default(user.id, db)).id]
+        wl_filter = Movie.watchlist_id.in_(wl_ids)
+
+    projection = _parse_fields(fields)
+    columns = [getattr(Movie, f) for f in projection] if projection else None
+    rows = await _paginated_movies(db, response, [wl_filter, *_movie_filters(status, media_type, tag, genre)], limit, cursor, columns)
+    if projection:
+        return _projected_response(rows, response)
 
-    movies = result.scalars().all()
     # Only enrich first 5 (background, not blocking)
-    to_enrich = [m for m in movies if _needs_enrich(m)][:5]
+    to_enrich = [m for m in rows if _needs_enrich(m)][:5]
     if to_enrich:
         await _auto_enrich(to_enrich, db)
-    return movies
+    return rows
 
 
 async def _auto_download(tmdb_id: int, media_type: str, title: str, tags: list | None):
@@ -349,15 +520,15 @@ async def add_movie(
     db: AsyncSession = Depends(get_db),
 ):
     if watchlist_id:
-        wl = await get_accessible_watchlist(watchlist_id, user.id, db, need_edit=True)
+        await access.ensure_watchlist_access(db, user.id, watchlist_id, need_edit=True)
     else:
-        wl = await get_or_create_default(user.id, db)
+        watchlist_id = (await get_or_create_default(user.id, db)).id
 
     # Check for duplicate
     if data.tmdb_id:
         existing = await db.execute(
             select(Movie).where(
-                Movie.watchlist_id == wl.id,
+                Movie.watchlist_id == watchlist_id,
                 Movie.tmdb_id == data.tmdb_id,
                 Movie.media_type == data.media_type,
             )
@@ -365,10 +536,17 @@ async def add_movie(
         if existing.scalar_one_or_none():
             raise HTTPException(status_code=409, detail="Movie already in watchlist")
 
-    movie = Movie(watchlist_id=wl.id, **data.model_dump(mode="json"))
+    movie = Movie(watchlist_id=watchlist_id, **data.model_dump(mode="json"))
+    if data.tmdb_id and data.media_type == "tv" and not movie.watch_progress:
+        # Re-added show: restore progress from the watch history
+        movie.watch_progress = await watch_history.progress_for(db, user.id, data.tmdb_id)
     db.add(movie)
     await db.flush()
+    # Metadata the client sent from TMDB stays in titles only; what differs is the user's own
+    await titles.drop_copies(db, Movie.id == movie.id)
     await db.refresh(movie)
+    if titles.needs_enrich(movie):
+        background_tasks.add_task(_enrich_in_background, [movie.id])
 
     # Trigger auto-download in background
     if data.tmdb_id and data.media_type and not skip_auto_download:
@@ -421,8 +599,8 @@ async def _sync_plex_watch_status(tmdb_id: int, media_type: str, status: str, ti
             # 2. Sync Plex Cloud Watchlist
             if plex_token and title:
                 try:
-                    year_int = int(year) if year else None
-                    discover_key = await plex_service.find_on_plex_discover(plex_token, title, media_type, year_int)
+                    discover_key = await resolve_discover_key(db, plex_token, tmdb_id, media_type, title, year)
+                    await db.commit()
                     if discover_key:
                         if status in ("watchlist", "planned"):
                             await plex_service.add_to_plex_watchlist(plex_token, discover_key)
@@ -442,16 +620,16 @@ async def _sync_plex_watch_status(tmdb_id: int, media_type: str, status: str, ti
             jf_servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.user_id == user_id, JellyfinServer.enabled == True))).scalars().all()
             for srv in jf_servers:
                 try:
-                    item = await jf_service.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, tmdb_id, media_type)
+                    item = await jf_service.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, tmdb_id, media_type, server_id=srv.id)
                     if not item:
                         continue
                     if status == "watched":
-                        await jf_service.mark_watched(srv.url, srv.token, srv.jellyfin_user_id, item["id"])
+                        await jf_service.mark_watched(srv.url, srv.token, srv.jellyfin_user_id, item["id"], server_id=srv.id)
                         logger.info(f"Marked '{item['name']}' as watched on Jellyfin {srv.name}")
                         from ..services.sync_log import log_sync
                         await log_sync(user_id, "jellyfin", "export", updated=1, details=f"'{title}' → {status} auf {srv.name}")
                     elif status in ("watchlist", "planned"):
-                        await jf_service.mark_unwatched(srv.url, srv.token, srv.jellyfin_user_id, item["id"])
+                        await jf_service.mark_unwatched(srv.url, srv.token, srv.jellyfin_user_id, item["id"], server_id=srv.id)
                         from ..services.sync_log import log_sync
                         await log_sync(user_id, "jellyfin", "export", updated=1, details=f"'{title}' → ungesehen auf {srv.name}")
                 except Exception as e:
@@ -473,12 +651,7 @@ async def _sync_plex_episode_progress(tmdb_id: int, old_progress: dict, new_prog
                 return
 
             # Find new episodes (in new_progress but not in old_progress)
-            new_episodes = {}  # {season: [ep_nums]}
-            for season, eps in new_progress.items():
-                old_eps = set(old_progress.get(season, []))
-                new_eps = [e for e in eps if e not in old_eps]
-                if new_eps:
-                    new_episodes[season] = new_eps
+            new_episodes = episode_progress.added_episodes(old_progress, new_progress)  # {season: [ep_nums]}
 
             if not new_episodes:
                 logger.warning(f"No new episodes to sync")
@@ -537,21 +710,21 @@ async def _sync_plex_episode_progress(tmdb_id: int, old_progress: dict, new_prog
             jf_servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.user_id == user_id, JellyfinServer.enabled == True))).scalars().all()
             for srv in jf_servers:
                 try:
-                    item = await jf_service.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, tmdb_id, "tv")
+                    item = await jf_service.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, tmdb_id, "tv", server_id=srv.id)
                     if not item:
                         continue
-                    seasons = await jf_service.get_seasons(srv.url, srv.token, srv.jellyfin_user_id, item["id"])
+                    seasons = await jf_service.get_seasons(srv.url, srv.token, srv.jellyfin_user_id, item["id"], server_id=srv.id)
                     jf_seasons = {s.get("IndexNumber"): s.get("Id") for s in seasons}
                     for season_str, ep_nums in new_episodes.items():
                         season_id = jf_seasons.get(int(season_str))
                         if not season_id:
                             continue
-                        episodes = await jf_service.get_episodes(srv.url, srv.token, srv.jellyfin_user_id, item["id"], season_id)
+                        episodes = await jf_service.get_episodes(srv.url, srv.token, srv.jellyfin_user_id, item["id"], season_id, server_id=srv.id)
                         jf_eps = {e.get("IndexNumber"): e.get("Id") for e in episodes}
                         for ep_num in ep_nums:
                             ep_id = jf_eps.get(ep_num)
                             if ep_id:
-                                await jf_service.mark_episode_watched(srv.url, srv.token, srv.jellyfin_user_id, ep_id)
+                                await jf_service.mark_episode_watched(srv.url, srv.token, srv.jellyfin_user_id, ep_id, server_id=srv.id)
                     logger.info(f"Synced episodes to Jellyfin {srv.name}")
                 except Exception:
                     continue
@@ -567,9 +740,8 @@ async def update_movie(movie_id: int, data: MovieUpdate, background_tasks: Backg
         raise HTTPException(status_code=404)
 
     # Check access
-    await get_accessible_watchlist(movie.watchlist_id, user.id, db, need_edit=True)
+    await access.ensure_movie_access(db, user.id, movie, need_edit=True)
 
-    old_status = movie.status
     old_progress = dict(movie.watch_progress or {})
 
     update_data = data.model_dump(exclude_unset=True, mode="json")
@@ -578,19 +750,97 @@ async def update_movie(movie_id: int, data: MovieUpdate, background_tasks: Backg
     await db.flush()
     await db.refresh(movie)
 
-    # Sync status change to Plex
-    if "status" in update_data and movie.tmdb_id and movie.media_type:
-        background_tasks.add_task(_sync_plex_watch_status, movie.tmdb_id, movie.media_type, data.status, movie.title, movie.year or "", user.id)
-
-    # Sync episode progress changes to Plex
-    if "watch_progress" in update_data and movie.tmdb_id and movie.media_type == "tv":
-        new_progress = update_data["watch_progress"] or {}
-        logger.warning(f"Episode progress changed for {movie.title}: old={old_progress} new={new_progress}")
-        background_tasks.add_task(_sync_plex_episode_progress, movie.tmdb_id, old_progress, new_progress, user.id)
+    await watch_history.record(db, user.id, "app", _manual_watch_events(movie, update_data.keys(), old_progress))
+    job = _outbound_sync_job(movie, update_data.keys(), old_progress)
+    if job:
+        background_tasks.add_task(_sync_movie_changes, user.id, job)
 
     return movie
 
 
+def _manual_watch_events(movie: Movie, changed, old_progress: dict) -> list:
+    """History events for a movie marked as watched / newly ticked episodes in the app."""
+    if not movie.tmdb_id:
+        return []
+    if movie.media_type == "movie" and "status" in changed and movie.status == "watched":
+        return [watch_history.movie_event(movie.tmdb_id, datetime.utcnow())]
+    if movie.media_type == "tv" and "watch_progress" in changed:
+        return watch_history.episode_events(movie.tmdb_id, episode_progress.added_episodes(old_progress, movie.watch_progress), datetime.utcnow())
+    return []
+
+
+def _outbound_sync_job(movie: Movie, changed, old_progress: dict) -> dict | None:
+    """What has to be pushed to Plex after a movie changed (status and/or episode progress)."""
+    if not movie.tmdb_id or not movie.media_type:
+        return None
+    job = {}
+    if "status" in changed:
+        job["status"] = movie.status
+    if "watch_progress" in changed and movie.media_type == "tv":
+        job["old_progress"] = old_progress
+        job["new_progress"] = dict(movie.watch_progress or {})
+    if not job:
+        return None
+    return {"tmdb_id": movie.tmdb_id, "media_type": movie.media_type, "title": movie.title, "year": movie.year or "", **job}
+
+
+async def _sync_movie_changes(user_id: int, *jobs: dict):
+    """Background task: push status and episode progress changes, one job per title."""
+    for job in jobs:
+        if "status" in job:
+            await _sync_plex_watch_status(job["tmdb_id"], job["media_type"], job["status"], job["title"], job["year"], user_id)
+        if "new_progress" in job and job["new_progress"] != job["old_progress"]:
+            logger.info(f"Episode progress changed for {job['title']}: old={job['old_progress']} new={job['new_progress']}")
+            await _sync_plex_episode_progress(job["tmdb_id"], job["old_progress"], job["new_progress"], user_id)
+
+
+@router.patch("/movies", response_model=list[MovieBatchResult])
+async def batch_update_movies(data: MovieBatchUpdate, background_tasks: BackgroundTasks, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Apply many movie updates in one transaction; returns one result per item.
+
+    Items for the same movie are applied in order and produce a single outbound sync.
+    """
+    ids = {item.id for item in data.items}
+    movies = {m.id: m for m in (await db.execute(select(Movie).where(Movie.id.in_(ids)))).scalars().all()}
+    grants = await access.load_grants(db, user.id)
+
+    old_progress: dict[int, dict] = {}
+    changed: dict[int, set[str]] = {}
+    results = []
+    for item in data.items:
+        movie = movies.get(item.id)
+        if not movie:
+            results.append(MovieBatchResult(id=item.id, ok=False, error="Not found"))
+            continue
+        if movie.group_id is not None and movie.watchlist_id is None:
+            allowed = grants.can_view(group_id=movie.group_id)
+        else:
+            allowed = grants.can_edit(watchlist_id=movie.watchlist_id)
+        if not allowed:
+            results.append(MovieBatchResult(id=item.id, ok=False, error="No edit permission"))
+            continue
+
+        old_progress.setdefault(movie.id, dict(movie.watch_progress or {}))
+        update_data = item.model_dump(exclude_unset=True, exclude={"id"}, mode="json")
+        for key, value in update_data.items():
+            setattr(movie, key, value)
+        changed.setdefault(movie.id, set()).update(update_data)
+        results.append(MovieBatchResult(id=item.id, ok=True))
+
+    if changed:
+        await db.flush()
+        for result in results:
+            if result.ok:
+                result.movie = MovieOut.model_validate(movies[result.id], from_attributes=True)
+
+    events = [e for movie_id, keys in changed.items() for e in _manual_watch_events(movies[movie_id], keys, old_progress[movie_id])]
+    await watch_history.record(db, user.id, "app", events)
+    jobs = [job for movie_id, keys in changed.items() if (job := _outbound_sync_job(movies[movie_id], keys, old_progress[movie_id]))]
+    if jobs:
+        background_tasks.add_task(_sync_movie_changes, user.id, *jobs)
+    return results
+
+
 @router.post("/movies/{movie_id}/enrich", response_model=MovieOut)
 async def enrich_movie(movie_id: int, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     """Fetch missing metadata from TMDB for a movie."""
@@ -599,34 +849,16 @@ async def enrich_movie(movie_id: int, user: User = Depends(get_current_user), db
     if not movie:
         raise HTTPException(status_code=404)
 
-    await get_accessible_watchlist(movie.watchlist_id, user.id, db)
+    await access.ensure_movie_access(db, user.id, movie)
 
     if not movie.tmdb_id or not movie.media_type:
         raise HTTPException(status_code=400, detail="No TMDB ID")
 
-    tmdb = TMDBService()
-    try:
-        data = await tmdb.details(movie.media_type, movie.tmdb_id)
-    except Exception:
-        raise HTTPException(status_code=502, detail="TMDB fetch failed")
-
-    if not movie.poster_url and data.get("poster_path"):
-        movie.poster_url = data["poster_path"]
-    if not movie.backdrop_path and data.get("backdrop_path"):
-        movie.backdrop_path = data["backdrop_path"]
-    if not movie.overview and data.get("overview"):
-        movie.overview = data["overview"]
-    if not movie.vote_average and data.get("vote_average"):
-        movie.vote_average = data["vote_average"]
-    if not movie.genres and data.get("genres"):
-        movie.genres = [g["id"] for g in data["genres"]]
-    if not movie.year:
-        date = data.get("release_date") or data.get("first_air_date") or ""
-        if date:
-            movie.year = date[:4]
-
-    await db.flush()
-    await db.refresh(movie)
+    if titles.needs_enrich(movie):
+        try:
+            await titles.enrich(db, [movie], raise_errors=True)
+        except Exception:
+            raise HTTPException(status_code=502, detail="TMDB fetch failed")
     return movie
 
 
@@ -637,156 +869,134 @@ async def delete_movie(movie_id: int, user: User = Depends(get_current_user), db
     if not movie:
         raise HTTPException(status_code=404)
 
-    await get_accessible_watchlist(movie.watchlist_id, user.id, db, need_edit=True)
+    await access.ensure_movie_access(db, user.id, movie, need_edit=True)
     await db.delete(movie)
 
 
 # --- Friend Watchlist View ---
-@router.get("/user/{username}/lists")
-async def get_user_watchlists(username: str, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    """Get visible watchlists of another user (with movie counts)."""
+
+
+async def _get_friend_target(username: str, user: User, db: AsyncSession) -> User:
+    """Resolve a user whose watchlists `user` may view (self or accepted friend)."""
     target = await db.execute(select(User).where(User.username == username))
     target_user = target.scalar_one_or_none()
     if not target_user:
         raise HTTPException(status_code=404, detail="User not found")
+    grants = await access.load_grants(db, user.id)
+    if not grants.can_view(user_id=target_user.id):
+        raise HTTPException(status_code=403, detail="Not friends")
+    return target_user
 
-    # Check friendship
-    friendship = await db.execute(
-        select(Friend).where(
-            Friend.status == "accepted",
-            or_(
-                (Friend.sender_id == user.id) & (Friend.receiver_id == target_user.id),
-                (Friend.sender_id == target_user.id) & (Friend.receiver_id == user.id),
-            ),
-        )
-    )
-    is_friend = friendship.scalar_one_or_none() is not None
 
-    if not is_friend and target_user.id != user.id:
-        raise HTTPException(status_code=403, detail="Not friends")
+def _friend_movie_columns(fields: list[str] | None, is_self: bool) -> list:
+    columns = []
+    for f in fields or MOVIE_FIELDS:
+        if f == "tags" and not is_self:
+            columns.append(_public_tags().label("tags"))
+        else:
+            columns.append(getattr(Movie, f))
+    return columns
 
-    result = await db.execute(select(Watchlist).where(Watchlist.owner_id == target_user.id))
-    watchlists = result.scalars().all()
 
-    out = []
-    for wl in watchlists:
-        if wl.visibility == "private" and target_user.id != user.id:
-            continue
-        count = (await db.execute(select(func.count()).select_from(Movie).where(Movie.watchlist_id == wl.id))).scalar()
-        out.append({
+async def _enrich_in_background(movie_ids: list[int]):
+    try:
+        async with async_session() as db:
+            movies = (await db.execute(select(Movie).where(Movie.id.in_(movie_ids)))).scalars().all()
+            await _auto_enrich(movies, db)
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Background enrich failed: {e}")
+
+
+async def _friend_movies(
+    username: str, user: User, db: AsyncSession, response: Response, background_tasks: BackgroundTasks,
+    watchlist_id: int | None = None, status: str | None = None, media_type: str | None = None, tag: str | None = None,
+    genre: int | None = None, limit: int | None = None, cursor: str | None = None, fields: str | None = None,
+):
+    target_user = await _get_friend_target(username, user, db)
+    is_self = target_user.id == user.id
+
+    visible_lists = select(Watchlist.id).where(Watchlist.owner_id == target_user.id)
+    if not is_self:
+        visible_lists = visible_lists.where(Watchlist.visibility != "private")
+    if watchlist_id:
+        visible_lists = visible_lists.where(Watchlist.id == watchlist_id)
+    filters = [Movie.watchlist_id.in_(visible_lists), *_movie_filters(status, media_type, tag, genre, public_tags_only=not is_self)]
+    if not is_self:
+        filters.append(Movie.is_private.is_(False))
+
+    projection = _parse_fields(fields)
+    rows = await _paginated_movies(db, response, filters, limit, cursor, _friend_movie_columns(projection, is_self))
+    if projection:
+        return _projected_response(rows, response)
+
+    to_enrich = [r.id for r in rows if _needs_enrich(r)]
+    if to_enrich:
+        background_tasks.add_task(_enrich_in_background, to_enrich)
+    return [dict(r._mapping) for r in rows]
+
+
+@router.get("/user/{username}/lists")
+async def get_user_watchlists(username: str, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Get visible watchlists of another user (with movie counts)."""
+    target_user = await _get_friend_target(username, user, db)
+
+    is_self = target_user.id == user.id
+    count = func.count(Movie.id) if is_self else func.count(Movie.id).filter(Movie.is_private.is_(False))
+    query = (
+        select(Watchlist, count)
+        .outerjoin(Movie, Movie.watchlist_id == Watchlist.id)
+        .where(Watchlist.owner_id == target_user.id)
+        .group_by(Watchlist.id)
+        .order_by(Watchlist.is_default.desc(), Watchlist.created_at)
+    )
+    if not is_self:
+        query = query.where(Watchlist.visibility != "private")
+
+    return [
+        {
             "id": wl.id,
             "name": wl.name,
             "icon": wl.icon,
             "visibility": wl.visibility,
             "is_default": wl.is_default,
             "movie_count": count,
-        })
-    return out
+        }
+        for wl, count in (await db.execute(query)).all()
+    ]
 
 
 @router.get("/user/{username}/movies", response_model=list[MovieOut])
 async def get_user_watchlist_movies(
     username: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
     watchlist_id: int | None = Query(None),
+    status: str | None = Query(None),
+    media_type: str | None = Query(None),
+    tag: str | None = Query(None, description="Tag label"),
+    genre: int | None = Query(None, description="TMDB genre id"),
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = Query(None),
+    fields: str | None = Query(None, description="Comma-separated MovieOut fields"),
     user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """Get movies from a specific or all visible watchlists of another user."""
-    target = await db.execute(select(User).where(User.username == username))
-    target_user = target.scalar_one_or_none()
-    if not target_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    friendship = await db.execute(
-        select(Friend).where(
-            Friend.status == "accepted",
-            or_(
-                (Friend.sender_id == user.id) & (Friend.receiver_id == target_user.id),
-                (Friend.sender_id == target_user.id) & (Friend.receiver_id == user.id),
-            ),
-        )
-    )
-    is_friend = friendship.scalar_one_or_none() is not None
-
-    if not is_friend and target_user.id != user.id:
-        raise HTTPException(status_code=403, detail="Not friends")
-
-    result = await db.execute(select(Watchlist).where(Watchlist.owner_id == target_user.id))
-    watchlists = result.scalars().all()
-
-    all_movies = []
-    for wl in watchlists:
-        if wl.visibility == "private" and target_user.id != user.id:
-            continue
-        if watchlist_id and wl.id != watchlist_id:
-            continue
-
-        movies_result = await db.execute(
-            select(Movie).where(Movie.watchlist_id == wl.id).order_by(Movie.created_at.desc())
-        )
-        movies = movies_result.scalars().all()
-
-        if target_user.id != user.id:
-            movies = [m for m in movies if not m.is_private]
-            for movie in movies:
-                if movie.tags:
-                    movie.tags = [t for t in movie.tags if not t.get("is_private", False)]
-
-        all_movies.extend(movies)
-
-    to_enrich = [m for m in all_movies if _needs_enrich(m)]
-    if to_enrich:
-        await _auto_enrich(to_enrich, db)
-    return all_movies
+    return await _friend_movies(username, user, db, response, background_tasks, watchlist_id, status, media_type, tag, genre, limit, cursor, fields)
 
 
 @router.get("/user/{username}", response_model=list[MovieOut])
-async def get_user_watchlist(username: str, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    target = await db.execute(select(User).where(User.username == username))
-    target_user = target.scalar_one_or_none()
-    if not target_user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Check friendship
-    friendship = await db.execute(
-        select(Friend).where(
-            Friend.status == "accepted",
-            or_(
-                (Friend.sender_id == user.id) & (Friend.receiver_id == target_user.id),
-                (Friend.sender_id == target_user.id) & (Friend.receiver_id == user.id),
-            ),
-        )
-    )
-    is_friend = friendship.scalar_one_or_none() is not None
-
-    if not is_friend and target_user.id != user.id:
-        raise HTTPException(status_code=403, detail="Not friends")
-
-    result = await db.execute(select(Watchlist).where(Watchlist.owner_id == target_user.id))
-    watchlists = result.scalars().all()
-
-    all_movies = []
-    for wl in watchlists:
-        if wl.visibility == "private" and target_user.id != user.id:
-            continue
-
-        movies_result = await db.execute(
-            select(Movie).where(Movie.watchlist_id == wl.id).order_by(Movie.created_at.desc())
-        )
-        movies = movies_result.scalars().all()
-
-        if target_user.id != user.id:
-            movies = [m for m in movies if not m.is_private]
-            for movie in movies:
-                if movie.tags:
-                    movie.tags = [t for t in movie.tags if not t.get("is_private", False)]
-
-        all_movies.extend(movies)
-
-    to_enrich = [m for m in all_movies if _needs_enrich(m)]
-    if to_enrich:
-        await _auto_enrich(to_enrich, db)
-    return all_movies
+async def get_user_watchlist(
+    username: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    limit: int | None = Query(None, ge=1, le=500),
+    cursor: str | None = Query(None),
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return await _friend_movies(username, user, db, response, background_tasks, limit=limit, cursor=cursor)
 
 
 # --- Legacy settings endpoint ---
@@ -806,99 +1016,32 @@ async def get_settings(user: User = Depends(get_current_user), db: AsyncSession
 
 # --- Export / Import ---
 
-from datetime import datetime as dt_export
-
 
 @router.get("/export")
-async def export_data(user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    """Export all user data as JSON."""
-    wl_result = await db.execute(select(Watchlist).where(Watchlist.owner_id == user.id))
-    watchlists = wl_result.scalars().all()
-
-    export = {
-        "version": 1,
-        "exported_at": str(dt_export.utcnow()),
-        "user": {"username": user.username, "plex_username": user.plex_username},
-        "watchlists": [],
-    }
-
-    for wl in watchlists:
-        movies_result = await db.execute(select(Movie).where(Movie.watchlist_id == wl.id))
-        movies = movies_result.scalars().all()
-        export["watchlists"].append({
-            "name": wl.name, "icon": wl.icon, "visibility": wl.visibility, "is_default": wl.is_default,
-            "movies": [
-                {
-                    "title": m.title, "year": m.year, "poster_url": m.poster_url, "backdrop_path": m.backdrop_path,
-                    "overview": m.overview, "tmdb_id": m.tmdb_id, "media_type": m.media_type,
-                    "vote_average": m.vote_average, "genres": m.genres, "status": m.status,
-                    "rating": m.rating, "notes": m.notes, "tags": m.tags,
-                    "watch_progress": m.watch_progress, "is_private": m.is_private, "created_at": str(m.created_at),
-                }
-                for m in movies
-            ],
-        })
-
-    # Friends
-    friend_result = await db.execute(
-        select(Friend).where(or_(Friend.sender_id == user.id, Friend.receiver_id == user.id), Friend.status == "accepted")
-    )
-    friends = friend_result.scalars().all()
-    friend_ids = {f.sender_id if f.receiver_id == user.id else f.receiver_id for f in friends}
-    if friend_ids:
-        users_result = await db.execute(select(User).where(User.id.in_(friend_ids)))
-        export["friends"] = [u.username for u in users_result.scalars().all()]
+async def export_data(
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    gzip: bool = Query(False),
+    user: User = Depends(get_current_user),
+):
+    """Export all user data — legacy JSON document or NDJSON, optionally gzip-compressed. Streamed."""
+    if format == "ndjson":
+        body, media_type, ext = data_export.export_ndjson(user.id), "application/x-ndjson", "ndjson"
     else:
-        export["friends"] = []
-
-    return export
+        body, media_type, ext = data_export.export_json_v1(user.id), "application/json", "json"
+    filename = f"watchlist-export-{user.username}.{ext}"
+    if gzip:
+        body, media_type, filename = data_export.gzip_stream(body), "application/gzip", filename + ".gz"
+    return StreamingResponse(body, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 
 @router.post("/import")
-async def import_data(data: dict, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
-    """Import user data from JSON export."""
-    if data.get("version") != 1:
-        raise HTTPException(status_code=400, detail="Unbekanntes Export-Format")
-
-    imported_movies = 0
-    imported_watchlists = 0
-    skipped = 0
-
-    for wl_data in data.get("watchlists", []):
-        if wl_data.get("is_default"):
-            result = await db.execute(select(Watchlist).where(Watchlist.owner_id == user.id, Watchlist.is_default == True))
-            wl = result.scalar_one_or_none()
-            if not wl:
-                wl = Watchlist(owner_id=user.id, name=wl_data.get("name", "Import"), icon=wl_data.get("icon", "🎬"), is_default=True)
-                db.add(wl)
-                await db.flush()
-                imported_watchlists += 1
-        else:
-            result = await db.execute(select(Watchlist).where(Watchlist.owner_id == user.id, Watchlist.name == wl_data.get("name")))
-            wl = result.scalar_one_or_none()
-            if not wl:
-                wl = Watchlist(owner_id=user.id, name=wl_data.get("name", "Import"), icon=wl_data.get("icon", "🎬"), visibility=wl_data.get("visibility", "friends"))
-                db.add(wl)
-                await db.flush()
-                imported_watchlists += 1
-
-        for m_data in wl_data.get("movies", []):
-            if m_data.get("tmdb_id"):
-                existing = await db.execute(select(Movie).where(Movie.watchlist_id == wl.id, Movie.tmdb_id == m_data["tmdb_id"], Movie.media_type == m_data.get("media_type")))
-                if existing.scalar_one_or_none():
-                    skipped += 1
-                    continue
-
-            db.add(Movie(
-                watchlist_id=wl.id, title=m_data.get("title", "Unknown"), year=m_data.get("year"),
-                poster_url=m_data.get("poster_url"), backdrop_path=m_data.get("backdrop_path"),
-                overview=m_data.get("overview"), tmdb_id=m_data.get("tmdb_id"), media_type=m_data.get("media_type"),
-                vote_average=m_data.get("vote_average"), genres=m_data.get("genres"),
-                status=m_data.get("status", "watchlist"), rating=m_data.get("rating"), notes=m_data.get("notes"),
-                tags=m_data.get("tags", []), watch_progress=m_data.get("watch_progress", {}),
-                is_private=m_data.get("is_private", False),
-            ))
-            imported_movies += 1
-
-    await db.flush()
-    return {"imported_watchlists": imported_watchlists, "imported_movies": imported_movies, "skipped_duplicates": skipped}
+async def import_data(request: Request, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    """Import a JSON (v1) or NDJSON (v2) export, optionally gzip-compressed. The body is parsed as it streams in."""
+    try:
+        result = await data_export.import_stream(db, user.id, request.stream())
+    except data_export.ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Ungültige Import-Datei")
+    access.invalidate(db, user.id)
+    return result
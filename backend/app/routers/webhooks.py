@@ -0,0 +1,231 @@
+"""Webhook receivers — Plex (media.scrobble) and Jellyfin webhook plugin (PlaybackStop / UserDataSaved).
+
+Both are authenticated with the shared webhook token (?token=...), which admins can
+view/regenerate under /api/admin/settings/webhook-token. Events are imported through
+the same path as the polling loops, which now only run as a reconciliation fallback.
+"""
+import json
+import logging
+import secrets
+from datetime import datetime
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session, get_db
+from ..models import JellyfinServer, PlexServer, SystemSetting, User
+from ..services import jellyfin as jf_service, plex as plex_service
+from ..services.sync_log import log_sync
+from ..services.watch_sync import (
+    forward_to_jellyfin,
+    forward_to_plex,
+    import_watched_episodes,
+    import_watched_movie,
+    load_import_target,
+)
+
+logger = logging.getLogger(__name__)
+router = APIRouter(prefix="/api/webhooks", tags=["webhooks"])
+
+WEBHOOK_TOKEN_KEY = "webhook_token"
+
+
+async def get_webhook_token(db: AsyncSession, create: bool = False, regenerate: bool = False) -> str | None:
+    """The webhook token; create=True makes one if none exists, regenerate=True replaces it."""
+    s = (await db.execute(select(SystemSetting).where(SystemSetting.key == WEBHOOK_TOKEN_KEY))).scalar_one_or_none()
+    if s and not regenerate:
+        return s.value
+    if not s and not (create or regenerate):
+        return None
+    token = secrets.token_urlsafe(32)
+    if s:
+        s.value = token
+    else:
+        db.add(SystemSetting(key=WEBHOOK_TOKEN_KEY, value=token))
+    await db.flush()
+    return token
+
+
+async def _verify_token(token: str, db: AsyncSession) -> None:
+    expected = await get_webhook_token(db)
+    if not expected or not secrets.compare_digest(token, expected):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+
+
+# --- Plex ---
+
+
+@router.post("/plex")
+async def plex_webhook(request: Request, background_tasks: BackgroundTasks, token: str = Query(...), db: AsyncSession = Depends(get_db)):
+    """Plex sends multipart/form-data with a JSON `payload` field."""
+    await _verify_token(token, db)
+    form = await request.form()
+    try:
+        payload = json.loads(form.get("payload") or "{}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid payload")
+
+    if payload.get("event") != "media.scrobble":
+        return {"status": "ignored"}
+    background_tasks.add_task(_handle_plex_scrobble, payload, datetime.utcnow())
+    return {"status": "accepted"}
+
+
+def _plex_watched_at(meta: dict, received_at: datetime) -> datetime:
+    """When the item was watched: Plex's lastViewedAt, else when the webhook arrived."""
+    try:
+        return datetime.utcfromtimestamp(int(meta["lastViewedAt"]))
+    except (KeyError, TypeError, ValueError):
+        return received_at
+
+
+async def _handle_plex_scrobble(payload: dict, received_at: datetime):
+    account = payload.get("Account") or {}
+    meta = payload.get("Metadata") or {}
+    server_uuid = (payload.get("Server") or {}).get("uuid")
+    # Only match on what the payload carries: a missing id or title must not match users without one
+    matches = []
+    if account.get("id") not in (None, ""):
+        matches.append(User.plex_id == str(account["id"]))
+    if account.get("title"):
+        matches.append(User.plex_username == account["title"])
+    if not matches:
+        return
+    try:
+        async with async_session() as db:
+            user = (await db.execute(select(User).where(or_(*matches)))).scalars().first()
+            if not user:
+                return
+            srv = None
+            if server_uuid:
+                srv = (await db.execute(select(PlexServer).where(PlexServer.machine_id == server_uuid))).scalar_one_or_none()
+
+            wl_ids, default_wl = await load_import_target(db, user.id)
+            if not default_wl:
+                return
+
+            item_type = meta.get("type")
+            action = None
+            forward = []
+            if item_type == "movie":
+                tmdb_id = plex_service.extract_tmdb_id(meta.get("Guid"))
+                if not tmdb_id and srv and meta.get("ratingKey"):
+                    detail = await plex_service.get_metadata(srv.url, srv.token, meta["ratingKey"])
+                    tmdb_id = plex_service.extract_tmdb_id(detail.get("guids"))
+                if not tmdb_id:
+                    return
+                action = await import_watched_movie(
+                    db, wl_ids, default_wl.id, tmdb_id, meta.get("title"), meta.get("year"),
+                    user_id=user.id, source="plex", watched_at=_plex_watched_at(meta, received_at),
+                )
+                if action:
+                    forward.append((tmdb_id, "movie"))
+            elif item_type == "episode":
+                season, episode = meta.get("parentIndex"), meta.get("index")
+                if not srv or not meta.get("grandparentRatingKey") or season is None or episode is None:
+                    return
+                show = await plex_service.get_metadata(srv.url, srv.token, meta["grandparentRatingKey"])
+                tmdb_id = plex_service.extract_tmdb_id(show.get("guids"))
+                if not tmdb_id:
+                    return
+                action = await import_watched_episodes(
+                    db, wl_ids, default_wl.id, tmdb_id, meta.get("grandparentTitle"), {str(int(season)): [int(episode)]}, show.get("year"),
+                    user_id=user.id, source="plex", watched_at=_plex_watched_at(meta, received_at),
+                )
+            else:
+                return
+
+            if not action:
+                return
+            await db.commit()
+            title = meta.get("grandparentTitle") or meta.get("title")
+            await log_sync(user.id, "plex", "import", added=int(action == "added"), updated=int(action == "updated"), details=f"Webhook: '{title}'")
+            if forward:
+                await forward_to_jellyfin(db, user.id, forward)
+    except Exception as e:
+        logger.error(f"Plex webhook handling failed: {e}")
+
+
+# --- Jellyfin ---
+
+
+def _normalize_jf_id(value: str | None) -> str:
+    return (value or "").replace("-", "").lower()
+
+
+def _jf_event_played(payload: dict) -> bool:
+    event = payload.get("NotificationType")
+    if event == "PlaybackStop":
+        return bool(payload.get("PlayedToCompletion"))
+    if event == "UserDataSaved":
+        return bool(payload.get("Played"))
+    return False
+
+
+def _jf_watched_at(payload: dict, received_at: datetime) -> datetime:
+    """When the item was watched: Jellyfin's LastPlayedDate, else when the webhook arrived."""
+    return jf_service.parse_date(payload.get("LastPlayedDate")) or received_at
+
+
+@router.post("/jellyfin")
+async def jellyfin_webhook(payload: dict, background_tasks: BackgroundTasks, token: str = Query(...), db: AsyncSession = Depends(get_db)):
+    """Jellyfin webhook plugin (Generic destination, JSON body)."""
+    await _verify_token(token, db)
+    if not _jf_event_played(payload) or payload.get("ItemType") not in ("Movie", "Episode"):
+        return {"status": "ignored"}
+    background_tasks.add_task(_handle_jellyfin_played, payload, datetime.utcnow())
+    return {"status": "accepted"}
+
+
+async def _handle_jellyfin_played(payload: dict, received_at: datetime):
+    jf_user_id = _normalize_jf_id(payload.get("UserId"))
+    if not jf_user_id:
+        return
+    watched_at = _jf_watched_at(payload, received_at)
+    try:
+        async with async_session() as db:
+            servers = (await db.execute(select(JellyfinServer).where(
+                func.replace(func.lower(JellyfinServer.jellyfin_user_id), "-", "") == jf_user_id,
+                JellyfinServer.enabled == True,
+            ))).scalars().all()
+            for srv in servers:
+                wl_ids, default_wl = await load_import_target(db, srv.user_id)
+                if not default_wl:
+                    continue
+
+                forward = []
+                if payload.get("ItemType") == "Movie":
+                    tmdb_id = payload.get("Provider_tmdb")
+                    if not tmdb_id:
+                        continue
+                    action = await import_watched_movie(
+                        db, wl_ids, default_wl.id, int(tmdb_id), payload.get("Name"), payload.get("Year"),
+                        user_id=srv.user_id, source="jellyfin", watched_at=watched_at,
+                    )
+                    if action:
+                        forward.append((int(tmdb_id), "movie"))
+                    title = payload.get("Name")
+                else:
+                    season, episode = payload.get("SeasonNumber"), payload.get("EpisodeNumber")
+                    if not payload.get("SeriesId") or season is None or episode is None:  # season 0 = specials
+                        continue
+                    tmdb_id = await jf_service.get_item_tmdb_id(srv.url, srv.token, srv.jellyfin_user_id, payload["SeriesId"], server_id=srv.id)
+                    if not tmdb_id:
+                        continue
+                    title = payload.get("SeriesName")
+                    action = await import_watched_episodes(
+                        db, wl_ids, default_wl.id, tmdb_id, title, {str(int(season)): [int(episode)]},
+                        user_id=srv.user_id, source="jellyfin", watched_at=watched_at,
+                    )
+
+                if not action:
+                    continue
+                await db.commit()
+                await log_sync(srv.user_id, "jellyfin", "import", added=int(action == "added"), updated=int(action == "updated"), details=f"Webhook: '{title}'")
+                if forward:
+                    user = (await db.execute(select(User).where(User.id == srv.user_id))).scalar_one_or_none()
+                    if user:
+                        await forward_to_plex(user, forward)
+    except Exception as e:
+        logger.error(f"Jellyfin webhook handling failed: {e}")
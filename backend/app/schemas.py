@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 
 
 # --- Auth ---
@@ -85,6 +85,33 @@ class MovieOut(BaseModel):
     created_at: datetime
 
 
+class MovieBatchItem(MovieUpdate):
+    id: int
+
+
+class MovieBatchUpdate(BaseModel):
+    items: list[MovieBatchItem] = Field(..., min_length=1, max_length=500)
+
+
+class MovieBatchResult(BaseModel):
+    id: int
+    ok: bool
+    error: str | None = None
+    movie: MovieOut | None = None
+
+
+class WatchEventOut(BaseModel):
+    id: int
+    tmdb_id: int
+    media_type: str
+    season: int | None
+    episode: int | None
+    source: str
+    watched_at: datetime
+    title: str | None = None
+    poster_url: str | None = None
+
+
 class WatchlistCreate(BaseModel):
     name: str
     icon: str = "🎬"
@@ -0,0 +1,101 @@
+"""API keys — cached resolution and batched last_used writes for MCP auth.
+
+Keys are looked up by their SHA-256 digest in an in-process cache, so a chatty
+MCP session costs no queries per message. Deleting an ApiKey drops its entry
+on flush and again after the commit; a short TTL bounds staleness across
+worker processes. last_used is only kept in memory per request and written
+for all used keys in one bulk UPDATE by main._api_key_flush_loop.
+"""
+import hashlib
+import time
+from datetime import datetime
+
+from sqlalchemy import bindparam, event, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from ..database import async_session
+from ..models import ApiKey
+
+KEY_CACHE_TTL = 60  # seconds
+KEY_CACHE_SIZE = 1024
+FLUSH_INTERVAL = 60  # seconds
+
+_cache: dict[str, tuple[float, int, int]] = {}  # sha256(key) -> (expires, key_id, user_id)
+_last_used: dict[int, datetime] = {}  # key_id -> newest use not yet written
+
+
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def resolve(db: AsyncSession, token: str) -> tuple[int, int] | None:
+    """(key_id, user_id) of a valid key, or None. Records the use for the next flush."""
+    digest = _digest(token)
+    cached = _cache.get(digest)
+    if cached and cached[0] > time.monotonic():
+        key_id, user_id = cached[1], cached[2]
+    else:
+        row = (await db.execute(select(ApiKey.id, ApiKey.user_id).where(ApiKey.key == token))).first()
+        if not row:
+            _cache.pop(digest, None)
+            return None
+        key_id, user_id = row
+        if len(_cache) >= KEY_CACHE_SIZE:
+            _cache.pop(next(iter(_cache)))
+        _cache[digest] = (time.monotonic() + KEY_CACHE_TTL, key_id, user_id)
+    _last_used[key_id] = datetime.utcnow()
+    return key_id, user_id
+
+
+def pending_last_used(key_id: int) -> datetime | None:
+    """A use not yet written to the database (for listings)."""
+    return _last_used.get(key_id)
+
+
+def invalidate(*keys: str) -> None:
+    for key in keys:
+        _cache.pop(_digest(key), None)
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_deleted_keys(session: Session, flush_context) -> None:
+    keys = {obj.key for obj in session.deleted if isinstance(obj, ApiKey)}
+    if keys:
+        invalidate(*keys)
+        session.info.setdefault("api_key_invalidate", set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_keys_after_commit(session: Session) -> None:
+    keys = session.info.pop("api_key_invalidate", None)
+    if keys:
+        invalidate(*keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_key_invalidations(session: Session) -> None:
+    session.info.pop("api_key_invalidate", None)
+
+
+async def flush_last_used() -> int:
+    """Write pending last_used values in one bulk UPDATE; returns the number of keys."""
+    if not _last_used:
+        return 0
+    pending = dict(_last_used)
+    _last_used.clear()
+    try:
+        async with async_session() as db:
+            # Core executemany: keys deleted in the meantime simply match no row
+            table = ApiKey.__table__
+            await db.execute(
+                update(table).where(table.c.id == bindparam("b_id")).values(last_used=bindparam("b_last_used")),
+                [{"b_id": key_id, "b_last_used": used} for key_id, used in pending.items()],
+            )
+            await db.commit()
+    except Exception:
+        # Keep the values for the next attempt unless newer ones arrived
+        for key_id, used in pending.items():
+            _last_used.setdefault(key_id, used)
+        raise
+    return len(pending)
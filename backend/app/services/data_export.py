@@ -0,0 +1,288 @@
+"""Watchlist export/import — streamed in both directions.
+
+Export formats:
+  json    legacy v1 document ({"version": 1, "watchlists": [{..., "movies": [...]}], "friends": [...]})
+  ndjson  v2, one object per line: header, watchlist*, movie*, friends
+
+Both are produced from a server-side cursor, so memory stays flat regardless of
+library size. Import accepts either format (optionally gzip-compressed), parses
+NDJSON incrementally and inserts in batched executemany statements.
+"""
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session
+from ..models import Friend, Movie, User, Watchlist
+from . import titles
+
+EXPORT_VERSION_NDJSON = 2
+STREAM_BATCH = 500
+INSERT_BATCH = 1000
+
+class ImportFormatError(ValueError):
+    pass
+
+
+MOVIE_FIELDS = (
+    "title", "year", "poster_url", "backdrop_path", "overview", "tmdb_id", "media_type", "vote_average",
+    "genres", "status", "rating", "notes", "tags", "watch_progress", "is_private", "created_at",
+)
+
+
+# --- Export ---
+
+
+def _dumps(obj) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
+
+async def _friend_usernames(db: AsyncSession, user_id: int) -> list[str]:
+    friend_ids = select(Friend.receiver_id).where(Friend.sender_id == user_id, Friend.status == "accepted").union(
+        select(Friend.sender_id).where(Friend.receiver_id == user_id, Friend.status == "accepted")
+    )
+    return list((await db.execute(select(User.username).where(User.id.in_(friend_ids)))).scalars().all())
+
+
+async def _export_parts(user_id: int) -> AsyncIterator[tuple[str, object]]:
+    """Yield ("header"|"watchlist"|"movie"|"friends", payload) in watchlist order."""
+    async with async_session() as db:
+        user = (await db.execute(select(User.username, User.plex_username).where(User.id == user_id))).one()
+        yield "header", {
+            "exported_at": str(datetime.utcnow()),
+            "user": {"username": user.username, "plex_username": user.plex_username},
+        }
+
+        watchlists = (await db.execute(
+            select(Watchlist.id, Watchlist.name, Watchlist.icon, Watchlist.visibility, Watchlist.is_default)
+            .where(Watchlist.owner_id == user_id).order_by(Watchlist.id)
+        )).all()
+        for wl in watchlists:
+            yield "watchlist", {"key": wl.id, "name": wl.name, "icon": wl.icon, "visibility": wl.visibility, "is_default": wl.is_default}
+
+        rows = await db.stream(
+            titles.join_shared(select(Movie.watchlist_id, *(getattr(Movie, f) for f in MOVIE_FIELDS)))
+            .where(Movie.watchlist_id.in_([wl.id for wl in watchlists]))
+            .order_by(Movie.watchlist_id, Movie.id)
+            .execution_options(yield_per=STREAM_BATCH)
+        )
+        async for row in rows:
+            movie = dict(row._mapping)
+            movie["watchlist"] = movie.pop("watchlist_id")
+            yield "movie", movie
+
+        yield "friends", await _friend_usernames(db, user_id)
+
+
+async def export_ndjson(user_id: int) -> AsyncIterator[str]:
+    async for kind, payload in _export_parts(user_id):
+        if kind == "header":
+            line = {"type": "header", "version": EXPORT_VERSION_NDJSON, **payload}
+        elif kind == "friends":
+            line = {"type": "friends", "friends": payload}
+        else:
+            line = {"type": kind, **payload}
+        yield _dumps(line) + "\n"
+
+
+async def export_json_v1(user_id: int) -> AsyncIterator[str]:
+    """The legacy v1 document, written incrementally."""
+    watchlists: list[dict] = []
+    opened = 0  # watchlists whose "movies" array has been started
+    first_movie = True
+
+    def open_watchlist(index: int) -> str:
+        meta = {k: watchlists[index][k] for k in ("name", "icon", "visibility", "is_default")}
+        return ("," if index else "") + _dumps(meta)[:-1] + ', "movies": ['
+
+    async for kind, payload in _export_parts(user_id):
+        if kind == "header":
+            yield _dumps({"version": 1, **payload})[:-1] + ', "watchlists": ['
+        elif kind == "watchlist":
+            watchlists.append(payload)
+        elif kind == "movie":
+            # Watchlists and movies are both ordered by watchlist id
+            key = payload.pop("watchlist")
+            while not opened or watchlists[opened - 1]["key"] != key:
+                if opened:
+                    yield "]}"
+                yield open_watchlist(opened)
+                opened += 1
+                first_movie = True
+            yield ("" if first_movie else ",") + _dumps(payload)
+            first_movie = False
+        else:
+            if opened:
+                yield "]}"
+            for index in range(opened, len(watchlists)):
+                yield open_watchlist(index) + "]}"
+            yield '], "friends": ' + _dumps(payload) + "}"
+
+
+async def gzip_stream(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# --- Import ---
+
+
+async def _decoded(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Pass through, or transparently gunzip if the upload starts with the gzip magic."""
+    decompressor = None
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if decompressor is None:
+            decompressor = zlib.decompressobj(wbits=31) if chunk[:2] == b"\x1f\x8b" else False
+        if not decompressor:
+            yield chunk
+            continue
+        try:
+            yield decompressor.decompress(chunk)
+        except zlib.error:
+            raise ImportFormatError("Beschädigte gzip-Datei")
+    if decompressor:
+        try:
+            yield decompressor.flush()
+        except zlib.error:
+            raise ImportFormatError("Beschädigte gzip-Datei")
+
+
+def _ndjson_event(line: bytes):
+    obj = json.loads(line)
+    if not isinstance(obj, dict):
+        raise ImportFormatError("Ungültige Zeile im NDJSON-Export")
+    if obj.get("type") in ("watchlist", "movie"):
+        return obj["type"], obj
+    return None
+
+
+async def _import_events(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[str, dict]]:
+    """Yield ("watchlist", data) / ("movie", data) from NDJSON (streamed) or a v1 JSON document."""
+    partial: list[bytes] = []  # chunks of the current unfinished line, joined once its newline arrives
+    legacy_chunks: list[bytes] | None = None  # v1 documents can only be parsed as a whole
+    is_ndjson = False
+    async for chunk in _decoded(chunks):
+        if legacy_chunks is not None:
+            legacy_chunks.append(chunk)
+            continue
+        if b"\n" not in chunk:
+            partial.append(chunk)  # e.g. a compact single-line v1 document: no re-copying per chunk
+            continue
+        *lines, tail = chunk.split(b"\n")
+        lines[0] = b"".join(partial) + lines[0]
+        partial = [tail]
+        for i, line in enumerate(lines):
+            if not line.strip():
+                continue
+            if not is_ndjson:
+                try:
+                    header = json.loads(line)
+                except ValueError:
+                    header = None
+                if not isinstance(header, dict) or header.get("type") != "header":
+                    legacy_chunks = [b"\n".join(lines[i:] + [tail])]
+                    partial = []
+                    break
+                if header.get("version") != EXPORT_VERSION_NDJSON:
+                    raise ImportFormatError("Unbekanntes Export-Format")
+                is_ndjson = True
+                continue
+            event = _ndjson_event(line)
+            if event:
+                yield event
+
+    buffer = b"".join(partial)
+    if is_ndjson:
+        if buffer.strip():
+            event = _ndjson_event(buffer)
+            if event:
+                yield event
+        return
+
+    data = json.loads(b"".join(legacy_chunks or []) + buffer or b"null")
+    if not isinstance(data, dict) or data.get("version") != 1:
+        raise ImportFormatError("Unbekanntes Export-Format")
+    for key, wl_data in enumerate(data.get("watchlists") or []):
+        if not isinstance(wl_data, dict):
+            raise ImportFormatError("Ungültige Watchlist im Export")
+        yield "watchlist", {**wl_data, "key": key}
+        for m_data in wl_data.get("movies") or []:
+            if not isinstance(m_data, dict):
+                raise ImportFormatError("Ungültiger Eintrag im Export")
+            yield "movie", {**m_data, "watchlist": key}
+
+
+async def import_stream(db: AsyncSession, user_id: int, chunks: AsyncIterator[bytes]) -> dict:
+    """Import an export, skipping movies already present (watchlist, tmdb_id, media_type)."""
+    own = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id))).scalars().all()
+    default_wl = next((w for w in own if w.is_default), None)
+    by_name = {w.name: w for w in own}
+    existing = set((await db.execute(
+        select(Movie.watchlist_id, Movie.tmdb_id, Movie.media_type)
+        .where(Movie.watchlist_id.in_([w.id for w in own]), Movie.tmdb_id != None)
+    )).tuples().all())
+
+    key_to_wl: dict = {}
+    pending: list[dict] = []
+    stats = {"imported_watchlists": 0, "imported_movies": 0, "skipped_duplicates": 0}
+
+    async def flush():
+        if pending:
+            await db.execute(insert(Movie), pending)
+            stats["imported_movies"] += len(pending)
+            pending.clear()
+
+    async for kind, data in _import_events(chunks):
+        if kind == "watchlist":
+            wl = default_wl if data.get("is_default") else by_name.get(data.get("name"))
+            if not wl:
+                wl = Watchlist(
+                    owner_id=user_id, name=data.get("name", "Import"), icon=data.get("icon", "🎬"),
+                    visibility=data.get("visibility", "friends"), is_default=bool(data.get("is_default")),
+                )
+                db.add(wl)
+                await db.flush()
+                stats["imported_watchlists"] += 1
+                if wl.is_default:
+                    default_wl = wl
+                else:
+                    by_name[wl.name] = wl
+            key_to_wl[data.get("key")] = wl.id
+            continue
+
+        wl_id = key_to_wl.get(data.get("watchlist"))
+        if wl_id is None:
+            continue
+        if data.get("tmdb_id"):
+            key = (wl_id, data["tmdb_id"], data.get("media_type"))
+            if key in existing:
+                stats["skipped_duplicates"] += 1
+                continue
+            existing.add(key)
+        pending.append({
+            "watchlist_id": wl_id, "title": data.get("title") or "Unknown", "year": data.get("year"),
+            # Copies of the shared row are dropped after the inserts; titles itself is TMDB-only
+            "_poster_url": data.get("poster_url"), "_backdrop_path": data.get("backdrop_path"),
+            "_overview": data.get("overview"), "tmdb_id": data.get("tmdb_id"), "media_type": data.get("media_type"),
+            "_vote_average": data.get("vote_average"), "_genres": data.get("genres"),
+            "status": data.get("status", "watchlist"), "rating": data.get("rating"), "notes": data.get("notes"),
+            "tags": data.get("tags") or [], "watch_progress": data.get("watch_progress") or {},
+            "is_private": data.get("is_private", False),
+        })
+        if len(pending) >= INSERT_BATCH:
+            await flush()
+
+    await flush()
+    if key_to_wl:
+        await titles.drop_copies(db, Movie.watchlist_id.in_(set(key_to_wl.values())))
+    return stats
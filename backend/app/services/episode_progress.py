@@ -0,0 +1,84 @@
+"""Episode progress — set algebra on watched episodes and in-place merges in Postgres.
+
+Movie.watch_progress stays a JSONB {"season": [episode, ...]} document, which is
+what the API, exports and the frontend consume. Sync paths don't read and
+rewrite the blob: merge_into() issues one UPDATE that checks containment (@>)
+and merges with watch_progress_merge() on the server.
+
+The Python helpers work on the JSON directly with sets; every caller does a
+single diff or count per document.
+"""
+from sqlalchemy import and_, case, func, literal, not_, or_, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Movie
+
+# Created by main._run_migrations
+SQL_FUNCTIONS = [
+    """CREATE OR REPLACE FUNCTION watch_progress_merge(old jsonb, new jsonb) RETURNS jsonb
+       LANGUAGE sql IMMUTABLE AS $$
+         SELECT coalesce(jsonb_object_agg(season, episodes), '{}'::jsonb)
+         FROM (
+           SELECT s.key AS season, jsonb_agg(DISTINCT e.ep ORDER BY e.ep) AS episodes
+           FROM (SELECT * FROM jsonb_each(coalesce(old, '{}'::jsonb))
+                 UNION ALL SELECT * FROM jsonb_each(coalesce(new, '{}'::jsonb))) s,
+                LATERAL (SELECT value::int AS ep FROM jsonb_array_elements_text(
+                  CASE WHEN jsonb_typeof(s.value) = 'array' THEN s.value ELSE '[]'::jsonb END)) e
+           GROUP BY s.key
+         ) merged
+       $$""",
+    """CREATE OR REPLACE FUNCTION watch_progress_count(progress jsonb) RETURNS int
+       LANGUAGE sql IMMUTABLE AS $$
+         SELECT coalesce(sum(jsonb_array_length(value)), 0)::int
+         FROM jsonb_each(coalesce(progress, '{}'::jsonb))
+         WHERE jsonb_typeof(value) = 'array'
+       $$""",
+]
+
+
+# --- JSON convenience ---
+
+
+def added_episodes(old: dict | None, new: dict | None) -> dict[str, list[int]]:
+    """Episodes in new that are not in old, JSON in and out."""
+    old = old or {}
+    added = {}
+    for season, eps in (new or {}).items():
+        known = set(old.get(season) or [])
+        missing = sorted({int(ep) for ep in eps} - known)
+        if missing:
+            added[season] = missing
+    return added
+
+
+def episode_count(progress: dict | None) -> int:
+    return sum(len(eps) for eps in (progress or {}).values() if isinstance(eps, list))
+
+
+# --- Postgres ---
+
+
+async def merge_into(
+    db: AsyncSession, filters: list, episodes: dict[str, list[int]], status: str | None = None,
+    keep_statuses: tuple[str, ...] = ("watched", "dropped"), force_status: bool = False,
+) -> list[int]:
+    """Merge episodes into the progress of all movies matching filters, in place.
+
+    Rows already containing every episode are left untouched, unless force_status
+    and their status differs. The status is only set on rows whose status is not
+    in keep_statuses. Returns the ids of changed rows.
+    """
+    new = literal({str(season): sorted({int(ep) for ep in eps}) for season, eps in episodes.items() if eps}, JSONB)
+    where = not_(func.coalesce(Movie.watch_progress, literal({}, JSONB)).contains(new))
+    values = {"watch_progress": func.watch_progress_merge(Movie.watch_progress, new)}
+    if status:
+        keep = Movie.status.in_(keep_statuses)
+        values["status"] = case((keep, Movie.status), else_=status)
+        if force_status:
+            where = or_(where, and_(not_(keep), Movie.status != status))
+    result = await db.execute(
+        update(Movie).where(*filters, where).values(**values)
+        .returning(Movie.id).execution_options(synchronize_session=False)
+    )
+    return list(result.scalars().all())
@@ -1,4 +1,7 @@
+import asyncio
 import logging
+import time
+from datetime import datetime, timezone
 
 import httpx
 
@@ -27,16 +30,26 @@ async def authenticate(url: str, username: str, password: str) -> dict:
         }
 
 
+def parse_date(value: str | None) -> datetime | None:
+    """A Jellyfin ISO date (e.g. UserData.LastPlayedDate) as naive UTC."""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
 def _headers(token: str) -> dict:
     return {"X-Emby-Authorization": AUTH_HEADER, "X-Emby-Token": token}
 
 
-async def _request(url: str, token: str, method: str, path: str, params: dict | None = None, json: dict | None = None) -> dict | list:
+async def _request(url: str, token: str, method: str, path: str, params: dict | None = None, json: dict | None = None, server_id: int | None = None) -> dict | list:
+    token = _current_token(token)
     async with httpx.AsyncClient(verify=False) as client:
         resp = await client.request(method, f"{url}{path}", headers=_headers(token), params=params, json=json, timeout=TIMEOUT)
         if resp.status_code == 401:
-            # Try to refresh token
-            new_token = await _try_refresh_token(url, token)
+            # Single-flight re-auth, shared by all concurrent callers of this server
+            new_token = await _refresh_token(token, server_id)
             if new_token:
                 resp = await client.request(method, f"{url}{path}", headers=_headers(new_token), params=params, json=json, timeout=TIMEOUT)
         resp.raise_for_status()
@@ -48,34 +61,102 @@ async def _request(url: str, token: str, method: str, path: str, params: dict |
             return {}
 
 
-async def _try_refresh_token(url: str, old_token: str) -> str | None:
-    """Try to re-authenticate using stored credentials."""
-    try:
-        from ..database import async_session
-        from ..models import JellyfinServer
-        from sqlalchemy import select
-        async with async_session() as db:
-            # Find by URL first (token might have changed), then by token as fallback
-            srv = (await db.execute(select(JellyfinServer).where(JellyfinServer.url == url, JellyfinServer.jf_username != None))).scalars().first()
-            if not srv or not srv.jf_username or not srv.jf_password:
-                return None
-            auth = await authenticate(srv.url, srv.jf_username, srv.jf_password)
-            srv.token = auth["token"]
-            await db.commit()
-            logger.info(f"Jellyfin token refreshed for {srv.name}")
-            return auth["token"]
-    except Exception as e:
-        logger.error(f"Jellyfin token refresh failed: {e}")
-        return None
+PAGE_SIZE = 2000
 
 
-async def test_connection(url: str, token: str, user_id: str) -> dict:
-    data = await _request(url, token, "GET", "/System/Info/Public")
+async def get_all_items(url: str, token: str, user_id: str, params: dict, server_id: int | None = None) -> list[dict]:
+    """All /Users/{id}/Items results, paged with StartIndex until TotalRecordCount is reached.
+
+    Raises if the server stops returning items before that, so callers never see a partial listing.
+    """
+    items: list[dict] = []
+    while True:
+        data = await _request(url, token, "GET", f"/Users/{user_id}/Items", params={
+            **params, "StartIndex": len(items), "Limit": PAGE_SIZE,
+        }, server_id=server_id)
+        page = data.get("Items", [])
+        items.extend(page)
+        if len(items) >= data.get("TotalRecordCount", 0):
+            return items
+        if not page:
+            raise RuntimeError(f"Jellyfin listing ended after {len(items)} of {data.get('TotalRecordCount')} items")
+
+
+# --- Token refresh ---
+
+REFRESH_BACKOFF_BASE = 30  # seconds after the first failed re-auth
+REFRESH_BACKOFF_MAX = 15 * 60
+ALIAS_TTL = 60 * 60  # long enough for a running sync that loaded the old token; new loads read the persisted one
+
+_token_aliases: dict[str, tuple[str, float]] = {}  # expired token -> (refreshed token, expires)
+_refresh_locks: dict[int, asyncio.Lock] = {}
+_refresh_backoff: dict[int, dict] = {}  # server_id -> {"until": timestamp, "delay": seconds}
+
+
+def _current_token(token: str) -> str:
+    alias = _token_aliases.get(token)
+    if not alias:
+        return token
+    if alias[1] < time.monotonic():
+        _token_aliases.pop(token, None)
+        return token
+    return alias[0]
+
+
+async def _refresh_token(failed_token: str, server_id: int | None) -> str | None:
+    """Re-authenticate a server with its stored credentials, at most once at a time.
+
+    Callers that hit 401 while a refresh is running wait for it and reuse the result;
+    after a failed refresh further attempts are skipped until the backoff expires.
+    """
+    if not server_id:
+        return None  # e.g. test_connection before the server is saved
+    lock = _refresh_locks.setdefault(server_id, asyncio.Lock())
+    async with lock:
+        current = _current_token(failed_token)
+        if current != failed_token:
+            return current  # refreshed by another caller meanwhile
+
+        backoff = _refresh_backoff.get(server_id)
+        if backoff and backoff["until"] > time.time():
+            return None
+
+        try:
+            from ..database import async_session
+            from ..models import JellyfinServer
+            async with async_session() as db:
+                srv = await db.get(JellyfinServer, server_id)
+                if not srv or not srv.jf_username or not srv.jf_password:
+                    return None
+                auth = await authenticate(srv.url, srv.jf_username, srv.jf_password)
+                new_token = auth["token"]
+                srv.token = new_token
+                await db.commit()
+                logger.info(f"Jellyfin token refreshed for {srv.name}")
+        except Exception as e:
+            delay = min((backoff or {}).get("delay", REFRESH_BACKOFF_BASE / 2) * 2, REFRESH_BACKOFF_MAX)
+            _refresh_backoff[server_id] = {"until": time.time() + delay, "delay": delay}
+            logger.error(f"Jellyfin token refresh failed (retry in {delay:.0f}s): {e}")
+            return None
+
+        _refresh_backoff.pop(server_id, None)
+        now = time.monotonic()
+        for old, (new, expires) in list(_token_aliases.items()):
+            if expires < now:
+                del _token_aliases[old]
+            elif new == failed_token:
+                _token_aliases[old] = (new_token, expires)
+        _token_aliases[failed_token] = (new_token, now + ALIAS_TTL)
+        return new_token
+
+
+async def test_connection(url: str, token: str, user_id: str, server_id: int | None = None) -> dict:
+    data = await _request(url, token, "GET", "/System/Info/Public", server_id=server_id)
     return {"status": "ok", "name": data.get("ServerName", "Jellyfin"), "version": data.get("Version", "?")}
 
 
-async def get_libraries(url: str, token: str) -> list[dict]:
-    data = await _request(url, token, "GET", "/Library/VirtualFolders")
+async def get_libraries(url: str, token: str, server_id: int | None = None) -> list[dict]:
+    data = await _request(url, token, "GET", "/Library/VirtualFolders", server_id=server_id)
     return [{"name": lib.get("Name"), "type": lib.get("CollectionType", ""), "id": lib.get("ItemId")} for lib in data]
 
 
@@ -85,9 +166,8 @@ async def get_libraries(url: str, token: str) -> list[dict]:
 _jf_cache: dict[str, dict] = {}  # url -> {tmdb_id -> item, "expires": timestamp}
 
 
-async def find_by_tmdb(url: str, token: str, user_id: str, tmdb_id: int, media_type: str) -> dict | None:
+async def find_by_tmdb(url: str, token: str, user_id: str, tmdb_id: int, media_type: str, server_id: int | None = None) -> dict | None:
     """Find an item on Jellyfin by TMDB ID. Builds a cache of all items."""
-    import time
     cache_key = f"{url}_{user_id}_{media_type}"
     cached = _jf_cache.get(cache_key)
 
@@ -98,7 +178,7 @@ async def find_by_tmdb(url: str, token: str, user_id: str, tmdb_id: int, media_t
             "Recursive": "true", "IncludeItemTypes": item_type,
             "Fields": "ProviderIds",
             "Limit": 10000,
-        })
+        }, server_id=server_id)
         mapping = {}
         for item in data.get("Items", []):
             tid = item.get("ProviderIds", {}).get("Tmdb")
@@ -120,55 +200,62 @@ async def find_by_tmdb(url: str, token: str, user_id: str, tmdb_id: int, media_t
 # --- Watch Status ---
 
 
-async def mark_watched(url: str, token: str, user_id: str, item_id: str) -> None:
-    await _request(url, token, "POST", f"/Users/{user_id}/PlayedItems/{item_id}")
+async def mark_watched(url: str, token: str, user_id: str, item_id: str, server_id: int | None = None) -> None:
+    await _request(url, token, "POST", f"/Users/{user_id}/PlayedItems/{item_id}", server_id=server_id)
 
 
-async def mark_unwatched(url: str, token: str, user_id: str, item_id: str) -> None:
-    await _request(url, token, "DELETE", f"/Users/{user_id}/PlayedItems/{item_id}")
+async def mark_unwatched(url: str, token: str, user_id: str, item_id: str, server_id: int | None = None) -> None:
+    await _request(url, token, "DELETE", f"/Users/{user_id}/PlayedItems/{item_id}", server_id=server_id)
 
 
 # --- Episodes ---
 
 
-async def get_seasons(url: str, token: str, user_id: str, series_id: str) -> list[dict]:
-    data = await _request(url, token, "GET", f"/Shows/{series_id}/Seasons", params={"UserId": user_id})
+async def get_seasons(url: str, token: str, user_id: str, series_id: str, server_id: int | None = None) -> list[dict]:
+    data = await _request(url, token, "GET", f"/Shows/{series_id}/Seasons", params={"UserId": user_id}, server_id=server_id)
     return data.get("Items", [])
 
 
-async def get_episodes(url: str, token: str, user_id: str, series_id: str, season_id: str) -> list[dict]:
+async def get_episodes(url: str, token: str, user_id: str, series_id: str, season_id: str, server_id: int | None = None) -> list[dict]:
     data = await _request(url, token, "GET", f"/Shows/{series_id}/Episodes", params={
         "UserId": user_id, "SeasonId": season_id, "Fields": "ProviderIds,MediaSources",
-    })
+    }, server_id=server_id)
     return data.get("Items", [])
 
 
-async def mark_episode_watched(url: str, token: str, user_id: str, episode_id: str) -> None:
-    await _request(url, token, "POST", f"/Users/{user_id}/PlayedItems/{episode_id}")
+async def mark_episode_watched(url: str, token: str, user_id: str, episode_id: str, server_id: int | None = None) -> None:
+    await _request(url, token, "POST", f"/Users/{user_id}/PlayedItems/{episode_id}", server_id=server_id)
 
 
-async def mark_episode_unwatched(url: str, token: str, user_id: str, episode_id: str) -> None:
-    await _request(url, token, "DELETE", f"/Users/{user_id}/PlayedItems/{episode_id}")
+async def mark_episode_unwatched(url: str, token: str, user_id: str, episode_id: str, server_id: int | None = None) -> None:
+    await _request(url, token, "DELETE", f"/Users/{user_id}/PlayedItems/{episode_id}", server_id=server_id)
 
 
 # --- Get all watched (for sync) ---
 
 
-async def get_watched_movies(url: str, token: str, user_id: str) -> list[dict]:
+async def get_item_tmdb_id(url: str, token: str, user_id: str, item_id: str, server_id: int | None = None) -> int | None:
+    """Resolve the TMDB ID of a single item (e.g. a series)."""
+    info = await _request(url, token, "GET", f"/Users/{user_id}/Items/{item_id}", params={"Fields": "ProviderIds"}, server_id=server_id)
+    tmdb_id = info.get("ProviderIds", {}).get("Tmdb")
+    return int(tmdb_id) if tmdb_id else None
+
+
+async def get_watched_movies(url: str, token: str, user_id: str, server_id: int | None = None) -> list[dict]:
     data = await _request(url, token, "GET", f"/Users/{user_id}/Items", params={
         "Recursive": "true", "IsPlayed": "true", "IncludeItemTypes": "Movie",
         "Fields": "ProviderIds", "Limit": 10000,
-    })
+    }, server_id=server_id)
     return [{"name": i.get("Name"), "year": i.get("ProductionYear"), "tmdb_id": int(i["ProviderIds"]["Tmdb"])}
             for i in data.get("Items", []) if i.get("ProviderIds", {}).get("Tmdb")]
 
 
-async def get_watched_episodes(url: str, token: str, user_id: str) -> list[dict]:
+async def get_watched_episodes(url: str, token: str, user_id: str, server_id: int | None = None) -> list[dict]:
     """Get all watched episodes grouped by series."""
     data = await _request(url, token, "GET", f"/Users/{user_id}/Items", params={
         "Recursive": "true", "IsPlayed": "true", "IncludeItemTypes": "Episode",
         "Fields": "ProviderIds,SeriesId", "Limit": 50000,
-    })
+    }, server_id=server_id)
     # Group by series
     series = {}
     for ep in data.get("Items", []):
@@ -189,10 +276,9 @@ async def get_watched_episodes(url: str, token: str, user_id: str) -> list[dict]
     result = []
     for sid, sdata in series.items():
         try:
-            series_info = await _request(url, token, "GET", f"/Users/{user_id}/Items/{sid}", params={"Fields": "ProviderIds"})
-            tmdb_id = series_info.get("ProviderIds", {}).get("Tmdb")
+            tmdb_id = await get_item_tmdb_id(url, token, user_id, sid, server_id=server_id)
             if tmdb_id:
-                sdata["tmdb_id"] = int(tmdb_id)
+                sdata["tmdb_id"] = tmdb_id
                 # Sort episodes
                 for s in sdata["episodes"]:
                     sdata["episodes"][s] = sorted(sdata["episodes"][s])
@@ -0,0 +1,81 @@
+"""Search over a user's library — Postgres full-text (title + overview) plus trigram title matching.
+
+Backed by the expression GIN indexes ix_movies_fts / ix_titles_fts, the genres
+indexes ix_movies_genres / ix_titles_genres and, when the pg_trgm extension could
+be created, ix_movies_title_trgm (see main._run_migrations).
+Without pg_trgm the search silently falls back to full-text + ILIKE.
+"""
+from sqlalchemy import Select, func, literal_column, or_, select
+from sqlalchemy.orm import contains_eager
+
+from ..models import Movie, Title
+from . import titles
+
+TS_CONFIG = literal_column("'simple'::regconfig")  # titles are multilingual, no stemming
+
+trigram_available = False
+
+
+def set_trigram_available(available: bool) -> None:
+    global trigram_available
+    trigram_available = available
+
+
+def _tsvector(title, overview):
+    # Must match the ix_movies_fts / ix_titles_fts index expressions exactly — inline literals, no bind params
+    empty, space = literal_column("''"), literal_column("' '")
+    return func.to_tsvector(TS_CONFIG, func.coalesce(title, empty).op("||")(space).op("||")(func.coalesce(overview, empty)))
+
+
+def search_query(
+    watchlist_ids,
+    q: str | None = None,
+    status: list[str] | None = None,
+    media_type: str | None = None,
+    tags: list[str] | None = None,
+    genres: list[int] | None = None,
+    year_from: int | None = None,
+    year_to: int | None = None,
+) -> tuple[Select, Select]:
+    """(ranked movie query, count query) for the given watchlists and filters.
+
+    Results carry a `rank` column; without a search term they are ordered newest first.
+    """
+    filters = [Movie.watchlist_id.in_(watchlist_ids)]
+    if status:
+        filters.append(Movie.status.in_(status))
+    if media_type:
+        filters.append(Movie.media_type == media_type)
+    if tags:
+        filters.append(Movie.tags.contains([{"label": t} for t in tags]))
+    if genres:
+        filters.append(titles.genres_filter(genres))
+    if year_from:
+        filters.append(Movie.year >= str(year_from))
+    if year_to:
+        filters.append(Movie.year <= str(year_to))
+
+    if q and q.strip():
+        q = q.strip()
+        tsquery = func.websearch_to_tsquery(TS_CONFIG, q)
+        own_tsv, shared_tsv = _tsvector(Movie.title, Movie._overview), _tsvector(Title.title, Title.overview)
+        if trigram_available:
+            title_match = Movie.title.op("%")(q)
+            title_rank = func.similarity(Movie.title, q)
+        else:
+            title_match = Movie.title.icontains(q, autoescape=True)  # "100%" or "_" match literally
+            title_rank = None
+        filters.append(or_(own_tsv.op("@@")(tsquery), shared_tsv.op("@@")(tsquery), title_match))
+        # greatest() ignores the NULL rank of rows without a shared title
+        rank = func.greatest(func.ts_rank(own_tsv, tsquery), func.ts_rank(shared_tsv, tsquery), *([title_rank] if title_rank is not None else []))
+        order = [rank.desc(), Movie.created_at.desc()]
+    else:
+        rank = literal_column("0.0")
+        order = [Movie.created_at.desc(), Movie.id.desc()]
+
+    query = (
+        titles.join_shared(select(Movie, rank.label("rank")))
+        .options(contains_eager(Movie.shared)).where(*filters).order_by(*order)
+    )
+    count = titles.join_shared(select(func.count()).select_from(Movie)).where(*filters)
+    return query, count
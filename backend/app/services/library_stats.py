@@ -0,0 +1,136 @@
+"""Library statistics — per-user counts by media type and status.
+
+user_stats holds one row per (user, media_type, status) with the number of
+titles and watched episodes. Statement-level triggers on movies apply the
+delta of every INSERT/UPDATE/DELETE in the same transaction, so ORM CRUD,
+merge_into() and bulk imports all keep it current without call-site
+bookkeeping; deleting a watchlist subtracts its movies before the cascade.
+Reading the stats is then a handful of rows regardless of library size.
+
+check_and_repair() (the user_stats_check job in main.SCHEDULED_JOBS) recomputes the counters from
+movies and rewrites users that drifted, e.g. after manual SQL.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session
+from ..models import UserStat, WatchEvent
+
+WEEK = timedelta(days=7)
+
+_AGGREGATE = """
+    SELECT w.owner_id AS user_id, coalesce(m.media_type, '') AS media_type, coalesce(m.status, '') AS status,
+           count(*) AS items, coalesce(sum(watch_progress_count(m.watch_progress)), 0) AS episodes
+    FROM movies m JOIN watchlists w ON w.id = m.watchlist_id
+    {where}
+    GROUP BY 1, 2, 3
+"""
+
+_APPLY_DELTA = """
+    INSERT INTO user_stats (user_id, media_type, status, items, episodes)
+    SELECT w.owner_id, coalesce(c.media_type, ''), coalesce(c.status, ''), sum(c.items), sum(c.episodes)
+    FROM ({changes}) c JOIN watchlists w ON w.id = c.watchlist_id
+    GROUP BY 1, 2, 3
+    HAVING sum(c.items) <> 0 OR sum(c.episodes) <> 0
+    ON CONFLICT (user_id, media_type, status) DO UPDATE
+      SET items = user_stats.items + excluded.items, episodes = user_stats.episodes + excluded.episodes;
+"""
+_ADDED = "SELECT watchlist_id, media_type, status, 1 AS items, watch_progress_count(watch_progress) AS episodes FROM new_rows"
+_REMOVED = "SELECT watchlist_id, media_type, status, -1 AS items, -watch_progress_count(watch_progress) AS episodes FROM old_rows"
+
+# Created by main._run_migrations, after episode_progress.SQL_FUNCTIONS
+SQL_TRIGGERS = [
+    f"""CREATE OR REPLACE FUNCTION movies_user_stats() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+          IF TG_OP = 'INSERT' THEN
+            {_APPLY_DELTA.format(changes=_ADDED)}
+          ELSIF TG_OP = 'UPDATE' THEN
+            {_APPLY_DELTA.format(changes=_ADDED + " UNION ALL " + _REMOVED)}
+          ELSE
+            {_APPLY_DELTA.format(changes=_REMOVED)}
+          END IF;
+          RETURN NULL;
+        END $$""",
+    "CREATE OR REPLACE TRIGGER movies_user_stats_insert AFTER INSERT ON movies "
+    "REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_user_stats()",
+    "CREATE OR REPLACE TRIGGER movies_user_stats_update AFTER UPDATE ON movies "
+    "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_user_stats()",
+    "CREATE OR REPLACE TRIGGER movies_user_stats_delete AFTER DELETE ON movies "
+    "REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION movies_user_stats()",
+    # Cascaded movie deletes no longer see the watchlist (and its owner), so subtract them up front
+    f"""CREATE OR REPLACE FUNCTION watchlists_user_stats() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+          UPDATE user_stats s SET items = s.items - c.items, episodes = s.episodes - c.episodes
+          FROM ({_AGGREGATE.format(where="WHERE w.id = OLD.id")}) c
+          WHERE s.user_id = c.user_id AND s.media_type = c.media_type AND s.status = c.status;
+          RETURN OLD;
+        END $$""",
+    "CREATE OR REPLACE TRIGGER watchlists_user_stats BEFORE DELETE ON watchlists "
+    "FOR EACH ROW EXECUTE FUNCTION watchlists_user_stats()",
+]
+
+# One-time fill, only while user_stats is empty
+BACKFILL_SQL = f"""
+INSERT INTO user_stats (user_id, media_type, status, items, episodes)
+{_AGGREGATE.format(where="WHERE NOT EXISTS (SELECT 1 FROM user_stats)")}
+"""
+
+_DRIFTED_USERS = f"""
+SELECT DISTINCT coalesce(a.user_id, s.user_id)
+FROM ({_AGGREGATE.format(where="")}) a
+FULL JOIN (SELECT * FROM user_stats WHERE items <> 0 OR episodes <> 0) s
+  ON s.user_id = a.user_id AND s.media_type = a.media_type AND s.status = a.status
+WHERE a.user_id IS NULL OR s.user_id IS NULL OR a.items <> s.items OR a.episodes <> s.episodes
+"""
+
+
+async def watchlist_stats(db: AsyncSession, user_id: int) -> dict:
+    rows = await db.execute(
+        select(UserStat.media_type, UserStat.status, UserStat.items, UserStat.episodes)
+        .where(UserStat.user_id == user_id, UserStat.items != 0)
+    )
+    stats = {
+        "total": 0, "movies": 0, "movies_watched": 0, "series": 0, "series_watched": 0,
+        "watched": 0, "watching": 0, "episodes_watched": 0, "by_status": {},
+    }
+    for media_type, status, count, episodes in rows:
+        kind = "movies" if media_type == "movie" else "series"
+        stats["total"] += count
+        stats[kind] += count
+        if status == "watched":
+            stats[f"{kind}_watched"] += count
+            stats["watched"] += count
+        elif status == "watching":
+            stats["watching"] += count
+        stats["by_status"][status] = stats["by_status"].get(status, 0) + count
+        stats["episodes_watched"] += episodes
+
+    # Sliding window, so not a counter: an index range count on (user_id, watched_at)
+    stats["watched_this_week"] = (await db.execute(
+        select(func.count()).select_from(WatchEvent)
+        .where(WatchEvent.user_id == user_id, WatchEvent.watched_at >= datetime.utcnow() - WEEK)
+    )).scalar()
+    return stats
+
+
+async def check_and_repair() -> list[int]:
+    """Recompute user_stats from movies and rewrite drifted users; returns their ids."""
+    async with async_session() as db:
+        user_ids = list((await db.execute(text(_DRIFTED_USERS))).scalars().all())
+    if not user_ids:
+        return []
+
+    async with async_session() as db:
+        # Writers hold ROW EXCLUSIVE on user_stats until commit; once this lock is
+        # granted, the recompute below sees every committed delta and no new ones race it.
+        await db.execute(text("LOCK TABLE user_stats IN EXCLUSIVE MODE"))
+        await db.execute(text("DELETE FROM user_stats WHERE user_id = ANY(:ids)"), {"ids": user_ids})
+        await db.execute(
+            text(f"INSERT INTO user_stats (user_id, media_type, status, items, episodes) "
+                 f"{_AGGREGATE.format(where='WHERE w.owner_id = ANY(:ids)')}"),
+            {"ids": user_ids},
+        )
+        await db.commit()
+    return user_ids
@@ -0,0 +1,328 @@
+"""Media index — technical and stream-language info per (server, TMDB title).
+
+Refreshed in the background (the media_index job in main.SCHEDULED_JOBS) so the Plex/Jellyfin
+status endpoints can answer from the database instead of walking seasons,
+episodes and stream metadata on every modal open. Only items whose
+source_version changed since the last run are re-fetched; the view state
+(play count, last viewed, played) of unchanged items is taken from the listing.
+It is the view state of the account the index is built with: the Plex
+server's stored token, or the user's own Jellyfin connection.
+"""
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session
+from ..models import JellyfinServer, MediaIndexEntry, PlexServer
+from . import jellyfin as jf_service, plex as plex_service
+
+logger = logging.getLogger(__name__)
+
+FETCH_CONCURRENCY = 4  # parallel detail requests per server
+UPSERT_CHUNK = 500
+
+VIEW_FIELDS = ("view_count", "last_viewed_at", "played")
+INDEX_FIELDS = (
+    "item_key", "title", "year", "video_resolution", "video_codec", "audio_codec", "audio_channels",
+    "file_size", "audio_languages", "subtitle_languages", "seasons", "source_version", *VIEW_FIELDS,
+)
+
+
+# --- Plex ---
+
+
+async def plex_stream_info(url: str, token: str, rating_key: str, media_type: str) -> dict:
+    """Technical info, stream languages and (for shows) seasons of a Plex item.
+
+    Shows carry no streams themselves, so the first episode of the first real season is used.
+    """
+    info = {"audio_languages": [], "subtitle_languages": []}
+    target_key = rating_key
+    if media_type == "tv":
+        seasons_data = await plex_service._request(url, token, f"/library/metadata/{rating_key}/children")
+        seasons = []
+        first_season_key = None
+        for s in seasons_data.get("MediaContainer", {}).get("Metadata", []):
+            snum = s.get("index", 0)
+            if snum == 0:
+                continue
+            seasons.append({"number": snum, "episodes": s.get("leafCount", 0), "viewedEpisodes": s.get("viewedLeafCount", 0)})
+            first_season_key = first_season_key or s.get("ratingKey")
+        info["seasons"] = seasons
+        if first_season_key:
+            eps = await plex_service._request(url, token, f"/library/metadata/{first_season_key}/children")
+            ep_list = eps.get("MediaContainer", {}).get("Metadata", [])
+            if ep_list:
+                target_key = ep_list[0].get("ratingKey", target_key)
+
+    stream_data = await plex_service._request(url, token, f"/library/metadata/{target_key}", {"includeStreams": 1})
+    for meta_item in stream_data.get("MediaContainer", {}).get("Metadata", []):
+        media_list = meta_item.get("Media") or []
+        if media_list and "video_resolution" not in info:
+            m = media_list[0]
+            part = (m.get("Part") or [{}])[0]
+            info.update(
+                video_resolution=m.get("videoResolution"),
+                video_codec=m.get("videoCodec"),
+                audio_codec=m.get("audioCodec"),
+                audio_channels=m.get("audioChannels"),
+                file_size=part.get("size"),
+            )
+        for media_entry in media_list:
+            for part in media_entry.get("Part", []):
+                for stream in part.get("Stream", []):
+                    lang = stream.get("language") or stream.get("languageCode") or stream.get("languageTag")
+                    if not lang:
+                        continue
+                    stype = stream.get("streamType")
+                    if stype == 2 and lang not in info["audio_languages"]:
+                        info["audio_languages"].append(lang)
+                    elif stype == 3 and lang not in info["subtitle_languages"]:
+                        info["subtitle_languages"].append(lang)
+    return info
+
+
+def _plex_version(item: dict) -> str:
+    # Shows: updatedAt does not move when episodes are added or watched, leafCount / viewedLeafCount do
+    return f"{item.get('updatedAt', '')}:{item.get('leafCount', '')}:{item.get('viewedLeafCount', '')}"
+
+
+def _plex_view_state(item: dict) -> dict:
+    viewed_at = item.get("lastViewedAt")
+    return {
+        "view_count": item.get("viewCount", 0),
+        "last_viewed_at": datetime.utcfromtimestamp(int(viewed_at)) if viewed_at else None,
+        "played": bool(item.get("viewCount")),
+    }
+
+
+async def refresh_plex_server(db: AsyncSession, machine_id: str, url: str, token: str) -> int:
+    """Index all movies/shows of one Plex server. Returns the number of (re-)indexed items."""
+    listing: dict[tuple[int, str], dict] = {}
+    complete = False  # only a complete listing may drop entries
+    for lib in await plex_service.get_libraries(url, token):
+        if lib["type"] not in ("movie", "show"):
+            continue
+        complete = True
+        media_type = "movie" if lib["type"] == "movie" else "tv"
+        start = 0
+        while True:
+            data = await plex_service._request(url, token, f"/library/sections/{lib['id']}/all", params={
+                "X-Plex-Container-Start": start, "X-Plex-Container-Size": 200, "includeGuids": 1,
+            })
+            container = data.get("MediaContainer", {})
+            items = container.get("Metadata", [])
+            for item in items:
+                tmdb_id = plex_service.extract_tmdb_id(item.get("Guid"))
+                if tmdb_id and item.get("ratingKey"):
+                    listing[(tmdb_id, media_type)] = item
+            start += len(items)
+            if len(items) < 200:
+                break
+        if start < int(container.get("totalSize") or 0):
+            complete = False
+
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def build(key, item):
+        async with sem:
+            info = await plex_stream_info(url, token, item["ratingKey"], key[1])
+        return {
+            "tmdb_id": key[0], "media_type": key[1], "item_key": str(item["ratingKey"]),
+            "title": item.get("title"), "year": item.get("year"),
+            "source_version": _plex_version(item), **_plex_view_state(item), **info,
+        }
+
+    return await _apply(db, "plex", machine_id, listing, _plex_version, _plex_view_state, build, complete)
+
+
+# --- Jellyfin ---
+
+
+def _jf_resolution(height: int | None) -> str | None:
+    if not height:
+        return None
+    if height >= 2000:
+        return "4k"
+    if height >= 1000:
+        return "1080"
+    if height >= 700:
+        return "720"
+    return "sd"
+
+
+def jellyfin_stream_info(item: dict) -> dict:
+    """Technical info + stream languages from an item fetched with Fields=MediaStreams,MediaSources."""
+    info = {"audio_languages": [], "subtitle_languages": []}
+    video = None
+    audio = None
+    for stream in item.get("MediaStreams", []):
+        stype = stream.get("Type", "")
+        if stype == "Video" and video is None:
+            video = stream
+        elif stype == "Audio" and audio is None:
+            audio = stream
+        lang = stream.get("Language") or stream.get("DisplayLanguage")
+        if not lang or lang in ("und", "Unknown"):
+            continue
+        if stype == "Audio" and lang not in info["audio_languages"]:
+            info["audio_languages"].append(lang)
+        elif stype == "Subtitle" and lang not in info["subtitle_languages"]:
+            info["subtitle_languages"].append(lang)
+    source = (item.get("MediaSources") or [{}])[0]
+    info.update(
+        video_resolution=_jf_resolution((video or {}).get("Height")),
+        video_codec=(video or {}).get("Codec"),
+        audio_codec=(audio or {}).get("Codec"),
+        audio_channels=(audio or {}).get("Channels"),
+        file_size=source.get("Size"),
+    )
+    return info
+
+
+async def jellyfin_item_stream_info(url: str, token: str, user_id: str, item_id: str, media_type: str, server_id: int | None = None) -> dict:
+    """Stream info of a Jellyfin movie, or of the first episode of a series."""
+    fields = "MediaStreams,MediaSources"
+    if media_type == "tv":
+        eps = await jf_service._request(url, token, "GET", f"/Shows/{item_id}/Episodes", {"UserId": user_id, "Limit": 1, "Fields": fields}, server_id=server_id)
+        ep_items = eps.get("Items", [])
+        return jellyfin_stream_info(ep_items[0]) if ep_items else {"audio_languages": [], "subtitle_languages": []}
+    detail = await jf_service._request(url, token, "GET", f"/Users/{user_id}/Items/{item_id}", params={"Fields": fields}, server_id=server_id)
+    return jellyfin_stream_info(detail)
+
+
+def _jf_version(item: dict) -> str:
+    return f"{item.get('Etag', '')}:{item.get('DateLastMediaAdded', '')}"
+
+
+def _jf_view_state(item: dict) -> dict:
+    data = item.get("UserData") or {}
+    return {
+        "view_count": data.get("PlayCount", 0),
+        "last_viewed_at": jf_service.parse_date(data.get("LastPlayedDate")),
+        "played": bool(data.get("Played")),
+    }
+
+
+async def refresh_jellyfin_server(db: AsyncSession, srv: JellyfinServer) -> int:
+    """Index all movies/series of one Jellyfin server connection."""
+    listing: dict[tuple[int, str], dict] = {}
+    for item_type, media_type in (("Movie", "movie"), ("Series", "tv")):
+        items = await jf_service.get_all_items(srv.url, srv.token, srv.jellyfin_user_id, {
+            "Recursive": "true", "IncludeItemTypes": item_type, "Fields": "ProviderIds,Etag,DateLastMediaAdded",
+        }, server_id=srv.id)
+        for item in items:
+            tid = item.get("ProviderIds", {}).get("Tmdb")
+            if tid and str(tid).isdigit():
+                listing[(int(tid), media_type)] = item
+
+    sem = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def build(key, item):
+        async with sem:
+            info = await jellyfin_item_stream_info(srv.url, srv.token, srv.jellyfin_user_id, item["Id"], key[1], server_id=srv.id)
+        return {
+            "tmdb_id": key[0], "media_type": key[1], "item_key": item["Id"],
+            "title": item.get("Name"), "year": item.get("ProductionYear"), "seasons": None,
+            "source_version": _jf_version(item), **_jf_view_state(item), **info,
+        }
+
+    # get_all_items raises rather than return a partial listing
+    return await _apply(db, "jellyfin", str(srv.id), listing, _jf_version, _jf_view_state, build, complete=True)
+
+
+# --- Shared ---
+
+
+async def _apply(db: AsyncSession, source: str, server_key: str, listing: dict, version_of, view_state_of, build, complete: bool) -> int:
+    """Re-index changed items, refresh the view state of unchanged ones.
+
+    Items that disappeared from the server are dropped only if the listing is complete
+    (and not empty), so a failed or partial listing doesn't wipe the server's entries.
+    """
+    existing = {
+        (r.tmdb_id, r.media_type): r
+        for r in (await db.execute(
+            select(MediaIndexEntry.id, MediaIndexEntry.tmdb_id, MediaIndexEntry.media_type, MediaIndexEntry.source_version,
+                   *(getattr(MediaIndexEntry, f) for f in VIEW_FIELDS))
+            .where(MediaIndexEntry.source == source, MediaIndexEntry.server_key == server_key)
+        )).all()
+    }
+    changed = []
+    views = []
+    for k, item in listing.items():
+        entry = existing.get(k)
+        if not entry or entry.source_version != version_of(item):
+            changed.append((k, item))
+            continue
+        state = view_state_of(item)
+        if any(getattr(entry, f) != state[f] for f in VIEW_FIELDS):
+            views.append({"id": entry.id, **state})
+
+    rows = []
+    for res in await asyncio.gather(*[build(k, item) for k, item in changed], return_exceptions=True):
+        if isinstance(res, Exception):
+            logger.debug(f"Media index fetch failed ({source} {server_key}): {res}")
+            continue
+        rows.append({"source": source, "server_key": server_key, **{f: res.get(f) for f in ("tmdb_id", "media_type", *INDEX_FIELDS)}})
+
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        stmt = pg_insert(MediaIndexEntry).values(rows[i:i + UPSERT_CHUNK])
+        await db.execute(stmt.on_conflict_do_update(
+            constraint="uq_media_index_item",
+            set_={f: stmt.excluded[f] for f in INDEX_FIELDS},
+        ))
+
+    if views:
+        await db.execute(update(MediaIndexEntry), views)
+
+    if complete and listing:
+        stale = [entry.id for k, entry in existing.items() if k not in listing]
+        if stale:
+            await db.execute(delete(MediaIndexEntry).where(MediaIndexEntry.id.in_(stale)))
+    return len(rows)
+
+
+async def refresh_all() -> dict:
+    """Refresh the index for all enabled Plex servers (by machine_id) and Jellyfin connections."""
+    async with async_session() as db:
+        plex_servers = (await db.execute(select(PlexServer).where(PlexServer.enabled == True, PlexServer.machine_id != None))).scalars().all()
+        jf_servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.enabled == True))).scalars().all()
+
+    indexed = {"plex": 0, "jellyfin": 0}
+    for srv in plex_servers:
+        try:
+            async with async_session() as db:
+                indexed["plex"] += await refresh_plex_server(db, srv.machine_id, srv.url, srv.token)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Media index refresh failed for Plex {srv.name}: {e}")
+    for srv in jf_servers:
+        try:
+            async with async_session() as db:
+                indexed["jellyfin"] += await refresh_jellyfin_server(db, srv)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Media index refresh failed for Jellyfin {srv.name}: {e}")
+    return indexed
+
+
+async def load_entries(db: AsyncSession, source: str, server_keys: list[str], tmdb_id: int, media_type: str) -> tuple[dict[str, MediaIndexEntry], set[str]]:
+    """Index entries for a title on the given servers, plus the set of servers that have been indexed at all.
+
+    A server that is indexed but has no entry simply doesn't have the title.
+    """
+    if not server_keys:
+        return {}, set()
+    entries = (await db.execute(select(MediaIndexEntry).where(
+        MediaIndexEntry.source == source, MediaIndexEntry.server_key.in_(server_keys),
+        MediaIndexEntry.tmdb_id == tmdb_id, MediaIndexEntry.media_type == media_type,
+    ))).scalars().all()
+    indexed = set((await db.execute(
+        select(MediaIndexEntry.server_key).where(MediaIndexEntry.source == source, MediaIndexEntry.server_key.in_(server_keys)).distinct()
+    )).scalars().all())
+    return {e.server_key: e for e in entries}, indexed
@@ -0,0 +1,178 @@
+"""Nightly full sync — Plex, Jellyfin and Tautulli for every user, spread over a window.
+
+Instead of one user after another at 03:00, run() plans the night first:
+
+- Phases a user doesn't need are dropped — no Plex token, no enabled Jellyfin
+  server, no Tautulli connection — as are phases already current: a Plex or
+  Jellyfin (or full) sync that finished within FRESH_AFTER, and Tautulli when
+  the incremental tautulli_sync job succeeded within TAUTULLI_FRESH_AFTER.
+- Users with phases left are ordered stalest first and get a start time in
+  their own share of NIGHTLY_SYNC_WINDOW_MINUTES, plus random jitter inside it.
+- Up to CONCURRENCY users run at once; every server scan holds a
+  server_budget slot, so concurrent users never exceed a server's budget.
+
+The returned report (user counts, per-phase timings) is stored with the
+scheduler run and logged.
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from ..config import get_settings
+from ..database import async_session
+from ..models import JellyfinServer, SyncJob, TautulliServer, User, UserPlexConnection
+from . import scheduler, server_budget, sync_jobs
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("plex", "jellyfin", "tautulli")
+CONCURRENCY = 4  # users at a time
+FRESH_AFTER = timedelta(hours=12)
+TAUTULLI_FRESH_AFTER = timedelta(hours=1)
+
+
+@dataclass
+class _Plan:
+    user: User
+    phases: list[str]
+    last_synced: datetime | None  # oldest last sync among the due phases; None = never
+    start_at: float = 0.0  # seconds after the window opened
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+async def _last_syncs(db) -> dict[tuple[int, str], tuple[datetime, bool]]:
+    """(user_id, phase) -> (last successful sync, still fresh) from sync_jobs; a full sync counts for both."""
+    last_finished = func.max(SyncJob.finished_at)
+    rows = await db.execute(
+        select(SyncJob.user_id, SyncJob.kind, last_finished, last_finished > func.now() - FRESH_AFTER)
+        .where(SyncJob.status == "done", SyncJob.kind.in_(("full", "plex", "jellyfin")))
+        .group_by(SyncJob.user_id, SyncJob.kind)
+    )
+    last: dict[tuple[int, str], tuple[datetime, bool]] = {}
+    for user_id, kind, finished_at, fresh in rows:
+        for phase in (("plex", "jellyfin") if kind == "full" else (kind,)):
+            if (user_id, phase) not in last or last[(user_id, phase)][0] < finished_at:
+                last[(user_id, phase)] = (finished_at, fresh)
+    return last
+
+
+async def _plan() -> tuple[list[_Plan], dict]:
+    async with async_session() as db:
+        users = (await db.execute(select(User).order_by(User.id))).scalars().all()
+        jellyfin_users = set((await db.execute(
+            select(JellyfinServer.user_id).where(JellyfinServer.enabled == True)
+        )).scalars().all())
+        tautulli_users = set((await db.execute(
+            select(UserPlexConnection.user_id).join(TautulliServer, TautulliServer.id == UserPlexConnection.server_id)
+            .where(TautulliServer.enabled == True)
+        )).scalars().all())
+        last = await _last_syncs(db)
+        tautulli_ok = await scheduler.last_success(db, "tautulli_sync")
+
+    tautulli_current = tautulli_ok is not None and tautulli_ok > datetime.utcnow() - TAUTULLI_FRESH_AFTER
+    counts = {"users": len(users), "skipped_no_source": 0, "skipped_current": 0}
+    plans = []
+    for user in users:
+        sources = [p for p, has in zip(PHASES, (bool(user.plex_token), user.id in jellyfin_users, user.id in tautulli_users)) if has]
+        due = [
+            p for p in sources
+            if not (p == "tautulli" and tautulli_current) and not last.get((user.id, p), (None, False))[1]
+        ]
+        if not sources:
+            counts["skipped_no_source"] += 1
+        elif not due:
+            counts["skipped_current"] += 1
+        else:
+            synced = [last.get((user.id, p), (None,))[0] for p in due if p != "tautulli"]
+            plans.append(_Plan(user, due, None if None in synced or not synced else min(synced)))
+
+    plans.sort(key=lambda p: (p.last_synced is not None, p.last_synced or datetime.min))
+    share = get_settings().nightly_sync_window_minutes * 60 / max(len(plans), 1)
+    for i, plan in enumerate(plans):
+        plan.start_at = (i + random.random()) * share
+    return plans, counts
+
+
+def _check_outcome(job: sync_jobs.Job) -> None:
+    """The Plex/Jellyfin runners record their errors on the job instead of raising; surface them here."""
+    if job.status == "error":
+        raise RuntimeError(job.error)
+
+
+async def _sync_plex(user: User) -> None:
+    from ..routers.plex import PLEX_SYNC_START, _run_full_plex_sync
+
+    job = await sync_jobs.start(user.id, "plex", **PLEX_SYNC_START)
+    if job:  # otherwise a manual sync is already running
+        await _run_full_plex_sync(user.id, job)
+        _check_outcome(job)
+
+
+async def _sync_jellyfin(user: User) -> None:
+    from ..routers.jellyfin import JELLYFIN_SYNC_START, _run_jellyfin_sync
+
+    job = await sync_jobs.start(user.id, "jellyfin", **JELLYFIN_SYNC_START)
+    if job:
+        await _run_jellyfin_sync(user.id, job)
+        _check_outcome(job)
+
+
+async def _sync_tautulli(user: User) -> None:
+    from .tautulli import sync_user_history
+
+    async with async_session() as db:
+        conn = (await db.execute(select(UserPlexConnection).where(UserPlexConnection.user_id == user.id))).scalar_one_or_none()
+        if not conn:
+            return
+        srv = (await db.execute(select(TautulliServer).where(TautulliServer.id == conn.server_id, TautulliServer.enabled == True))).scalar_one_or_none()
+        if not srv:
+            return
+        async with server_budget.slot(srv.url):
+            await sync_user_history(user, conn, srv, db)
+        await db.commit()
+
+
+_RUNNERS = {"plex": _sync_plex, "jellyfin": _sync_jellyfin, "tautulli": _sync_tautulli}
+
+
+async def _run_user(plan: _Plan, opened: float, users: asyncio.Semaphore, failed: dict[str, int]) -> None:
+    await asyncio.sleep(max(opened + plan.start_at - time.monotonic(), 0))
+    async with users:
+        logger.info(f"Nightly sync starting for {plan.user.username}: {', '.join(plan.phases)}")
+        for phase in plan.phases:
+            started = time.monotonic()
+            try:
+                await _RUNNERS[phase](plan.user)
+            except Exception as e:
+                failed[phase] += 1
+                logger.error(f"Nightly {phase} sync failed for {plan.user.username}: {e}")
+            plan.timings[phase] = time.monotonic() - started
+        logger.info(f"Nightly sync completed for {plan.user.username}")
+
+
+async def run() -> dict:
+    """Plan and run the nightly sync; returns the report."""
+    opened = time.monotonic()
+    waited_before = server_budget.waited_seconds()
+    plans, report = await _plan()
+    failed = {phase: 0 for phase in PHASES}
+    users = asyncio.Semaphore(CONCURRENCY)
+    await asyncio.gather(*(_run_user(plan, opened, users, failed) for plan in plans))
+
+    report["synced"] = len(plans)
+    report["phases"] = {}
+    for phase in PHASES:
+        timings = [p.timings[phase] for p in plans if phase in p.timings]
+        if timings:
+            report["phases"][phase] = {
+                "users": len(timings), "failed": failed[phase],
+                "seconds": round(sum(timings), 1), "max_seconds": round(max(timings), 1),
+            }
+    report["budget_wait_seconds"] = round(server_budget.waited_seconds() - waited_before, 1)
+    report["seconds"] = round(time.monotonic() - opened, 1)
+    return report
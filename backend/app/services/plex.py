@@ -352,16 +352,27 @@ async def mark_unwatched(url: str, token: str, rating_key: str, media_type: str
 DISCOVER_BASE = "https://discover.provider.plex.tv"
 
 
-async def get_plex_watchlist(plex_token: str) -> list[dict]:
-    """Get all items on the user's Plex Watchlist."""
+async def get_plex_watchlist(plex_token: str, page_size: int = 100) -> list[dict]:
+    """Get all items on the user's Plex Watchlist (with GUIDs), paging through the list."""
+    items = []
+    start = 0
     async with httpx.AsyncClient() as client:
-        resp = await client.get(
-            f"{DISCOVER_BASE}/library/sections/watchlist/all",
-            headers={**PLEX_HEADERS, "X-Plex-Token": plex_token},
-            timeout=TIMEOUT,
-        )
-        resp.raise_for_status()
-        return resp.json().get("MediaContainer", {}).get("Metadata", [])
+        while True:
+            resp = await client.get(
+                f"{DISCOVER_BASE}/library/sections/watchlist/all",
+                params={"includeGuids": 1, "X-Plex-Container-Start": start, "X-Plex-Container-Size": page_size},
+                headers={**PLEX_HEADERS, "X-Plex-Token": plex_token},
+                timeout=TIMEOUT,
+            )
+            resp.raise_for_status()
+            mc = resp.json().get("MediaContainer", {})
+            page = mc.get("Metadata", [])
+            items.extend(page)
+            start += len(page)
+            total = mc.get("totalSize")
+            if len(page) < page_size or (total is not None and start >= total):
+                break
+    return items
 
 
 async def find_on_plex_discover(plex_token: str, title: str, media_type: str, year: int | None = None) -> str | None:
@@ -409,29 +420,58 @@ async def remove_from_plex_watchlist(plex_token: str, rating_key: str) -> bool:
         return resp.status_code == 200
 
 
-async def get_watch_history_recent(url: str, token: str, minutes: int = 60) -> list[dict]:
-    """Get recently watched items (for sync polling)."""
+async def get_watch_history_recent(url: str, token: str, minutes: int = 60, page_size: int = 200) -> list[dict]:
+    """Get all items watched in the last `minutes` (for sync polling), paging through the window."""
     import time
     since = int(time.time()) - (minutes * 60)
-    data = await _request(url, token, "/status/sessions/history/all", params={
-        "X-Plex-Container-Start": 0,
-        "X-Plex-Container-Size": 50,
-        "sort": "viewedAt:desc",
-        "viewedAt>": since,
-    })
-    mc = data.get("MediaContainer", {})
-    items = mc.get("Metadata", [])
-    return [
-        {
-            "ratingKey": h.get("ratingKey"),
-            "title": h.get("title"),
-            "grandparentTitle": h.get("grandparentTitle"),
-            "type": h.get("type"),
-            "viewedAt": h.get("viewedAt"),
-            "guids": [g.get("id") for g in h.get("Guid", [])],
-        }
-        for h in items
-    ]
+    history = []
+    start = 0
+    while True:
+        data = await _request(url, token, "/status/sessions/history/all", params={
+            "X-Plex-Container-Start": start,
+            "X-Plex-Container-Size": page_size,
+            "sort": "viewedAt:desc",
+            "viewedAt>": since,
+            "includeGuids": 1,
+        })
+        items = data.get("MediaContainer", {}).get("Metadata", [])
+        for h in items:
+            history.append({
+                "ratingKey": h.get("ratingKey"),
+                "title": h.get("title"),
+                "grandparentTitle": h.get("grandparentTitle"),
+                "grandparentRatingKey": h.get("grandparentRatingKey") or (h.get("grandparentKey") or "").rsplit("/", 1)[-1] or None,
+                "parentIndex": h.get("parentIndex"),
+                "index": h.get("index"),
+                "type": h.get("type"),
+                "year": h.get("year"),
+                "viewedAt": h.get("viewedAt"),
+                "accountID": h.get("accountID"),
+                "guids": [g.get("id") for g in h.get("Guid", [])],
+            })
+        # Stop when the page was short or already reaches past the window
+        if len(items) < page_size or (items and (items[-1].get("viewedAt") or 0) < since):
+            break
+        start += page_size
+    return history
+
+
+async def get_accounts(url: str, token: str) -> dict[int, str]:
+    """Map server-local account IDs (as used in history `accountID`) to Plex usernames."""
+    data = await _request(url, token, "/accounts")
+    return {a.get("id"): a.get("name") for a in data.get("MediaContainer", {}).get("Account", []) if a.get("id") is not None}
+
+
+def extract_tmdb_id(guids: list | None) -> int | None:
+    """Extract the TMDB ID from a Plex Guid list (plain strings or {"id": ...} dicts)."""
+    for g in guids or []:
+        gid = g.get("id", "") if isinstance(g, dict) else str(g)
+        if gid.startswith("tmdb://"):
+            try:
+                return int(gid.replace("tmdb://", ""))
+            except ValueError:
+                continue
+    return None
 
 
 def _format_item(item: dict) -> dict:
@@ -0,0 +1,144 @@
+"""Plex Cloud Watchlist sync — exact GUID-based diff instead of title matching."""
+import asyncio
+import logging
+import time
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Movie, PlexDiscoverKey, User, Watchlist
+from . import plex as plex_service
+
+logger = logging.getLogger(__name__)
+
+DISCOVER_CONCURRENCY = 5  # plex.tv requests in flight per sync
+DISCOVER_RATE = 10  # plex.tv requests started per second per sync
+WANTED_STATUSES = ("watchlist", "planned", "watching")
+
+
+class _RateLimiter:
+    """Spaces request starts at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self._interval
+
+
+def _cloud_media_type(item: dict) -> str:
+    return "tv" if item.get("type") == "show" else "movie"
+
+
+async def _store_discover_keys(db: AsyncSession, keys: dict[tuple[int, str], str]) -> None:
+    if not keys:
+        return
+    rows = [{"tmdb_id": t, "media_type": mt, "rating_key": rk} for (t, mt), rk in keys.items()]
+    stmt = pg_insert(PlexDiscoverKey).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        constraint="uq_plex_discover_keys_tmdb",
+        set_={"rating_key": stmt.excluded.rating_key},
+    ))
+
+
+async def resolve_discover_key(db: AsyncSession, plex_token: str, tmdb_id: int, media_type: str, title: str, year: str | None = None) -> str | None:
+    """Discover ratingKey for a title — persistent cache first, plex.tv search on miss."""
+    cached = (await db.execute(
+        select(PlexDiscoverKey.rating_key).where(PlexDiscoverKey.tmdb_id == tmdb_id, PlexDiscoverKey.media_type == media_type)
+    )).scalar_one_or_none()
+    if cached:
+        return cached
+    year_int = int(year) if year and str(year).isdigit() else None
+    key = await plex_service.find_on_plex_discover(plex_token, title, media_type, year_int)
+    if key:
+        await _store_discover_keys(db, {(tmdb_id, media_type): key})
+    return key
+
+
+async def sync_watchlist(db: AsyncSession, user: User) -> dict:
+    """Push wanted titles to the Plex Watchlist and remove watched ones, by TMDB GUID."""
+    wl_ids = (await db.execute(select(Watchlist.id).where(Watchlist.owner_id == user.id))).scalars().all()
+    if not wl_ids:
+        return {"error": "Keine Watchlists"}
+
+    movies = (await db.execute(
+        select(Movie.tmdb_id, Movie.media_type, Movie.title, Movie.year, Movie.status)
+        .where(Movie.watchlist_id.in_(wl_ids), Movie.tmdb_id != None)
+    )).all()
+
+    # Current cloud watchlist: (tmdb_id, media_type) -> discover ratingKey
+    cloud: dict[tuple[int, str], str] = {}
+    try:
+        cloud_items = await plex_service.get_plex_watchlist(user.plex_token)
+    except Exception as e:
+        # Without the current state every wanted title would look missing and be looked up and added again
+        logger.warning(f"Plex watchlist fetch failed for user {user.id}: {e}")
+        return {"error": f"Plex-Merkliste konnte nicht geladen werden: {e}"}
+    for item in cloud_items:
+        tmdb_id = plex_service.extract_tmdb_id(item.get("Guid"))
+        if tmdb_id and item.get("ratingKey"):
+            cloud[(tmdb_id, _cloud_media_type(item))] = item["ratingKey"]
+    # Items already on the cloud watchlist resolve for free
+    await _store_discover_keys(db, cloud)
+
+    wanted: dict[tuple[int, str], tuple[str, str | None]] = {}
+    watched: set[tuple[int, str]] = set()
+    for m in movies:
+        key = (m.tmdb_id, m.media_type or "movie")
+        if m.status in WANTED_STATUSES:
+            wanted[key] = (m.title, m.year)
+        elif m.status == "watched":
+            watched.add(key)
+
+    to_add = {k: v for k, v in wanted.items() if k not in cloud}
+    to_remove = [cloud[k] for k in watched if k in cloud and k not in wanted]
+
+    # Resolve discover keys for additions: persistent cache, then concurrent plex.tv lookups
+    resolved: dict[tuple[int, str], str] = {}
+    if to_add:
+        cached = (await db.execute(
+            select(PlexDiscoverKey.tmdb_id, PlexDiscoverKey.media_type, PlexDiscoverKey.rating_key)
+            .where(PlexDiscoverKey.tmdb_id.in_({t for t, _ in to_add}))
+        )).all()
+        resolved = {(c.tmdb_id, c.media_type): c.rating_key for c in cached if (c.tmdb_id, c.media_type) in to_add}
+
+    sem = asyncio.Semaphore(DISCOVER_CONCURRENCY)
+    limiter = _RateLimiter(DISCOVER_RATE)
+    errors = 0
+
+    async def lookup(key, title, year):
+        async with sem:
+            await limiter.wait()
+            year_int = int(year) if year and str(year).isdigit() else None
+            return key, await plex_service.find_on_plex_discover(user.plex_token, title, key[1], year_int)
+
+    misses = [lookup(k, title, year) for k, (title, year) in to_add.items() if k not in resolved]
+    new_keys = {}
+    for res in await asyncio.gather(*misses, return_exceptions=True):
+        if isinstance(res, Exception):
+            errors += 1
+        elif res[1]:
+            new_keys[res[0]] = res[1]
+    await _store_discover_keys(db, new_keys)
+    resolved.update(new_keys)
+
+    async def mutate(fn, rating_key):
+        async with sem:
+            await limiter.wait()
+            return await fn(user.plex_token, rating_key)
+
+    add_results = await asyncio.gather(*[mutate(plex_service.add_to_plex_watchlist, rk) for rk in resolved.values()], return_exceptions=True)
+    remove_results = await asyncio.gather(*[mutate(plex_service.remove_from_plex_watchlist, rk) for rk in to_remove], return_exceptions=True)
+
+    added = sum(1 for r in add_results if r is True)
+    removed = sum(1 for r in remove_results if r is True)
+    errors += sum(1 for r in list(add_results) + list(remove_results) if r is not True)
+
+    return {"added": added, "removed": removed, "errors": errors, "total_checked": len(movies)}
@@ -0,0 +1,249 @@
+"""Background scheduler — runs each periodic job on one worker at a time.
+
+Every process runs run_forever() with the same job list, but a run only starts
+after claiming the job's row in scheduled_jobs: a SELECT .. FOR UPDATE SKIP
+LOCKED on a due, unleased row, which also moves next_run_at forward. The
+claiming worker holds a lease it renews while the job runs, so N uvicorn
+workers or replicas poll Plex/Jellyfin/Tautulli once, and a crashed leader's
+job is picked up by another worker once the lease expires.
+
+Missed runs (all workers down, or a run longer than the interval) are
+coalesced into a single run when the job is next claimed, unless the job sets
+misfire_grace and is overdue by more than that — then the missed run is
+recorded as skipped. Every run is written to scheduled_runs, with the dict a
+job returns (if any) as its result.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone
+from typing import Awaitable, Callable
+
+from sqlalchemy import delete, desc, or_, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..config import get_settings
+from ..database import async_session
+from ..models import ScheduledJob, ScheduledRun
+
+logger = logging.getLogger(__name__)
+
+TICK = 15  # seconds between claim attempts
+LEASE = timedelta(minutes=5)
+LEASE_RENEW = 60  # seconds
+RUN_RETENTION = timedelta(days=30)
+STALE_ERROR = "Worker nicht mehr erreichbar"
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+@dataclass(frozen=True)
+class Job:
+    name: str
+    run: Callable[[], Awaitable[dict | None]]
+    interval: int  # seconds; SCHEDULER_INTERVALS overrides it per name
+    jitter: int = 0  # up to this many seconds are added to every next run
+    daily_at: time | None = None  # local time of day; replaces the interval
+    first_delay: int | None = None  # first run of a new job after this many seconds (default: one interval)
+    misfire_grace: int | None = None  # skip a run overdue by more than this (default: run it once)
+
+    @property
+    def effective_interval(self) -> int:
+        return get_settings().scheduler_intervals.get(self.name, self.interval)
+
+    def next_run(self, now: datetime) -> datetime:
+        """Next due time (UTC, naive like the other timestamps) after now."""
+        if self.daily_at:
+            local = datetime.now().replace(hour=self.daily_at.hour, minute=self.daily_at.minute, second=0, microsecond=0)
+            if local <= datetime.now():
+                local += timedelta(days=1)
+            due = local.astimezone(timezone.utc).replace(tzinfo=None)
+        else:
+            due = now + timedelta(seconds=self.effective_interval)
+        return due + timedelta(seconds=random.uniform(0, self.jitter))
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+async def register(jobs: list[Job]) -> None:
+    """Create schedule rows for new jobs; existing rows keep their next_run_at across restarts."""
+    now = _utcnow()
+    async with async_session() as db:
+        for job in jobs:
+            first = now + timedelta(seconds=job.first_delay) if job.first_delay is not None else job.next_run(now)
+            await db.execute(pg_insert(ScheduledJob).values(name=job.name, next_run_at=first).on_conflict_do_nothing())
+        await db.commit()
+
+
+async def _claim(job: Job) -> int | None:
+    """Claim a due run of job for this worker; returns the scheduled_runs id."""
+    now = _utcnow()
+    async with async_session() as db:
+        row = (await db.execute(
+            select(ScheduledJob)
+            .where(ScheduledJob.name == job.name, ScheduledJob.next_run_at <= now,
+                   or_(ScheduledJob.lease_until == None, ScheduledJob.lease_until < now))
+            .with_for_update(skip_locked=True)
+        )).scalar_one_or_none()
+        if not row:
+            return None
+
+        due = row.next_run_at
+        row.next_run_at = job.next_run(now)
+        # Runs still marked running lost their worker (the lease expired or was never released)
+        await db.execute(
+            update(ScheduledRun).where(ScheduledRun.job == job.name, ScheduledRun.status == "running")
+            .values(status="error", error=STALE_ERROR, finished_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+        overdue = (now - due).total_seconds()
+        if job.misfire_grace is not None and overdue > job.misfire_grace:
+            db.add(ScheduledRun(job=job.name, worker=WORKER, due_at=due, started_at=now, finished_at=now,
+                                status="skipped", error=f"{int(overdue)} s verpasst"))
+            row.last_status = "skipped"
+            await db.commit()
+            logger.warning(f"Scheduler: skipped {job.name}, overdue by {int(overdue)} s; next run {row.next_run_at}")
+            return None
+
+        row.lease_owner, row.lease_until = WORKER, now + LEASE
+        row.last_started_at, row.last_status, row.last_error = now, "running", None
+        run = ScheduledRun(job=job.name, worker=WORKER, due_at=due, started_at=now, status="running")
+        db.add(run)
+        await db.commit()
+        return run.id
+
+
+async def _renew_lease(name: str) -> None:
+    while True:
+        await asyncio.sleep(LEASE_RENEW)
+        try:
+            async with async_session() as db:
+                await db.execute(
+                    update(ScheduledJob).where(ScheduledJob.name == name, ScheduledJob.lease_owner == WORKER)
+                    .values(lease_until=_utcnow() + LEASE).execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Scheduler: lease renewal for {name} failed: {e}")
+
+
+async def _execute(job: Job, run_id: int) -> None:
+    renew = asyncio.create_task(_renew_lease(job.name))
+    status, error, result = "ok", None, None
+    try:
+        result = await job.run()
+    except asyncio.CancelledError:
+        status, error = "cancelled", "Worker beendet"
+        raise
+    except Exception as e:
+        status, error = "error", str(e)
+        logger.error(f"Scheduled job {job.name} failed: {e}")
+    finally:
+        renew.cancel()
+        now = _utcnow()
+        try:
+            async with async_session() as db:
+                await db.execute(
+                    update(ScheduledRun).where(ScheduledRun.id == run_id)
+                    .values(status=status, error=error, finished_at=now, result=result if isinstance(result, dict) else None)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.execute(
+                    update(ScheduledJob).where(ScheduledJob.name == job.name, ScheduledJob.lease_owner == WORKER)
+                    .values(lease_owner=None, lease_until=None, last_finished_at=now, last_status=status, last_error=error)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Scheduler: could not record run of {job.name}: {e}")
+
+
+async def run_forever(jobs: list[Job]) -> None:
+    """Claim and run due jobs until cancelled; running jobs are cancelled with it."""
+    await register(jobs)
+    running: dict[str, asyncio.Task] = {}
+    try:
+        while True:
+            for job in jobs:
+                if job.name in running:
+                    continue
+                try:
+                    run_id = await _claim(job)
+                except Exception as e:
+                    logger.error(f"Scheduler: claiming {job.name} failed: {e}")
+                    continue
+                if run_id is not None:
+                    task = asyncio.create_task(_execute(job, run_id))
+                    running[job.name] = task
+                    task.add_done_callback(lambda _, name=job.name: running.pop(name, None))
+            await asyncio.sleep(TICK)
+    finally:
+        for task in list(running.values()):
+            task.cancel()
+        await asyncio.gather(*running.values(), return_exceptions=True)
+
+
+async def trigger(db: AsyncSession, name: str) -> bool:
+    """Make a job due now (runs within one TICK on whichever worker claims it)."""
+    result = await db.execute(
+        update(ScheduledJob).where(ScheduledJob.name == name).values(next_run_at=_utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+
+async def last_success(db: AsyncSession, name: str) -> datetime | None:
+    """When the latest successful run of a job finished (UTC, naive)."""
+    return (await db.execute(
+        select(ScheduledRun.finished_at).where(ScheduledRun.job == name, ScheduledRun.status == "ok")
+        .order_by(desc(ScheduledRun.id)).limit(1)
+    )).scalar()
+
+
+async def overview(db: AsyncSession, jobs: list[Job], runs: int = 50) -> dict:
+    """Schedule, lease and last outcome per job plus the latest runs, for the admin endpoint."""
+    defined = {job.name: job for job in jobs}
+    rows = (await db.execute(select(ScheduledJob).order_by(ScheduledJob.name))).scalars().all()
+    history = (await db.execute(select(ScheduledRun).order_by(desc(ScheduledRun.id)).limit(runs))).scalars().all()
+    return {
+        "jobs": [
+            {
+                "name": r.name,
+                "interval": defined[r.name].effective_interval if r.name in defined and not defined[r.name].daily_at else None,
+                "daily_at": defined[r.name].daily_at.strftime("%H:%M") if r.name in defined and defined[r.name].daily_at else None,
+                "next_run_at": str(r.next_run_at),
+                "running_on": r.lease_owner,
+                "last_started_at": str(r.last_started_at) if r.last_started_at else None,
+                "last_finished_at": str(r.last_finished_at) if r.last_finished_at else None,
+                "last_status": r.last_status,
+                "last_error": r.last_error,
+            }
+            for r in rows if r.name in defined
+        ],
+        "runs": [
+            {
+                "id": r.id, "job": r.job, "worker": r.worker, "status": r.status, "error": r.error, "result": r.result,
+                "due_at": str(r.due_at), "started_at": str(r.started_at),
+                "finished_at": str(r.finished_at) if r.finished_at else None,
+            }
+            for r in history
+        ],
+    }
+
+
+async def prune() -> int:
+    """Delete run history older than RUN_RETENTION."""
+    async with async_session() as db:
+        result = await db.execute(
+            delete(ScheduledRun).where(ScheduledRun.started_at < _utcnow() - RUN_RETENTION)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount
@@ -0,0 +1,53 @@
+"""Server budget — caps concurrent sync work per media server.
+
+The Plex and Jellyfin full syncs and the nightly Tautulli phase scan each
+server inside slot(url); at most SYNC_SERVER_CONCURRENCY scans run against
+one server (keyed by host:port) at a time, whoever started them — several
+nightly users or a manual sync. Budgets are per process, and the scheduled
+syncs all run on the scheduler's leader.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from ..config import get_settings
+
+_slots: dict[str, asyncio.Semaphore] = {}
+_stats: dict[str, dict] = {}
+
+
+def _key(url: str) -> str:
+    return (urlsplit(url).netloc or url).lower()
+
+
+@asynccontextmanager
+async def slot(url: str):
+    """Hold one of the server's slots for the duration of the block."""
+    key = _key(url)
+    if key not in _slots:
+        _slots[key] = asyncio.Semaphore(get_settings().sync_server_concurrency)
+        _stats[key] = {"in_use": 0, "waiting": 0, "scans": 0, "waited_seconds": 0.0}
+    stats = _stats[key]
+    stats["waiting"] += 1
+    started = time.monotonic()
+    try:
+        await _slots[key].acquire()
+    finally:
+        stats["waiting"] -= 1
+    stats["waited_seconds"] += time.monotonic() - started
+    stats["in_use"] += 1
+    stats["scans"] += 1
+    try:
+        yield
+    finally:
+        stats["in_use"] -= 1
+        _slots[key].release()
+
+
+def waited_seconds() -> float:
+    return sum(s["waited_seconds"] for s in _stats.values())
+
+
+def stats() -> dict:
+    return {key: {**s, "waited_seconds": round(s["waited_seconds"], 1)} for key, s in _stats.items()}
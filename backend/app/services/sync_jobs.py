@@ -0,0 +1,198 @@
+"""Sync jobs — background sync runs tracked in the sync_jobs table.
+
+start() inserts a running job; a partial unique index allows one running job
+per (user, kind), so duplicate-run protection holds across uvicorn workers.
+While a job runs, its Job handle writes a heartbeat (and any pending progress)
+every HEARTBEAT_INTERVAL seconds and picks up cancel requests. Jobs whose
+heartbeat is older than STALE_AFTER — the worker died or restarted — are
+reported as failed and don't block a new run.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from sqlalchemy import delete, desc, func, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database import async_session
+from ..models import SyncJob
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 15  # seconds
+PROGRESS_INTERVAL = 2  # seconds between progress writes
+STALE_AFTER = timedelta(seconds=HEARTBEAT_INTERVAL * 8)
+STALE_ERROR = "Abgebrochen (Worker nicht mehr erreichbar)"
+RETENTION = timedelta(days=30)  # finished jobs
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobCancelled(BaseException):
+    """Raised inside a job once a cancel was requested.
+
+    A BaseException like asyncio.CancelledError, so the per-item `except Exception`
+    handlers of the sync loops don't swallow it.
+    """
+
+
+class Job:
+    """Handle of a running job. Use as `async with job:`; the exit records the outcome."""
+
+    def __init__(self, job_id: int, user_id: int, kind: str):
+        self.id = job_id
+        self.user_id = user_id
+        self.kind = kind
+        self.cancel_requested = False
+        self.status = "running"  # outcome once finished: "done", "error" or "cancelled"
+        self.error: str | None = None
+        self._progress: dict = {}
+        self._dirty = False
+        self._written_at = 0.0
+        self._heartbeat: asyncio.Task | None = None
+
+    async def __aenter__(self) -> "Job":
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> bool:
+        self._heartbeat.cancel()
+        if exc_type is None:
+            await self._finish("done")
+            return False
+        if issubclass(exc_type, JobCancelled):
+            await self._finish("cancelled")
+            return True
+        await self._finish("error", str(exc))
+        return False
+
+    async def progress(self, force: bool = False, **values) -> None:
+        """Update progress; written at most every PROGRESS_INTERVAL seconds unless forced.
+
+        Raises JobCancelled once a cancel was requested.
+        """
+        self._progress.update(values)
+        self._dirty = True
+        if force or time.monotonic() - self._written_at >= PROGRESS_INTERVAL:
+            await self._write()
+        self.check_cancelled()
+
+    def check_cancelled(self) -> None:
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    async def done(self, **values) -> None:
+        """End the job successfully with final progress values."""
+        self._progress.update(values)
+        await self._finish("done")
+
+    async def fail(self, error: str, **values) -> None:
+        """End the job as failed without raising (e.g. nothing to sync)."""
+        self._progress.update(values)
+        await self._finish("error", error)
+
+    async def _write(self) -> None:
+        values = {"heartbeat_at": func.now()}
+        if self._dirty:
+            values["progress"] = dict(self._progress)
+        async with async_session() as db:
+            result = await db.execute(
+                update(SyncJob).where(SyncJob.id == self.id).values(**values)
+                .returning(SyncJob.cancel_requested).execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        self.cancel_requested = bool(result.scalar())
+        self._dirty = False
+        self._written_at = time.monotonic()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                await self._write()
+            except Exception as e:
+                logger.warning(f"Sync job {self.id} heartbeat failed: {e}")
+
+    async def _finish(self, status: str, error: str | None = None) -> None:
+        if self._heartbeat:
+            self._heartbeat.cancel()
+        self.status, self.error = status, error
+        try:
+            async with async_session() as db:
+                await db.execute(
+                    update(SyncJob).where(SyncJob.id == self.id, SyncJob.status == "running")
+                    .values(status=status, error=error, progress=dict(self._progress), heartbeat_at=func.now(), finished_at=func.now())
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.error(f"Sync job {self.id} could not be finished: {e}")
+
+
+def _stale():
+    return SyncJob.heartbeat_at < func.now() - STALE_AFTER
+
+
+async def start(user_id: int, kind: str, **progress) -> Job | None:
+    """Create a running job, or None if one of this kind is already running for the user."""
+    async with async_session() as db:
+        await db.execute(
+            update(SyncJob).where(SyncJob.user_id == user_id, SyncJob.kind == kind, SyncJob.status == "running", _stale())
+            .values(status="error", error=STALE_ERROR, finished_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        job_id = (await db.execute(
+            pg_insert(SyncJob)
+            .values(user_id=user_id, kind=kind, status="running", progress=progress, worker=WORKER)
+            .on_conflict_do_nothing(index_elements=["user_id", "kind"], index_where=text("status = 'running'"))
+            .returning(SyncJob.id)
+        )).scalar()
+        await db.commit()
+    if job_id is None:
+        return None
+    job = Job(job_id, user_id, kind)
+    job._progress = dict(progress)
+    return job
+
+
+async def status(db: AsyncSession, user_id: int, kind: str, default: dict) -> dict:
+    """Latest job of this kind as the status endpoints' dict ({"running": ..., **progress})."""
+    row = (await db.execute(
+        select(SyncJob, _stale()).where(SyncJob.user_id == user_id, SyncJob.kind == kind).order_by(desc(SyncJob.id)).limit(1)
+    )).first()
+    if not row:
+        return dict(default)
+    job, stale = row
+    job_status, error = job.status, job.error
+    if job_status == "running" and stale:
+        job_status, error = "error", STALE_ERROR
+    result = {**job.progress, "running": job_status == "running", "job_id": job.id, "job_status": job_status}
+    if error:
+        result["error"] = error
+    if job.cancel_requested:
+        result["cancel_requested"] = True
+    return result
+
+
+async def cancel(db: AsyncSession, user_id: int, *kinds: str) -> int:
+    """Request cancellation of the user's running jobs of these kinds; returns how many were flagged."""
+    result = await db.execute(
+        update(SyncJob).where(SyncJob.user_id == user_id, SyncJob.kind.in_(kinds), SyncJob.status == "running")
+        .values(cancel_requested=True).execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def prune() -> int:
+    """Delete finished jobs older than RETENTION; returns how many were deleted."""
+    async with async_session() as db:
+        result = await db.execute(
+            delete(SyncJob).where(SyncJob.status != "running", SyncJob.finished_at < func.now() - RETENTION)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    return result.rowcount
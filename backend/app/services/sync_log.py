@@ -1,12 +1,99 @@
+"""Sync log — buffered writer and retention for sync_logs.
+
+log_sync() only appends to an in-process buffer. main._sync_log_flush_loop
+writes the buffer in one multi-row INSERT once FLUSH_SIZE events are queued or
+FLUSH_INTERVAL passed, and once more on shutdown. If the database is
+unreachable the events stay buffered up to MAX_BUFFER; beyond that they are
+dropped and counted (see stats()). prune() deletes rows older than the
+configured retention in small batches.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select
+
+from ..config import get_settings
 from ..database import async_session
 from ..models import SyncLog
 
+logger = logging.getLogger(__name__)
+
+FLUSH_SIZE = 100
+FLUSH_INTERVAL = 5  # seconds
+MAX_BUFFER = 5000
+PRUNE_BATCH = 5000
+
+_buffer: list[dict] = []
+_batch_ready = asyncio.Event()
+_stats = {"written": 0, "dropped": 0, "failed_flushes": 0, "pruned": 0}
+
 
 async def log_sync(user_id: int, source: str, direction: str, added: int = 0, updated: int = 0, errors: int = 0, details: str = ""):
-    """Log a sync event."""
+    """Log a sync event (buffered; written by the flush loop)."""
+    if len(_buffer) >= MAX_BUFFER:
+        _stats["dropped"] += 1
+        return
+    _buffer.append({
+        "user_id": user_id, "source": source, "direction": direction,
+        "added": added, "updated": updated, "errors": errors, "details": details or None,
+        "created_at": datetime.utcnow(),
+    })
+    if len(_buffer) >= FLUSH_SIZE:
+        _batch_ready.set()
+
+
+async def wait_for_batch() -> None:
+    """Returns once FLUSH_SIZE events are buffered or FLUSH_INTERVAL elapsed."""
+    try:
+        await asyncio.wait_for(_batch_ready.wait(), timeout=FLUSH_INTERVAL)
+    except asyncio.TimeoutError:
+        pass
+    _batch_ready.clear()
+
+
+async def flush() -> int:
+    """Write all buffered events; returns how many were written."""
+    global _buffer
+    if not _buffer:
+        return 0
+    rows, _buffer = _buffer, []
     try:
         async with async_session() as db:
-            db.add(SyncLog(user_id=user_id, source=source, direction=direction, added=added, updated=updated, errors=errors, details=details or None))
+            await db.execute(insert(SyncLog), rows)
             await db.commit()
     except Exception:
-        pass
+        _stats["failed_flushes"] += 1
+        # Re-queue ahead of newer events, as far as the buffer bound allows
+        keep = rows[:max(MAX_BUFFER - len(_buffer), 0)]
+        _stats["dropped"] += len(rows) - len(keep)
+        _buffer = keep + _buffer
+        raise
+    _stats["written"] += len(rows)
+    return len(rows)
+
+
+async def prune() -> int:
+    """Delete rows older than SYNC_LOG_RETENTION_DAYS; returns how many were deleted."""
+    cutoff = datetime.utcnow() - timedelta(days=get_settings().sync_log_retention_days)
+    total = 0
+    while True:
+        async with async_session() as db:
+            # Small batches keep each transaction's locks short; uses ix_sync_logs_created
+            batch = select(SyncLog.id).where(SyncLog.created_at < cutoff).limit(PRUNE_BATCH).scalar_subquery()
+            result = await db.execute(delete(SyncLog).where(SyncLog.id.in_(batch)))
+            await db.commit()
+        total += result.rowcount
+        if result.rowcount < PRUNE_BATCH:
+            break
+    _stats["pruned"] += total
+    return total
+
+
+def buffered(user_id: int) -> list[dict]:
+    """A user's events not written yet, newest first (readers merge them instead of forcing a flush)."""
+    return [row for row in reversed(_buffer) if row["user_id"] == user_id]
+
+
+def stats() -> dict:
+    return {**_stats, "buffered": len(_buffer)}
@@ -6,7 +6,9 @@ import httpx
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..models import Movie, TautulliServer, User, UserPlexConnection, Watchlist
+from ..models import TautulliServer, User, UserPlexConnection, Watchlist
+from . import watch_history
+from .watch_sync import apply_new_episodes, apply_watched_movies
 
 logger = logging.getLogger(__name__)
 
@@ -118,6 +120,14 @@ async def _resolve_tmdb_id(url: str, api_key: str, rating_key: int, cache: dict,
     return None
 
 
+def _entry_time(entry: dict) -> datetime | None:
+    """Start of a Tautulli history entry (unix timestamp)."""
+    try:
+        return datetime.utcfromtimestamp(int(entry.get("date") or entry.get("started")))
+    except (TypeError, ValueError):
+        return None
+
+
 async def sync_user_history(
     user: User, conn: UserPlexConnection, server: TautulliServer, db: AsyncSession,
 ) -> dict:
@@ -139,6 +149,8 @@ async def sync_user_history(
     updated = 0
     total = 0
     metadata_cache: dict[int, int | None] = {}
+    events: list[tuple[watch_history.EventKey, datetime | None]] = []  # recorded in one call below
+    movie_titles: dict[int, tuple[str, str | None]] = {}
 
     # --- Sync Movies ---
     try:
@@ -158,30 +170,8 @@ async def sync_user_history(
         tmdb_id = await _resolve_tmdb_id(url, api_key, rating_key, metadata_cache, title=entry_title, year=entry_year, media_type="movie")
         if not tmdb_id:
             continue
-
-        result = await db.execute(
-            select(Movie).join(Watchlist).where(
-                Watchlist.owner_id == user.id,
-                Movie.tmdb_id == tmdb_id,
-            )
-        )
-        existing = result.scalar_one_or_none()
-
-        if existing:
-            if existing.status not in ("watched", "dropped"):
-                existing.status = "watched"
-                updated += 1
-        else:
-            movie = Movie(
-                watchlist_id=default_watchlist.id,
-                title=entry.get("full_title", entry.get("title", "Unknown")),
-                year=str(entry.get("year", "")) if entry.get("year") else None,
-                tmdb_id=tmdb_id,
-                media_type="movie",
-                status="watched",
-            )
-            db.add(movie)
-            added += 1
+        events.append(watch_history.movie_event(tmdb_id, _entry_time(entry)))
+        movie_titles[tmdb_id] = (entry.get("full_title", entry.get("title", "Unknown")), entry_year)
 
     # --- Sync TV Shows ---
     try:
@@ -202,6 +192,7 @@ async def sync_user_history(
                 "title": entry.get("grandparent_title", "Unknown"),
                 "year": entry.get("year"),
                 "watched_episodes": {},
+                "events": [],
             }
         season_num = entry.get("parent_media_index")
         ep_num = entry.get("media_index")
@@ -210,14 +201,32 @@ async def sync_user_history(
             if season_key not in shows[gp_key]["watched_episodes"]:
                 shows[gp_key]["watched_episodes"][season_key] = set()
             shows[gp_key]["watched_episodes"][season_key].add(int(ep_num))
+            shows[gp_key]["events"].append(((int(season_num), int(ep_num)), _entry_time(entry)))
 
     from ..services.tmdb import TMDBService
     tmdb = TMDBService()
 
+    show_ids: dict[int, dict] = {}
     for gp_key, show_data in shows.items():
         tmdb_id = await _resolve_tmdb_id(url, api_key, gp_key, metadata_cache, title=show_data["title"], year=str(show_data.get("year", "")) if show_data.get("year") else None, media_type="show")
         if not tmdb_id:
             continue
+        events.extend(((tmdb_id, "tv", season, ep), watched_at) for (season, ep), watched_at in show_data["events"])
+        show_ids[tmdb_id] = show_data
+
+    new_keys = await watch_history.record(db, user.id, "tautulli", events)
+    for action in (await apply_watched_movies(
+        db, user.id, {key[0] for key in new_keys if key[1] == "movie"}, default_wl_id=default_watchlist.id, titles=movie_titles,
+    )).values():
+        if action == "updated":
+            updated += 1
+        else:
+            added += 1
+
+    for tmdb_id, show_data in show_ids.items():
+        new_episodes = watch_history.as_progress(new_keys, tmdb_id)
+        if not new_episodes:
+            continue
 
         watch_progress = {
             season: sorted(list(eps))
@@ -235,35 +244,14 @@ async def sync_user_history(
 
         status = "watched" if is_complete else "watching"
 
-        result = await db.execute(
-            select(Movie).join(Watchlist).where(
-                Watchlist.owner_id == user.id,
-                Movie.tmdb_id == tmdb_id,
-            )
+        own_lists = select(Watchlist.id).where(Watchlist.owner_id == user.id)
+        action = await apply_new_episodes(
+            db, own_lists, default_watchlist.id, tmdb_id, show_data["title"], new_episodes,
+            show_data["year"], status, user_id=user.id,
         )
-        existing = result.scalar_one_or_none()
-
-        if existing:
-            old_progress = existing.watch_progress or {}
-            for season, eps in watch_progress.items():
-                old_eps = set(old_progress.get(season, []))
-                old_eps.update(eps)
-                old_progress[season] = sorted(list(old_eps))
-            existing.watch_progress = old_progress
-            if existing.status not in ("dropped", "watched"):
-                existing.status = status
+        if action == "updated":
             updated += 1
-        else:
-            movie = Movie(
-                watchlist_id=default_watchlist.id,
-                title=show_data["title"],
-                year=str(show_data["year"]) if show_data["year"] else None,
-                tmdb_id=tmdb_id,
-                media_type="tv",
-                status=status,
-                watch_progress=watch_progress,
-            )
-            db.add(movie)
+        elif action == "added":
             added += 1
 
     conn.last_sync = datetime.utcnow()
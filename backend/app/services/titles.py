@@ -0,0 +1,150 @@
+"""Shared TMDB metadata — one titles row per (tmdb_id, media_type).
+
+Poster, backdrop, overview, rating and genres fetched from TMDB live in titles
+and are read through Movie's hybrid attributes. Only TMDB data is written to
+titles (enrich(), store()). A movie's own columns hold what its user set that
+differs from the shared row: drop_copies() NULLs values equal to it after
+creates, imports and enrichment. Enrichment runs once per title instead of
+once per movies row.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, func, null, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..models import Movie, Title
+from .tmdb import TMDBService
+
+logger = logging.getLogger(__name__)
+
+ENRICH_RETRY = timedelta(days=7)  # titles TMDB has no poster/overview for aren't refetched on every listing
+SHARED_FIELDS = ("poster_url", "backdrop_path", "overview", "vote_average", "genres")
+
+# One-time, only while titles is empty: movies metadata came from enrichment, so the
+# most common value per title is TMDB's; entries that differ keep it as their override
+BACKFILL_SQL = """
+INSERT INTO titles (tmdb_id, media_type, title, year, poster_url, backdrop_path, overview, vote_average, genres)
+SELECT tmdb_id, media_type,
+       mode() WITHIN GROUP (ORDER BY title), mode() WITHIN GROUP (ORDER BY year),
+       mode() WITHIN GROUP (ORDER BY poster_url), mode() WITHIN GROUP (ORDER BY backdrop_path),
+       mode() WITHIN GROUP (ORDER BY overview), mode() WITHIN GROUP (ORDER BY vote_average),
+       mode() WITHIN GROUP (ORDER BY genres)
+FROM movies
+WHERE tmdb_id IS NOT NULL AND media_type IS NOT NULL
+  AND num_nonnulls(poster_url, backdrop_path, overview, vote_average, genres) > 0
+  AND NOT EXISTS (SELECT 1 FROM titles)
+GROUP BY tmdb_id, media_type
+ON CONFLICT DO NOTHING
+"""
+
+# Idempotent: NULL the movies columns that merely copy the shared row, see drop_copies()
+CLEAR_COPIES_SQL = """
+UPDATE movies m SET
+  poster_url = CASE WHEN m.poster_url = t.poster_url THEN NULL ELSE m.poster_url END,
+  backdrop_path = CASE WHEN m.backdrop_path = t.backdrop_path THEN NULL ELSE m.backdrop_path END,
+  overview = CASE WHEN m.overview = t.overview THEN NULL ELSE m.overview END,
+  vote_average = CASE WHEN m.vote_average = t.vote_average THEN NULL ELSE m.vote_average END,
+  genres = CASE WHEN m.genres = t.genres THEN NULL ELSE m.genres END
+FROM titles t
+WHERE t.tmdb_id = m.tmdb_id AND t.media_type = m.media_type
+  AND (m.poster_url = t.poster_url OR m.backdrop_path = t.backdrop_path OR m.overview = t.overview
+       OR m.vote_average = t.vote_average OR m.genres = t.genres)
+"""
+
+
+def join_shared(query):
+    """Outer-join the shared titles row, which Movie's metadata expressions read in SQL."""
+    return query.outerjoin(Movie.shared)
+
+
+def genres_filter(genres: list[int]):
+    """Own genres, else the shared row's. Unlike coalesce(), each side is a plain @> on its
+    own column, so ix_movies_genres / ix_titles_genres serve the lookups."""
+    shared = select(Title.tmdb_id, Title.media_type).where(Title.genres.contains(genres))
+    return or_(
+        Movie._genres.contains(genres),
+        and_(Movie._genres == None, tuple_(Movie.tmdb_id, Movie.media_type).in_(shared)),
+    )
+
+
+async def drop_copies(db: AsyncSession, *where) -> None:
+    """NULL the own metadata columns of the matching movies where they equal the shared row."""
+    m, t = Movie.__table__.c, Title.__table__.c
+    await db.execute(
+        update(Movie.__table__)
+        .where(t.tmdb_id == m.tmdb_id, t.media_type == m.media_type, or_(*(m[f] == t[f] for f in SHARED_FIELDS)), *where)
+        .values({f: case((m[f] == t[f], null()), else_=m[f]) for f in SHARED_FIELDS})
+    )
+
+
+def _upsert(tmdb_id: int, media_type: str, values: dict):
+    """INSERT .. ON CONFLICT returning the Title; fresh TMDB data wins over what the row held."""
+    stmt = pg_insert(Title).values(tmdb_id=tmdb_id, media_type=media_type, **values)
+    current = Title.__table__.c
+    set_ = {f: func.coalesce(stmt.excluded[f], current[f]) for f in values}
+    set_["updated_at"] = func.now()
+    return (
+        stmt.on_conflict_do_update(constraint="uq_titles_tmdb", set_=set_)
+        .returning(Title)
+        .execution_options(populate_existing=True)
+    )
+
+
+def needs_enrich(movie) -> bool:
+    """Whether the title's shared row is missing or incomplete. Works on Movie entities and on projected rows."""
+    if not (movie.tmdb_id and movie.media_type):
+        return False
+    shared = getattr(movie, "shared", None)
+    # Projected rows carry no shared row, only the values coalesced with the movie's own columns
+    data = shared if isinstance(movie, Movie) else movie
+    if data is not None and data.poster_url and data.overview and data.backdrop_path:
+        return False
+    return not (shared and shared.enriched_at and shared.enriched_at > datetime.utcnow() - ENRICH_RETRY)
+
+
+def _tmdb_values(data: dict) -> dict:
+    date = data.get("release_date") or data.get("first_air_date") or ""
+    return {
+        "title": data.get("title") or data.get("name"),
+        "year": date[:4] or None,
+        "poster_url": data.get("poster_path"),
+        "backdrop_path": data.get("backdrop_path"),
+        "overview": data.get("overview") or None,
+        "vote_average": data.get("vote_average") or None,
+        "genres": [g["id"] for g in data.get("genres") or []] or None,
+        "enriched_at": datetime.utcnow(),
+    }
+
+
+async def store(db: AsyncSession, tmdb_id: int, media_type: str, data: dict) -> Title:
+    """Upsert the shared row from a TMDB details response and drop the movies' copies of it."""
+    title = (await db.scalars(_upsert(tmdb_id, media_type, _tmdb_values(data)))).one()
+    await drop_copies(db, Movie.tmdb_id == tmdb_id, Movie.media_type == media_type)
+    return title
+
+
+async def enrich(db: AsyncSession, movies: list[Movie], raise_errors: bool = False) -> None:
+    """Fetch TMDB details once per distinct title of these movies and attach the shared rows."""
+    keys = {(m.tmdb_id, m.media_type) for m in movies if needs_enrich(m)}
+    tmdb = TMDBService()
+    for tmdb_id, media_type in keys:
+        try:
+            data = await tmdb.details(media_type, tmdb_id)
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.debug(f"Enrich failed for {media_type}/{tmdb_id}: {e}")
+            continue
+        title = await store(db, tmdb_id, media_type, data)
+        for movie in movies:
+            if (movie.tmdb_id, movie.media_type) == (tmdb_id, media_type):
+                set_committed_value(movie, "shared", title)
+                for f in SHARED_FIELDS:
+                    if getattr(movie, f"_{f}") == getattr(title, f):
+                        set_committed_value(movie, f"_{f}", None)  # cleared in the database by store()
+                if not movie.year and title.year:
+                    movie.year = title.year
+    await db.flush()
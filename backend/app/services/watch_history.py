@@ -0,0 +1,96 @@
+"""Watch history — the append-only watch_events table.
+
+Imports (Plex, Jellyfin, Tautulli, webhooks) and manual changes record events in
+bulk. Every watch is kept, rewatches included; the unique (user, item, source,
+watched_at) index only drops an event the same source already reported. Events
+without a timestamp (a plain "watched" flag) are recorded once per item.
+
+Only items the user had no event for before are applied to watch_progress and
+movie statuses, so polling the same watched state again is a no-op and a user's
+manual un-marking is not undone by the next sync.
+"""
+from datetime import datetime
+from typing import Iterable
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import WatchEvent
+
+INSERT_BATCH = 1000
+
+# (tmdb_id, media_type, season, episode) — season/episode are None for movies
+EventKey = tuple[int, str, int | None, int | None]
+
+BACKFILL_SQL = """
+INSERT INTO watch_events (user_id, tmdb_id, media_type, season, episode, source, watched_at)
+SELECT w.owner_id, m.tmdb_id, m.media_type, s.key::int, e.value::int, 'backfill', m.created_at
+FROM movies m
+JOIN watchlists w ON w.id = m.watchlist_id,
+     jsonb_each(CASE WHEN jsonb_typeof(m.watch_progress) = 'object' THEN m.watch_progress ELSE '{}'::jsonb END) s,
+     jsonb_array_elements_text(CASE WHEN jsonb_typeof(s.value) = 'array' THEN s.value ELSE '[]'::jsonb END) e
+WHERE m.tmdb_id IS NOT NULL AND m.media_type = 'tv' AND s.key ~ '^[0-9]+$' AND e.value ~ '^[0-9]+$'
+  AND NOT EXISTS (SELECT 1 FROM watch_events)
+UNION ALL
+SELECT w.owner_id, m.tmdb_id, m.media_type, NULL, NULL, 'backfill', m.created_at
+FROM movies m
+JOIN watchlists w ON w.id = m.watchlist_id
+WHERE m.tmdb_id IS NOT NULL AND m.media_type = 'movie' AND m.status = 'watched'
+  AND NOT EXISTS (SELECT 1 FROM watch_events)
+ON CONFLICT DO NOTHING
+"""
+
+
+def episode_events(tmdb_id: int, episodes: dict[str, list[int]], watched_at: datetime | None = None) -> list[tuple[EventKey, datetime | None]]:
+    return [((tmdb_id, "tv", int(season), int(ep)), watched_at) for season, eps in episodes.items() for ep in eps]
+
+
+def movie_event(tmdb_id: int, watched_at: datetime | None = None) -> tuple[EventKey, datetime | None]:
+    return (tmdb_id, "movie", None, None), watched_at
+
+
+async def record(db: AsyncSession, user_id: int, source: str, events: Iterable[tuple[EventKey, datetime | None]]) -> set[EventKey]:
+    """Insert the events not recorded yet; returns the keys of items that had no event before."""
+    unique: set[tuple[EventKey, datetime | None]] = set(events)
+    if not unique:
+        return set()
+
+    keys = {key for key, _ in unique}
+    tmdb_ids = sorted({key[0] for key in keys})
+    known: set[EventKey] = set()
+    for i in range(0, len(tmdb_ids), INSERT_BATCH):  # a full sync records its whole library in one call
+        known.update((await db.execute(
+            select(WatchEvent.tmdb_id, WatchEvent.media_type, WatchEvent.season, WatchEvent.episode).distinct()
+            .where(WatchEvent.user_id == user_id, WatchEvent.tmdb_id.in_(tmdb_ids[i:i + INSERT_BATCH]))
+        )).tuples().all())
+
+    now = datetime.utcnow()
+    rows = [
+        {"user_id": user_id, "tmdb_id": key[0], "media_type": key[1], "season": key[2], "episode": key[3], "source": source, "watched_at": watched_at or now}
+        for key, watched_at in unique
+        if watched_at or key not in known
+    ]
+    # Several untimestamped reports of one item in a batch become a single event
+    rows = list({(r["tmdb_id"], r["media_type"], r["season"], r["episode"], r["watched_at"]): r for r in rows}.values())
+    for i in range(0, len(rows), INSERT_BATCH):
+        await db.execute(pg_insert(WatchEvent).values(rows[i:i + INSERT_BATCH]).on_conflict_do_nothing())
+    return keys - known
+
+
+def as_progress(keys: Iterable[EventKey], tmdb_id: int) -> dict[str, list[int]]:
+    """Episode keys of one show as a watch_progress fragment."""
+    progress: dict[str, set[int]] = {}
+    for key_tmdb_id, media_type, season, episode in keys:
+        if key_tmdb_id == tmdb_id and media_type == "tv" and season is not None:
+            progress.setdefault(str(season), set()).add(episode)
+    return {season: sorted(eps) for season, eps in progress.items()}
+
+
+async def progress_for(db: AsyncSession, user_id: int, tmdb_id: int) -> dict[str, list[int]]:
+    """watch_progress of a show rebuilt from its events (e.g. when it's added to a watchlist again)."""
+    rows = await db.execute(
+        select(WatchEvent.season, WatchEvent.episode)
+        .where(WatchEvent.user_id == user_id, WatchEvent.tmdb_id == tmdb_id, WatchEvent.media_type == "tv", WatchEvent.season != None)
+    )
+    return as_progress(((tmdb_id, "tv", season, episode) for season, episode in rows), tmdb_id)
@@ -0,0 +1,171 @@
+"""Shared watch-status import path for sync loops and webhooks.
+
+Plex/Jellyfin polling, the manual Jellyfin sync and the webhook receivers all
+funnel "user X watched Y" through these helpers so the merge rules stay identical.
+Every import is recorded in watch_events first; only new events change movies.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import JellyfinServer, Movie, User, Watchlist
+from . import episode_progress, jellyfin as jf_service, plex as plex_service, watch_history
+
+logger = logging.getLogger(__name__)
+
+
+async def load_import_target(db: AsyncSession, user_id: int) -> tuple[list[int], Watchlist | None]:
+    """Return (all watchlist ids, default watchlist) of a user."""
+    all_wls = (await db.execute(select(Watchlist).where(Watchlist.owner_id == user_id))).scalars().all()
+    default_wl = next((w for w in all_wls if w.is_default), all_wls[0] if all_wls else None)
+    return [w.id for w in all_wls], default_wl
+
+
+async def import_watched_movie(
+    db: AsyncSession, wl_ids: list[int], default_wl_id: int, tmdb_id: int, title: str, year=None,
+    *, user_id: int, source: str, watched_at: datetime | None = None,
+) -> str | None:
+    """Record a watched movie and mark it as watched, adding it to the default watchlist if missing.
+
+    Returns "added", "updated" or None if nothing changed (also when the watch was already recorded).
+    """
+    if not await watch_history.record(db, user_id, source, [watch_history.movie_event(tmdb_id, watched_at)]):
+        return None
+    existing = (await db.execute(select(Movie).where(Movie.watchlist_id.in_(wl_ids), Movie.tmdb_id == tmdb_id))).scalars().first()
+    if existing:
+        if existing.status not in ("watched", "dropped"):
+            existing.status = "watched"
+            return "updated"
+        return None
+    db.add(Movie(watchlist_id=default_wl_id, title=title or "Unknown", year=str(year) if year else None, tmdb_id=tmdb_id, media_type="movie", status="watched"))
+    return "added"
+
+
+async def import_watched_episodes(
+    db: AsyncSession, wl_ids: list[int], default_wl_id: int, tmdb_id: int, title: str,
+    episodes: dict[str, list[int]], year=None, status: str = "watching",
+    *, user_id: int, source: str, watched_at: datetime | None = None,
+) -> str | None:
+    """Record watched episodes ({season: [episode, ...]}) and merge the new ones into the show's progress.
+
+    Returns "added", "updated" or None if no episode was new.
+    """
+    if not episodes:
+        return None
+    new_keys = await watch_history.record(db, user_id, source, watch_history.episode_events(tmdb_id, episodes, watched_at))
+    return await apply_new_episodes(db, wl_ids, default_wl_id, tmdb_id, title, watch_history.as_progress(new_keys, tmdb_id), year, status, user_id=user_id)
+
+
+async def apply_new_episodes(
+    db: AsyncSession, wl_ids: list[int], default_wl_id: int, tmdb_id: int, title: str,
+    new_episodes: dict[str, list[int]], year=None, status: str = "watching",
+    *, user_id: int, keep_statuses: tuple[str, ...] = ("watched", "dropped"), force_status: bool = False,
+) -> str | None:
+    """Derive watch_progress from newly recorded episode events; adds the show if it's in no watchlist."""
+    match = [Movie.watchlist_id.in_(wl_ids), Movie.tmdb_id == tmdb_id]
+    if (new_episodes or force_status) and await episode_progress.merge_into(db, match, new_episodes, status, keep_statuses, force_status):
+        return "updated"
+    if not new_episodes or (await db.execute(select(Movie.id).where(*match).limit(1))).first():
+        return None
+    progress = await watch_history.progress_for(db, user_id, tmdb_id)
+    db.add(Movie(watchlist_id=default_wl_id, title=title or "Unknown", year=str(year) if year else None, tmdb_id=tmdb_id, media_type="tv", status=status, watch_progress=progress))
+    return "added"
+
+
+async def mark_movies_watched(
+    db: AsyncSession, user_id: int, tmdb_ids: set[int], source: str, watched_at: dict[int, datetime] | None = None,
+    *, default_wl_id: int | None = None, titles: dict[int, tuple[str, object]] | None = None,
+) -> list[int]:
+    """Record watched movies and mark the newly recorded ones as watched in one statement.
+
+    Newly watched movies in none of the user's watchlists are added to default_wl_id
+    (titles: tmdb_id -> (title, year)), like import_watched_movie does.
+    Returns the TMDB IDs that actually changed.
+    """
+    if not tmdb_ids:
+        return []
+    new_keys = await watch_history.record(
+        db, user_id, source, [watch_history.movie_event(tmdb_id, (watched_at or {}).get(tmdb_id)) for tmdb_id in tmdb_ids]
+    )
+    return sorted(await apply_watched_movies(db, user_id, {key[0] for key in new_keys}, default_wl_id=default_wl_id, titles=titles))
+
+
+async def apply_watched_movies(
+    db: AsyncSession, user_id: int, tmdb_ids: set[int],
+    *, default_wl_id: int | None = None, titles: dict[int, tuple[str, object]] | None = None,
+) -> dict[int, str]:
+    """Mark newly recorded movies as watched, adding unlisted ones to default_wl_id.
+
+    For syncs that record all their events in one watch_history.record() call.
+    Returns tmdb_id -> "updated" / "added" for the movies that changed.
+    """
+    if not tmdb_ids:
+        return {}
+    own_lists = select(Watchlist.id).where(Watchlist.owner_id == user_id)
+    result = await db.execute(
+        update(Movie)
+        .where(
+            Movie.watchlist_id.in_(own_lists),
+            Movie.tmdb_id.in_(tmdb_ids),
+            Movie.media_type == "movie",
+            Movie.status.notin_(("watched", "dropped")),
+        )
+        .values(status="watched")
+        .returning(Movie.tmdb_id)
+        .execution_options(synchronize_session=False)
+    )
+    actions = {tmdb_id: "updated" for tmdb_id in result.scalars().all()}
+
+    if default_wl_id:
+        listed = set((await db.execute(
+            select(Movie.tmdb_id).where(Movie.watchlist_id.in_(own_lists), Movie.tmdb_id.in_(tmdb_ids), Movie.media_type == "movie")
+        )).scalars().all())
+        for tmdb_id in tmdb_ids - listed:
+            title, year = (titles or {}).get(tmdb_id, (None, None))
+            db.add(Movie(watchlist_id=default_wl_id, title=title or "Unknown", year=str(year) if year else None, tmdb_id=tmdb_id, media_type="movie", status="watched"))
+            actions[tmdb_id] = "added"
+    return actions
+
+
+# --- Cross-sync ---
+
+
+async def forward_to_jellyfin(db: AsyncSession, user_id: int, items: list[tuple[int, str]]) -> int:
+    """Mark (tmdb_id, media_type) items as watched on the user's Jellyfin servers."""
+    forwarded = 0
+    jf_servers = (await db.execute(select(JellyfinServer).where(JellyfinServer.user_id == user_id, JellyfinServer.enabled == True))).scalars().all()
+    for srv in jf_servers:
+        for tmdb_id, media_type in items:
+            try:
+                item = await jf_service.find_by_tmdb(srv.url, srv.token, srv.jellyfin_user_id, tmdb_id, media_type or "tv", server_id=srv.id)
+                if item and not item.get("played"):
+                    await jf_service.mark_watched(srv.url, srv.token, srv.jellyfin_user_id, item["id"], server_id=srv.id)
+                    forwarded += 1
+            except Exception:
+                continue
+    return forwarded
+
+
+async def forward_to_plex(user: User, items: list[tuple[int, str]]) -> int:
+    """Mark (tmdb_id, media_type) items as watched on all Plex servers of the user."""
+    if not user.plex_token or not items:
+        return 0
+    forwarded = 0
+    try:
+        plex_servers = await plex_service.discover_servers(user.plex_token)
+    except Exception:
+        return 0
+    for ps in plex_servers:
+        token = ps.get("token", user.plex_token)
+        for tmdb_id, media_type in items:
+            try:
+                item = await plex_service.find_by_guid(ps["url"], token, tmdb_id, media_type)
+                if item:
+                    plex_type = "show" if media_type == "tv" else "movie"
+                    await plex_service.mark_watched(ps["url"], token, item["ratingKey"], plex_type)
+                    forwarded += 1
+            except Exception:
+                continue
+    return forwarded
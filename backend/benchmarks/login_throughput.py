@@ -0,0 +1,75 @@
+"""Login throughput and event-loop latency during password verification.
+
+Runs N concurrent bcrypt verifications, once inline on the event loop (the old
+behaviour) and once through app.auth.verify_password's thread pool, while a
+probe coroutine sleeps PROBE_MS in a loop and records how late it wakes up.
+Lag that stays flat in "pool" mode means other requests keep being served
+during logins.
+
+    cd backend
+    python -m benchmarks.login_throughput [--logins 16] [--rounds 12]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+PROBE_MS = 5
+
+
+async def _probe(lags: list[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_MS / 1000)
+        lags.append((time.perf_counter() - start) * 1000 - PROBE_MS)
+
+
+async def _run(mode: str, logins: int, verify_inline, verify_async) -> None:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    await asyncio.sleep(0.05)
+
+    async def login():
+        if mode == "inline":
+            verify_inline()
+        else:
+            await verify_async()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    lags.sort()
+    print(
+        f"{mode:6} {logins / elapsed:6.1f} logins/s  "
+        f"loop lag p50 {statistics.median(lags):7.1f} ms  "
+        f"p99 {lags[min(int(len(lags) * 0.99), len(lags) - 1)]:7.1f} ms  max {lags[-1]:7.1f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12)
+    args = parser.parse_args()
+
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    from app import auth
+
+    password = "correct horse battery staple"
+    hashed = auth.pwd_context.hash(password)
+    verify_inline = lambda: auth.pwd_context.verify(password, hashed)  # noqa: E731
+    verify_async = lambda: auth.verify_password(password, hashed)  # noqa: E731
+
+    print(f"{args.logins} concurrent logins, bcrypt cost {args.rounds}, {os.cpu_count()} CPUs, "
+          f"{auth.settings.password_hash_workers} hash workers")
+    for mode in ("inline", "pool"):
+        asyncio.run(_run(mode, args.logins, verify_inline, verify_async))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""The watchlist listings must cost the same number of statements for 2 or 20 lists."""
+import asyncio
+import uuid
+
+from app.models import Friend, Movie, User, Watchlist, WatchlistShare
+from app.routers.watchlist import get_my_watchlists, get_user_watchlists
+
+
+async def _make_user(db, name: str) -> User:
+    user = User(username=f"{name}-{uuid.uuid4().hex[:8]}", email=f"{uuid.uuid4().hex}@example.com")
+    db.add(user)
+    await db.flush()
+    return user
+
+
+async def _add_lists(db, owner: User, friend: User, n: int) -> None:
+    for i in range(n):
+        wl = Watchlist(owner_id=owner.id, name=f"Liste {i}", is_default=False)
+        db.add(wl)
+        await db.flush()
+        db.add_all([
+            Movie(watchlist_id=wl.id, title=f"Film {i}-{j}", tmdb_id=1000 * i + j, media_type="movie", is_private=j == 0)
+            for j in range(3)
+        ])
+        db.add(WatchlistShare(watchlist_id=wl.id, user_id=friend.id, permission="view"))
+    await db.commit()
+
+
+def _statement_counts(session_factory, count_queries, call) -> tuple[int, int]:
+    """Statements of one (warm) listing call with 2 lists and again with 20."""
+
+    async def scenario():
+        async with session_factory() as db:
+            owner = await _make_user(db, "owner")
+            friend = await _make_user(db, "friend")
+            db.add(Friend(sender_id=owner.id, receiver_id=friend.id, status="accepted"))
+            db.add(Watchlist(owner_id=owner.id, name="Meine Watchlist", is_default=True))
+            await _add_lists(db, owner, friend, 2)
+
+            counts = []
+            for more in (0, 18):
+                await _add_lists(db, owner, friend, more)
+                await call(db, owner, friend)  # warms the per-user caches (e.g. access grants)
+                with count_queries() as counter:
+                    await call(db, owner, friend)
+                counts.append(counter.count)
+            return tuple(counts)
+
+    return asyncio.run(scenario())
+
+
+def test_my_watchlists_query_count_is_constant(session_factory, count_queries):
+    async def call(db, owner, friend):
+        assert len(await get_my_watchlists(user=owner, db=db)) >= 3
+
+    small, large = _statement_counts(session_factory, count_queries, call)
+    assert small == large
+
+
+def test_shared_watchlists_query_count_is_constant(session_factory, count_queries):
+    async def call(db, owner, friend):
+        assert await get_my_watchlists(user=friend, db=db)
+
+    small, large = _statement_counts(session_factory, count_queries, call)
+    assert small == large
+
+
+def test_user_watchlists_query_count_is_constant(session_factory, count_queries):
+    async def call(db, owner, friend):
+        assert await get_user_watchlists(owner.username, user=friend, db=db)
+
+    small, large = _statement_counts(session_factory, count_queries, call)
+    assert small == large
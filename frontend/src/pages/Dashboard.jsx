@@ -37,8 +37,8 @@ export default function Dashboard() {
     }).catch(() => {})
 
     // Only load recent 6 for display (fast)
-    api.get('/watchlist/movies').then(res => {
-      setRecentMovies(res.data.slice(0, 6))
+    api.get('/watchlist/movies', { params: { limit: 6 } }).then(res => {
+      setRecentMovies(res.data)
     }).catch(() => {})
   }
 
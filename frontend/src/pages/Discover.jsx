@@ -70,7 +70,7 @@ export default function Discover() {
 
   useEffect(() => {
     api.get('/media/trending').then(res => setTrending(res.data.results || [])).catch(() => {})
-    api.get('/watchlist/movies').then(res => {
+    api.get('/watchlist/movies', { params: { fields: 'tmdb_id,media_type' } }).then(res => {
       setAddedIds(new Set(res.data.map(m => `${m.tmdb_id}-${m.media_type}`)))
     }).catch(() => {})
     api.get('/watchlist/lists').then(res => {
@@ -1591,35 +1591,32 @@ export default function Settings() {
           <button
             onClick={async () => {
               try {
-                const res = await api.get('/watchlist/export')
-                const blob = new Blob([JSON.stringify(res.data, null, 2)], { type: 'application/json' })
-                const url = URL.createObjectURL(blob)
+                const res = await api.get('/watchlist/export', { params: { format: 'ndjson', gzip: true }, responseType: 'blob' })
+                const url = URL.createObjectURL(res.data)
                 const a = document.createElement('a')
                 a.href = url
-                a.download = `watchlist-export-${user?.username}-${new Date().toISOString().slice(0,10)}.json`
+                a.download = `watchlist-export-${user?.username}-${new Date().toISOString().slice(0,10)}.ndjson.gz`
                 a.click()
                 URL.revokeObjectURL(url)
               } catch {}
             }}
             className="flex-1 flex items-center justify-center gap-2 py-3 rounded-xl text-sm font-medium bg-white/[0.06] text-white/60 active:bg-white/[0.1]"
           >
-            Export (JSON)
+            Export (NDJSON)
           </button>
 
           {/* Import */}
           <label className="flex-1 flex items-center justify-center gap-2 py-3 rounded-xl text-sm font-medium bg-white/[0.06] text-white/60 active:bg-white/[0.1] cursor-pointer">
-            Import (JSON)
+            Import (JSON/NDJSON)
             <input
               type="file"
-              accept=".json"
+              accept=".json,.ndjson,.gz"
               className="hidden"
               onChange={async (e) => {
                 const file = e.target.files?.[0]
                 if (!file) return
                 try {
-                  const text = await file.text()
-                  const data = JSON.parse(text)
-                  const res = await api.post('/watchlist/import', data)
+                  const res = await api.post('/watchlist/import', file, { headers: { 'Content-Type': 'application/octet-stream' } })
                   alert(`Import: ${res.data.imported_movies} Filme/Serien importiert, ${res.data.imported_watchlists} Watchlisten, ${res.data.skipped_duplicates} übersprungen`)
                 } catch (err) {
                   alert(err.response?.data?.detail || 'Import fehlgeschlagen')